@@ -0,0 +1,72 @@
+"""
+Benchmark d'ingestion - Vérifie que le temps d'insertion croît linéairement
+avec la taille d'une conversation.
+
+Usage: python -m benchmarks.bench_ingest [--sizes 25000,50000,100000,200000]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.data_manager import DataManager
+
+def ingest(size: int, audio_ratio: float = 0.1, backend: str = 'json') -> float:
+    """Insère `size` messages pour un seul contact et retourne la durée (s)"""
+    output_dir = tempfile.mkdtemp(prefix='bench_ingest_')
+    try:
+        data_manager = DataManager(output_dir, backend)
+        audio_every = int(1 / audio_ratio) if audio_ratio else 0
+        
+        start = time.perf_counter()
+        for i in range(size):
+            date_str = f"2024/{(i // 28000) % 12 + 1:02d}/{(i // 1000) % 28 + 1:02d}"
+            time_str = f"{(i // 60) % 24:02d}:{i % 60:02d}"
+            data_manager.add_message('Groupe Benchmark', {
+                'date': date_str,
+                'time': time_str,
+                'content': f"Message numéro {i}",
+                'direction': 'sent' if i % 2 else 'received',
+                'type': 'text'
+            })
+            if audio_every and i % audio_every == 0:
+                data_manager.add_audio('Groupe Benchmark', {
+                    'path': f"audio/PTT-{i:08d}.opus",
+                    'date': date_str,
+                    'time': time_str,
+                    'direction': 'received'
+                })
+        elapsed = time.perf_counter() - start
+        data_manager.close()
+        return elapsed
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='25000,50000,100000,200000',
+                        help='Tailles de conversation à mesurer (séparées par des virgules)')
+    parser.add_argument('--backend', default='json', help='Backend de stockage (json, sqlite)')
+    args = parser.parse_args()
+    
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    
+    print(f"{'messages':>10} {'durée (s)':>10} {'µs/message':>12}")
+    results = []
+    for size in sizes:
+        elapsed = ingest(size, backend=args.backend)
+        results.append((size, elapsed))
+        print(f"{size:>10} {elapsed:>10.3f} {elapsed / size * 1e6:>12.2f}")
+    
+    # Croissance linéaire: le coût par message reste stable
+    if len(results) > 1:
+        first = results[0][1] / results[0][0]
+        last = results[-1][1] / results[-1][0]
+        print(f"\nRatio coût/message (plus grande / plus petite taille): {last / first:.2f}")
+
+if __name__ == "__main__":
+    main()
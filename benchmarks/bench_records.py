@@ -0,0 +1,64 @@
+"""
+Benchmark mémoire des enregistrements - Octets par message: dicts JSON vs core.records
+
+Usage: python -m benchmarks.bench_records [--messages 1000000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.records import MessageRecord
+
+def synthetic_json(count: int) -> str:
+    """Liste de messages au schéma de whatsapp_data.json, telle que lue depuis le disque"""
+    messages = []
+    for i in range(count):
+        messages.append({
+            'date': f"2024/{(i // 28000) % 12 + 1:02d}/{(i // 1000) % 28 + 1:02d}",
+            'time': f"{(i // 60) % 24:02d}:{i % 60:02d}",
+            'content': f"Message numéro {i}",
+            'direction': 'sent' if i % 2 else 'received',
+            'type': 'text',
+            'id': f"{i:016x}"
+        })
+    return json.dumps(messages, ensure_ascii=False)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=1000000)
+    args = parser.parse_args()
+    
+    payload = synthetic_json(args.messages)
+    
+    # Durée de conversion mesurée hors tracemalloc (qui ralentit chaque allocation)
+    messages = json.loads(payload)
+    start = time.perf_counter()
+    records = [MessageRecord.from_dict(m) for m in messages]
+    convert_time = time.perf_counter() - start
+    assert records[-1].to_dict() == messages[-1]
+    del messages, records
+    
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages = json.loads(payload)
+    dict_bytes = tracemalloc.get_traced_memory()[0] - before
+    # Gardés en vie jusqu'à la mesure: c'est leur empreinte mémoire qui est comptée
+    records = [MessageRecord.from_dict(m) for m in messages]
+    # Les contenus et IDs sont partagés avec les dicts: ne compter qu'après leur libération
+    del messages
+    record_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del records
+    
+    print(f"{'représentation':<22} {'total (Mo)':>11} {'octets/message':>15}")
+    print(f"{'dict (json.load)':<22} {dict_bytes / 1024 / 1024:>11.1f} {dict_bytes / args.messages:>15.0f}")
+    print(f"{'MessageRecord':<22} {record_bytes / 1024 / 1024:>11.1f} {record_bytes / args.messages:>15.0f}")
+    print(f"\nConversion: {convert_time:.2f}s ({convert_time / args.messages * 1e6:.2f} µs/message)")
+
+if __name__ == "__main__":
+    main()
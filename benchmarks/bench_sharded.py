@@ -0,0 +1,72 @@
+"""
+Benchmark mémoire du backend sharded - Mémoire résidente selon le nombre de contacts
+
+Usage: python -m benchmarks.bench_sharded [--contacts 100,400,1600] [--messages-per-contact 500]
+                                          [--cache-mb 16]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.data_manager import DataManager
+
+def fill(output_dir: str, backend: str, contacts: int, per_contact: int):
+    """Crée le jeu de données, contact par contact"""
+    data_manager = DataManager(output_dir, backend, {'cache_bytes': 16 * 1024 * 1024})
+    with data_manager.batch():
+        for c in range(contacts):
+            for i in range(per_contact):
+                data_manager.add_message(f"Contact {c}", {
+                    'date': f"2024/01/{i % 28 + 1:02d}",
+                    'time': f"{i // 60 % 24:02d}:{i % 60:02d}",
+                    'content': f"Message numéro {i} du contact {c}",
+                    'direction': 'sent' if i % 2 else 'received'
+                })
+            if c % 2 == 0:
+                data_manager.add_audio(f"Contact {c}", {'path': f"audio/PTT-{c:06d}.opus",
+                                                        'date': '2024/01/01', 'time': '10:00'})
+    data_manager.save()
+    data_manager.close()
+
+def measure(output_dir: str, backend: str, options: dict) -> tuple:
+    """Pic mémoire (Mo) et durée d'un démarrage + liste des audios en attente + export complet"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    data_manager = DataManager(output_dir, backend, options)
+    pending = len(data_manager.get_all_pending_audios())
+    for _, contact_name in data_manager.iter_export():
+        for _ in data_manager.iter_export_contents(contact_name):
+            pass
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    data_manager.close()
+    return peak / 1024 / 1024, elapsed, pending
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--contacts', default='100,400,1600')
+    parser.add_argument('--messages-per-contact', type=int, default=500)
+    parser.add_argument('--cache-mb', type=float, default=16)
+    args = parser.parse_args()
+    
+    print(f"{'contacts':>9} {'backend':>8} {'pic (Mo)':>9} {'durée (s)':>10} {'en attente':>11}")
+    for contacts in [int(c) for c in args.contacts.split(',') if c.strip()]:
+        for backend in ('sharded', 'json'):
+            output_dir = tempfile.mkdtemp(prefix='bench_sharded_')
+            try:
+                fill(output_dir, backend, contacts, args.messages_per_contact)
+                peak, elapsed, pending = measure(output_dir, backend,
+                                                 {'cache_bytes': int(args.cache_mb * 1024 * 1024)})
+            finally:
+                shutil.rmtree(output_dir, ignore_errors=True)
+            print(f"{contacts:>9} {backend:>8} {peak:>9.1f} {elapsed:>10.2f} {pending:>11}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark des snapshots - Temps d'écriture / de chargement JSON vs binaire
+
+Usage: python -m benchmarks.bench_snapshot [--messages 1000000] [--contacts 500]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import snapshot
+from core.storage import JsonStorage, new_contact, new_dataset
+
+def build_dataset(messages: int, contacts: int, audio_ratio: float = 0.1) -> dict:
+    """Document whatsapp_data de `messages` messages répartis sur `contacts` contacts"""
+    data = new_dataset()
+    audio_every = int(1 / audio_ratio) if audio_ratio else 0
+    for i in range(messages):
+        contact_name = f"Contact {i % contacts}"
+        contact_data = data['contacts'].get(contact_name)
+        if contact_data is None:
+            contact_data = data['contacts'][contact_name] = new_contact(contact_name)
+        
+        date_str = f"2024/{(i // 28000) % 12 + 1:02d}/{(i // 1000) % 28 + 1:02d}"
+        time_str = f"{(i // 60) % 24:02d}:{i % 60:02d}"
+        contact_data['messages'].append({
+            'date': date_str,
+            'time': time_str,
+            'content': f"Message numéro {i}, avec un peu de texte pour être réaliste",
+            'direction': 'sent' if i % 2 else 'received',
+            'type': 'text',
+            'id': f"{i:016x}"
+        })
+        contact_data['stats']['text_count'] += 1
+        if audio_every and i % audio_every == 0:
+            contact_data['audios'].append({
+                'path': f"audio/PTT-{i:08d}.opus",
+                'date': date_str,
+                'time': time_str,
+                'direction': 'received',
+                'id': f"{i:032x}",
+                'transcription': None,
+                'transcription_status': 'pending'
+            })
+            contact_data['stats']['audio_count'] += 1
+    
+    data['stats']['total_messages'] = messages
+    data['stats']['total_audios'] = sum(c['stats']['audio_count'] for c in data['contacts'].values())
+    return data
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--contacts', type=int, default=500)
+    args = parser.parse_args()
+    
+    print(f"[BENCH] Construction de {args.messages} messages / {args.contacts} contacts...")
+    data = build_dataset(args.messages, args.contacts)
+    output_dir = tempfile.mkdtemp(prefix='bench_snapshot_')
+    
+    codecs = [snapshot.CODEC_MARSHAL]
+    if snapshot.msgpack is not None:
+        codecs.insert(0, snapshot.CODEC_MSGPACK)
+    
+    rows = []
+    try:
+        json_file = os.path.join(output_dir, 'whatsapp_data.json')
+        write_time, _ = timed(snapshot.write_json, json_file, data)
+        read_time, _ = timed(snapshot.read_json, json_file)
+        rows.append(('json (indenté)', write_time, read_time, os.path.getsize(json_file)))
+        
+        binary_file = os.path.join(output_dir, 'whatsapp_data.bin')
+        for codec in codecs:
+            write_time, _ = timed(snapshot.write_binary, binary_file, data, codec)
+            read_time, loaded = timed(snapshot.read_binary, binary_file)
+            assert loaded == data, "le snapshot binaire ne restitue pas le document"
+            rows.append((f"binaire ({snapshot.CODEC_NAMES[codec]})", write_time, read_time,
+                         os.path.getsize(binary_file)))
+        
+        # Démarrage complet du backend (chargement + index), binaire puis JSON seul
+        startup_binary, storage = timed(JsonStorage, output_dir)
+        storage.close()
+        os.remove(binary_file)
+        startup_json, storage = timed(JsonStorage, output_dir)
+        storage.close()
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    
+    print(f"\n{'format':<20} {'écriture (s)':>13} {'chargement (s)':>15} {'taille (Mo)':>12}")
+    for name, write_time, read_time, size in rows:
+        print(f"{name:<20} {write_time:>13.2f} {read_time:>15.2f} {size / 1024 / 1024:>12.1f}")
+    print(f"\nDémarrage JsonStorage: binaire {startup_binary:.2f}s, json {startup_json:.2f}s "
+          f"(x{startup_json / startup_binary:.1f})")
+
+if __name__ == "__main__":
+    main()
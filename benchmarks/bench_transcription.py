@@ -0,0 +1,88 @@
+"""
+Benchmark de transcription - Débit et limitation contre le serveur factice local
+
+Usage: python -m benchmarks.bench_transcription [--audios 200] [--concurrency 1,4,16]
+                                                [--latency 0.2] [--server-rpm 0] [--client-rpm 0]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.data_manager import DataManager
+from processors.smart_transcriber import SmartTranscriber
+from benchmarks.stub_transcription_server import start_server
+
+def run(count: int, concurrency: int, base_url: str, client_rpm: float, duplicate_ratio: float = 0.0):
+    """Transcrit `count` audios factices, retourne (durée (s), nombre transcrit)"""
+    output_dir = tempfile.mkdtemp(prefix='bench_transcription_')
+    try:
+        data_manager = DataManager(output_dir)
+        audio_dir = os.path.join(output_dir, 'audio')
+        os.makedirs(audio_dir)
+        
+        with data_manager.batch():
+            for i in range(count):
+                audio_path = os.path.join(audio_dir, f"PTT-{i:06d}.opus")
+                # Une partie des notes vocales est un transfert d'une note précédente
+                content = b'%08d' % (i % max(1, int(count * (1 - duplicate_ratio)))) * 512
+                with open(audio_path, 'wb') as f:
+                    f.write(content)
+                data_manager.add_audio(f"Contact {i % 10}", {
+                    'path': audio_path,
+                    'date': '2024/01/01',
+                    'time': f"{i // 60 % 24:02d}:{i % 60:02d}",
+                    'direction': 'received'
+                })
+        
+        transcriber = SmartTranscriber(
+            data_manager, 'sk-bench', base_url=base_url,
+            concurrency=concurrency, requests_per_minute=client_rpm
+        )
+        transcriber.retry_delay = 0.5
+        
+        start = time.perf_counter()
+        transcriber.transcribe_all_pending()
+        elapsed = time.perf_counter() - start
+        
+        transcribed = data_manager.get_stats()['total_transcribed']
+        transcriber.close()
+        data_manager.close()
+        return elapsed, transcribed
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--audios', type=int, default=200)
+    parser.add_argument('--concurrency', default='2,4,16', help='Niveaux de concurrence à mesurer')
+    parser.add_argument('--latency', type=float, default=0.2, help='Latence du serveur factice (s)')
+    parser.add_argument('--server-rpm', type=int, default=0, help='Limite du serveur avant 429 (0 = aucune)')
+    parser.add_argument('--client-rpm', type=float, default=0, help='Limite du seau à jetons client (0 = aucune)')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.0,
+                        help='Part des audios au contenu identique à un autre (transferts)')
+    args = parser.parse_args()
+    
+    server, state, base_url = start_server(latency=args.latency, requests_per_minute=args.server_rpm,
+                                           retry_after=1.0)
+    results = []
+    try:
+        for concurrency in [int(c) for c in args.concurrency.split(',') if c.strip()]:
+            before = dict(state.stats)
+            elapsed, transcribed = run(args.audios, concurrency, base_url, args.client_rpm, args.duplicate_ratio)
+            rate_limited = state.stats['rate_limited'] - before['rate_limited']
+            results.append((concurrency, elapsed, transcribed, rate_limited))
+    finally:
+        server.shutdown()
+    
+    print(f"\n{'concurrence':>12} {'durée (s)':>10} {'audios/min':>11} {'transcrits':>11} {'429':>6}")
+    for concurrency, elapsed, transcribed, rate_limited in results:
+        print(f"{concurrency:>12} {elapsed:>10.2f} {transcribed / elapsed * 60:>11.0f} "
+              f"{transcribed:>11} {rate_limited:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Serveur de transcription factice - Imite l'endpoint Whisper pour tester hors ligne
+
+Usage: python -m benchmarks.stub_transcription_server [--port 8765] [--latency 0.2] [--rpm 120]
+Puis dans config.ini: [API] base_url = http://127.0.0.1:8765/v1
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubState:
+    """Compteurs et limite de débit (seau rechargé en continu, rafale d'une seconde) du serveur"""
+    
+    def __init__(self, latency: float, requests_per_minute: int, retry_after: float):
+        self.latency = latency
+        self.requests_per_minute = requests_per_minute
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.capacity = max(1.0, requests_per_minute / 60.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.stats = {
+            'requests': 0,
+            'accepted': 0,
+            'rate_limited': 0,
+            'bytes_received': 0,
+            'max_in_flight': 0
+        }
+    
+    def admit(self) -> bool:
+        """Vrai si la requête passe la limite de débit du serveur"""
+        now = time.monotonic()
+        with self.lock:
+            self.stats['requests'] += 1
+            if self.requests_per_minute:
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated) * self.requests_per_minute / 60.0)
+                self.updated = now
+                if self.tokens < 1:
+                    self.stats['rate_limited'] += 1
+                    return False
+                self.tokens -= 1
+            self.stats['accepted'] += 1
+            self.in_flight += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+            return True
+    
+    def done(self):
+        with self.lock:
+            self.in_flight -= 1
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+        
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def do_GET(self):
+            if self.path.rstrip('/').endswith('/stats'):
+                with state.lock:
+                    self._send_json(200, dict(state.stats))
+            else:
+                self._send_json(404, {'error': {'message': 'not found'}})
+        
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length)
+            with state.lock:
+                state.stats['bytes_received'] += len(body)
+            
+            if not self.path.rstrip('/').endswith('/audio/transcriptions'):
+                self._send_json(404, {'error': {'message': 'not found'}})
+                return
+            
+            if not state.admit():
+                self._send_json(
+                    429,
+                    {'error': {'message': 'Rate limit reached', 'type': 'rate_limit_error'}},
+                    {'Retry-After': f"{state.retry_after:g}"}
+                )
+                return
+            
+            try:
+                time.sleep(state.latency)
+                self._send_json(200, {'text': f"Transcription factice ({len(body)} octets)"})
+            finally:
+                state.done()
+    
+    return Handler
+
+def start_server(port: int = 0, latency: float = 0.2, requests_per_minute: int = 0,
+                 retry_after: float = 1.0):
+    """Démarre le serveur dans un thread, retourne (serveur, état, base_url)"""
+    state = StubState(latency, requests_per_minute, retry_after)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return server, state, base_url
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help='Latence simulée par requête (s)')
+    parser.add_argument('--rpm', type=int, default=0, help='Requêtes/minute avant 429 (0 = illimité)')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Valeur de Retry-After sur 429 (s)')
+    args = parser.parse_args()
+    
+    server, state, base_url = start_server(args.port, args.latency, args.rpm, args.retry_after)
+    print(f"[STUB] Serveur de transcription factice sur {base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"[STUB] Statistiques: {state.stats}")
+
+if __name__ == "__main__":
+    main()
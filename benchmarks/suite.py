@@ -0,0 +1,232 @@
+"""
+Suite de benchmarks de bout en bout - Résultats JSON comparables d'un commit à l'autre
+
+Étapes mesurées sur un export synthétique (benchmarks.synthetic_export):
+extraction (première passe et relance sans changement), insertions DataManager,
+sauvegarde, requête des audios en attente, transcription contre le serveur
+factice local, export (complet puis incrémental), construction de l'index de
+recherche et requêtes plein texte.
+
+Usage: python -m benchmarks.suite [--contacts 40] [--messages 2000] [--audio-ratio 0.1]
+                                  [--backend json] [--concurrency 4] [--output results.json]
+                                  [--compare base.json] [--threshold 1.2] [--min-seconds 0.05]
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.data_manager import DataManager
+from core.rollups import read_stats
+from extractors.unified_extractor import UnifiedExtractor
+from exporters.unified_exporter import UnifiedExporter
+from processors.smart_transcriber import SmartTranscriber
+from processors.search_index import SearchIndex
+from utils.helpers import FingerprintCache, fingerprint_tree
+from benchmarks.synthetic_export import generate_export
+from benchmarks.stub_transcription_server import start_server
+
+SUITE_VERSION = 1
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+def timed_stage(results: Dict, name: str, func, items: int = 0, unit: str = 'items'):
+    """Exécute une étape sans ses affichages et enregistre durée, temps CPU et débit"""
+    start, cpu_start = time.perf_counter(), time.process_time()
+    with redirect_stdout(io.StringIO()):
+        value = func()
+    elapsed = time.perf_counter() - start
+    
+    stage = {'seconds': round(elapsed, 4), 'cpu_seconds': round(time.process_time() - cpu_start, 4)}
+    if items:
+        stage[unit] = items
+        stage[f"{unit}_per_second"] = round(items / elapsed, 1) if elapsed else None
+    results[name] = stage
+    print(f"[BENCH] {name:<22} {elapsed:>8.3f}s" + (f"  {items / elapsed:>10.0f} {unit}/s" if items else ""))
+    return value
+
+def run_suite(args) -> Dict:
+    work_dir = tempfile.mkdtemp(prefix='bench_suite_')
+    stages: Dict[str, Dict] = {}
+    try:
+        summary = generate_export(work_dir, args.contacts, args.messages, args.audio_ratio,
+                                  conversation_ratio=args.conversation_ratio, seed=args.seed)
+        output_dir = summary['output_dir']
+        config = {
+            'html_dir': summary['html_dir'],
+            'media_dir': summary['media_dir'],
+            'output_dir': output_dir,
+            'html_engine': args.html_engine,
+            'workers': args.workers
+        }
+        data_manager = DataManager(output_dir, args.backend)
+        files = summary['html_files'] + summary['conversation_files']
+        
+        # 1. Extraction complète puis relance sans changement (manifeste)
+        timed_stage(stages, 'extract', lambda: UnifiedExtractor(data_manager, config).extract_all(),
+                    files, 'files')
+        stats = data_manager.get_stats()
+        stages['extract']['messages'] = stats['total_messages']
+        stages['extract']['messages_per_second'] = round(
+            stats['total_messages'] / stages['extract']['seconds'], 1)
+        timed_stage(stages, 'extract_unchanged', lambda: UnifiedExtractor(data_manager, config).extract_all(),
+                    files, 'files')
+        
+        # 2. Insertions directes puis sauvegarde complète
+        def insert():
+            with data_manager.batch():
+                for i in range(args.inserts):
+                    data_manager.add_message(f"Insertion {i % 50}", {
+                        'date': f"2025/01/{i % 28 + 1:02d}",
+                        'time': f"{i // 60 % 24:02d}:{i % 60:02d}",
+                        'content': f"Message inséré {i}",
+                        'direction': 'sent' if i % 2 else 'received',
+                        'type': 'text'
+                    })
+        timed_stage(stages, 'insert', insert, args.inserts, 'messages')
+        timed_stage(stages, 'save', data_manager.save)
+        stages['save']['bytes'] = sum(
+            os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir)
+            if name.startswith('whatsapp_data') and os.path.isfile(os.path.join(output_dir, name))
+        )
+        
+        # 3. Requête des audios en attente
+        pending = timed_stage(stages, 'pending_query', data_manager.get_all_pending_audios)
+        stages['pending_query']['audios'] = len(pending)
+        
+        # 4. Transcription contre le serveur factice
+        server, state, base_url = start_server(latency=args.latency)
+        try:
+            transcriber = SmartTranscriber(data_manager, 'sk-bench', base_url=base_url,
+                                           concurrency=args.concurrency, requests_per_minute=0,
+                                           media_dir=summary['media_dir'])
+            before = data_manager.get_stats()['total_transcribed']
+            timed_stage(stages, 'transcribe', transcriber.transcribe_all_pending)
+            transcriber.close()
+        finally:
+            server.shutdown()
+        transcribed = data_manager.get_stats()['total_transcribed'] - before
+        stages['transcribe']['audios'] = transcribed
+        stages['transcribe']['audios_per_second'] = round(transcribed / stages['transcribe']['seconds'], 1)
+        stages['transcribe']['api_requests'] = state.stats['requests']
+        
+        # 5. Export complet puis incrémental (aucun contact modifié)
+        exporter = UnifiedExporter(data_manager, output_dir)
+        contacts = data_manager.contact_count()
+        timed_stage(stages, 'export', exporter.export_simple, contacts, 'contacts')
+        timed_stage(stages, 'export_incremental', exporter.export_simple, contacts, 'contacts')
+        
+        # 6. Index de recherche construit depuis les données, puis requêtes (sans filtre, contact, date)
+        search_index = SearchIndex(output_dir)
+        timed_stage(stages, 'search_index', lambda: search_index.sync(data_manager), contacts, 'contacts')
+        queries = [('rendez-vous', {}), ('desole', {'since': '2024-01-01'}), ('demain 10h', {'contact': 'Contact'}),
+                   ('vocal*', {})]
+        timed_stage(stages, 'search', lambda: [search_index.search(query, **filters) for query, filters in queries],
+                    len(queries), 'queries')
+        search_index.close()
+        
+        # 7. Statistiques précalculées, lues sans les données principales
+        timed_stage(stages, 'stats', lambda: read_stats(output_dir), contacts, 'contacts')
+        
+        # 8. Empreintes des médias: calcul complet puis relance servie par le cache (fichiers non relus)
+        fingerprints = FingerprintCache(os.path.join(work_dir, 'fingerprints.db'))
+        audios = timed_stage(stages, 'fingerprint', lambda: fingerprint_tree(summary['media_dir'], cache=fingerprints))
+        stages['fingerprint'].update(files=len(audios), bytes=fingerprints.bytes_hashed)
+        timed_stage(stages, 'fingerprint_cached', lambda: fingerprint_tree(summary['media_dir'], cache=fingerprints),
+                    len(audios), 'files')
+        fingerprints.close()
+        
+        data_manager.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return {
+        'suite_version': SUITE_VERSION,
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'threshold', 'min_seconds')},
+        'dataset': {key: summary[key] for key in ('html_files', 'html_bytes', 'conversation_files',
+                                                  'messages', 'audios')},
+        'stages': stages
+    }
+
+def compare(current: Dict, base: Dict, threshold: float, min_seconds: float = 0.05) -> int:
+    """Compare les durées par étape, retourne le nombre de régressions au-delà du seuil.
+
+    Les étapes plus courtes que `min_seconds` des deux côtés sont affichées mais
+    jamais signalées: leur ratio n'est que du bruit de mesure.
+    """
+    print(f"\nComparaison avec {base.get('commit') or 'référence'} ({base.get('timestamp', '?')})")
+    print(f"{'étape':<22} {'référence (s)':>14} {'actuel (s)':>11} {'ratio':>7}")
+    regressions = 0
+    for name, stage in current['stages'].items():
+        base_stage = base.get('stages', {}).get(name)
+        if not base_stage or not base_stage.get('seconds'):
+            continue
+        ratio = stage['seconds'] / base_stage['seconds']
+        flag = ''
+        if ratio > threshold and max(stage['seconds'], base_stage['seconds']) >= min_seconds:
+            regressions += 1
+            flag = '  <- régression'
+        print(f"{name:<22} {base_stage['seconds']:>14.3f} {stage['seconds']:>11.3f} {ratio:>7.2f}{flag}")
+    if base.get('params') != current['params']:
+        print("[ATTENTION] Paramètres différents de la référence: comparaison indicative")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--contacts', type=int, default=40)
+    parser.add_argument('--messages', type=int, default=2000, help='Bulles par contact')
+    parser.add_argument('--audio-ratio', type=float, default=0.1)
+    parser.add_argument('--conversation-ratio', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--inserts', type=int, default=50000, help="Messages insérés à l'étape insert")
+    parser.add_argument('--backend', default='json', help='Backend de stockage (json, sqlite, sharded)')
+    parser.add_argument('--html-engine', default='lxml', choices=['lxml', 'bs4'])
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.02, help='Latence du serveur factice (s)')
+    parser.add_argument('--output', help='Fichier JSON des résultats (sinon affiché)')
+    parser.add_argument('--compare', help='Résultats JSON de référence à comparer')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Ratio de durée au-delà duquel une étape est signalée')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='Durée en dessous de laquelle une étape n\'est jamais signalée')
+    args = parser.parse_args()
+    
+    results = run_suite(args)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[BENCH] Résultats écrits dans {args.output}")
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        if compare(results, base, args.threshold, args.min_seconds):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
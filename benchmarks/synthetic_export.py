@@ -0,0 +1,193 @@
+"""
+Générateur d'exports WhatsApp synthétiques - Fichiers HTML, dossiers conversation.json et médias
+
+Produit la même structure que les exports réels analysés par UnifiedExtractor:
+<h3> du contact, <p class="date">, <p class="triangle-isosceles*"> avec <font>,
+et <table> audio pointant vers des notes vocales .opus.
+
+Usage: python -m benchmarks.synthetic_export DOSSIER [--contacts 20] [--messages 2000]
+                                             [--audio-ratio 0.1] [--file-size-kb 0]
+                                             [--conversation-ratio 0.2] [--seed 0]
+"""
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+from html import escape
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST_NAMES = ['Amine', 'Sophie', 'Élodie', 'Karim', 'Léa', 'Mohamed', 'Chloé', 'Yanis', 'Inès', 'Hugo',
+               'Fatima', 'Noé', 'Zoé', 'Rayan', 'Manon', 'Jérôme', 'Aïcha', 'Théo', 'Camille', 'Ömer']
+LAST_NAMES = ['Martin', 'Benali', 'Dubois', 'Nguyen', 'Lefèvre', 'Haddad', 'Moreau', 'García', "O'Brien"]
+PHRASES = [
+    "Salut, ça va ?", "On se voit demain à 10h", "Merci beaucoup & bonne soirée", "ok", "D'accord 👍",
+    "Tu peux m'envoyer l'adresse ?", "Je suis en retard, désolé", "Écoute le vocal", "Haha",
+    "Le rendez-vous est confirmé pour jeudi", "<b>Important</b>: rappelle-moi", "C'est noté, à plus",
+    "Voilà le lien: https://example.com/doc?id=42&lang=fr", "Bon anniversaire !!! 🎉",
+]
+# Première classe CSS des bulles: reçu, envoyé (2/3) et variantes
+RECEIVED_CLASSES = ['triangle-isosceles', 'triangle-isosceles-map']
+SENT_CLASSES = ['triangle-isosceles2', 'triangle-isosceles3']
+
+HTML_HEAD = ("<html><head><meta charset='utf-8'><title>{name}'s WhatsApp</title></head>"
+             "<body><div class='header'><h3>{name}</h3></div><div class='content'>\n")
+HTML_TAIL = "</div></body></html>\n"
+
+def contact_names(count: int, rng: random.Random) -> List[str]:
+    """Noms de contacts distincts, avec accents et quelques numéros de téléphone"""
+    names = []
+    for i in range(count):
+        if i % 7 == 6:
+            names.append(f"+33 6 {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} {i:02d}")
+        else:
+            names.append(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}")
+    return names
+
+def _message_text(rng: random.Random, i: int) -> str:
+    text = rng.choice(PHRASES)
+    # Quelques messages longs pour varier la taille des bulles
+    if rng.random() < 0.05:
+        text = ' '.join(rng.choice(PHRASES) for _ in range(rng.randint(5, 30)))
+    return f"{text} ({i})"
+
+def write_html_chat(path: str, name: str, messages: int, audio_ratio: float, rng: random.Random,
+                    file_size: int = 0) -> Dict:
+    """Écrit un fichier de conversation HTML, retourne le nombre de messages et d'audios écrits.
+    
+    Avec file_size (octets), les messages sont écrits jusqu'à atteindre la taille visée.
+    """
+    moment = datetime(2023, 1, 1, 8, 0) + timedelta(days=rng.randint(0, 300))
+    counts = {'messages': 0, 'audios': 0, 'audio_paths': []}
+    
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(HTML_HEAD.format(name=escape(name)))
+        i = 0
+        while (f.tell() < file_size) if file_size else (i < messages):
+            # Nouveau bloc daté toutes les quelques bulles (horodatage croissant)
+            if i % rng.randint(3, 12) == 0:
+                moment += timedelta(minutes=rng.randint(1, 600))
+                f.write(f"<p class='date'><font color='#b4b4b4'>{moment:%Y/%m/%d %H:%M}</font></p>\n")
+            
+            sent = rng.random() < 0.45
+            css_class = rng.choice(SENT_CLASSES if sent else RECEIVED_CLASSES)
+            if rng.random() < audio_ratio:
+                audio_path = f"audio/PTT-{moment:%Y%m%d}-WA{i:05d}.opus"
+                f.write(f"<table class='{css_class}'><tr><td><a href='{audio_path}'>"
+                        f"<img src='audio.png'></a></td><td><font>0:{rng.randint(2, 59):02d}</font></td></tr></table>\n")
+                counts['audios'] += 1
+                counts['audio_paths'].append(audio_path)
+            elif rng.random() < 0.03:
+                # Photo: table sans audio, ignorée par l'extraction
+                f.write(f"<table class='{css_class}'><tr><td><a href='images/IMG-{i:05d}.jpg'>"
+                        f"<img src='thumb.jpg'></a></td></tr></table>\n")
+            else:
+                f.write(f"<p class='{css_class}'><font>{escape(_message_text(rng, i))}</font>"
+                        f"<span class='time'>{moment:%H:%M}</span></p>\n")
+                counts['messages'] += 1
+            i += 1
+        f.write(HTML_TAIL)
+    
+    return counts
+
+def write_conversation_folder(output_dir: str, name: str, messages: int, audio_ratio: float,
+                              rng: random.Random) -> Dict:
+    """Dossier <contact>/conversation.json (source lue par _extract_from_folders)"""
+    folder = os.path.join(output_dir, name)
+    os.makedirs(folder, exist_ok=True)
+    moment = datetime(2022, 6, 1, 9, 0) + timedelta(days=rng.randint(0, 200))
+    records = []
+    audios = 0
+    for i in range(messages):
+        moment += timedelta(minutes=rng.randint(1, 240))
+        record = {
+            'date': f"{moment:%Y/%m/%d}",
+            'time': f"{moment:%H:%M}",
+            'content': _message_text(rng, i),
+            'direction': 'sent' if rng.random() < 0.45 else 'received',
+            'type': 'text'
+        }
+        if rng.random() < audio_ratio:
+            record['type'] = 'audio'
+            record['content'] = '[Audio]'
+            record['media_path'] = f"audio_mp3/PTT-{moment:%Y%m%d}-WA{i:05d}.mp3"
+            audios += 1
+        records.append(record)
+    
+    with open(os.path.join(folder, 'conversation.json'), 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+    return {'messages': messages, 'audios': audios}
+
+def write_media(media_dir: str, audio_paths: List[str], rng: random.Random, size: int = 4096):
+    """Notes vocales factices (contenus distincts) pour les audios référencés"""
+    for audio_path in audio_paths:
+        path = os.path.join(media_dir, os.path.basename(audio_path))
+        with open(path, 'wb') as f:
+            f.write(b'OggS' + rng.randbytes(size))
+
+def generate_export(target_dir: str, contacts: int = 20, messages: int = 2000, audio_ratio: float = 0.1,
+                    file_size: int = 0, conversation_ratio: float = 0.2, seed: int = 0,
+                    media: bool = True) -> Dict:
+    """Génère html/, media/ et output/ sous target_dir, retourne un résumé du contenu"""
+    rng = random.Random(seed)
+    html_dir = os.path.join(target_dir, 'html')
+    media_dir = os.path.join(target_dir, 'media')
+    output_dir = os.path.join(target_dir, 'output')
+    for directory in (html_dir, media_dir, output_dir):
+        os.makedirs(directory, exist_ok=True)
+    
+    summary = {
+        'html_dir': html_dir,
+        'media_dir': media_dir,
+        'output_dir': output_dir,
+        'html_files': 0,
+        'html_bytes': 0,
+        'conversation_files': 0,
+        'messages': 0,
+        'audios': 0
+    }
+    
+    for i, name in enumerate(contact_names(contacts, rng)):
+        if rng.random() < conversation_ratio:
+            counts = write_conversation_folder(output_dir, name, messages, audio_ratio, rng)
+            summary['conversation_files'] += 1
+        else:
+            path = os.path.join(html_dir, f"chat_{i:04d}.html")
+            counts = write_html_chat(path, name, messages, audio_ratio, rng, file_size)
+            if media:
+                write_media(media_dir, counts['audio_paths'], rng)
+            summary['html_files'] += 1
+            summary['html_bytes'] += os.path.getsize(path)
+        summary['messages'] += counts['messages']
+        summary['audios'] += counts['audios']
+    
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('target_dir')
+    parser.add_argument('--contacts', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=2000, help='Bulles par contact')
+    parser.add_argument('--audio-ratio', type=float, default=0.1)
+    parser.add_argument('--file-size-kb', type=int, default=0,
+                        help='Taille visée par fichier HTML (remplace --messages)')
+    parser.add_argument('--conversation-ratio', type=float, default=0.2,
+                        help='Part des contacts exportés en conversation.json plutôt qu\'en HTML')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-media', action='store_true', help='Ne pas écrire de notes vocales factices')
+    args = parser.parse_args()
+    
+    summary = generate_export(args.target_dir, args.contacts, args.messages, args.audio_ratio,
+                              args.file_size_kb * 1024, args.conversation_ratio, args.seed,
+                              media=not args.no_media)
+    print(f"[SYNTHÈSE] {summary['html_files']} fichiers HTML ({summary['html_bytes'] / 1024 / 1024:.1f} Mo), "
+          f"{summary['conversation_files']} conversation.json, "
+          f"{summary['messages']} messages, {summary['audios']} audios")
+    print(f"[SYNTHÈSE] config.ini: html_dir = {summary['html_dir']}, media_dir = {summary['media_dir']}, "
+          f"output_dir = {summary['output_dir']}")
+
+if __name__ == "__main__":
+    main()
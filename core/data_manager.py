@@ -1,174 +1,304 @@
 """
 DataManager - Source unique de vérité pour toutes les données
 """
-import os
-import json
+import re
 import hashlib
-from typing import Dict, List, Optional, Set
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
 
+from core.rollups import StatsRollups
+from core.storage import open_storage
+from utils.metrics import metrics
+
+def normalize_contact_name(name: str) -> str:
+    """Normalise un nom de contact (lettres ASCII, chiffres, espaces, +, -, _, @, .)"""
+    # Garder lettres, chiffres, espaces, +, -, _
+    clean = re.sub(r'[^a-zA-Z0-9\s+\-_@.]', '', name)
+    clean = re.sub(r'\s+', ' ', clean).strip()
+    
+    # Limiter la longueur
+    if len(clean) > 200:
+        clean = clean[:200]
+    
+    # Si vide, générer un nom
+    if not clean:
+        clean = f"Contact_{hashlib.md5(name.encode()).hexdigest()[:8]}"
+    
+    return clean
+
 class DataManager:
-    def __init__(self, output_dir: str):
+    def __init__(self, output_dir: str, backend: str = 'json', storage_options: Optional[Dict] = None,
+                 rollups: bool = True):
         self.output_dir = output_dir
-        self.data_file = os.path.join(output_dir, 'whatsapp_data.json')
-        self.data = self._load_or_create()
-        
-    def _load_or_create(self) -> Dict:
-        """Charge ou crée la structure de données unifiée"""
-        if os.path.exists(self.data_file):
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        
-        return {
-            'version': '3.0',
-            'created': datetime.now().isoformat(),
-            'contacts': {},  # Structure principale par contact
-            'stats': {
-                'total_messages': 0,
-                'total_audios': 0,
-                'total_transcribed': 0,
-                'last_update': None
-            }
-        }
+        self._name_cache: Dict[str, str] = {}
+        # Accès concurrents (mode pipeline): extraction et transcription dans deux threads
+        self.lock = threading.RLock()
+        # Abonnés aux mutations (index de recherche): on_message, on_audio, on_transcription,
+        # flush(révision) après chaque écriture durable, close
+        self.listeners: List = []
+        # Profondeur de batch par thread: les écritures durables sont différées jusqu'à la sortie
+        self._local = threading.local()
+        # Backend de stockage (JSON historique ou SQLite)
+        with metrics.stage('storage.open'):
+            self.storage = open_storage(output_dir, backend, storage_options)
+        # Statistiques précalculées (whatsapp_stats.db), lues par --stats sans charger les données
+        self.rollups: Optional[StatsRollups] = None
+        if rollups:
+            with metrics.stage('stats.sync'):
+                self.rollups = StatsRollups(output_dir)
+                self.rollups.sync(self)
+    
+    @property
+    def _batch_depth(self) -> int:
+        return getattr(self._local, 'batch_depth', 0)
+    
+    @_batch_depth.setter
+    def _batch_depth(self, value: int):
+        self._local.batch_depth = value
+    
+    def add_listener(self, listener):
+        """Abonne un objet aux mutations (voir SearchIndex)"""
+        with self.lock:
+            self.listeners.append(listener)
     
     def save(self):
-        """Sauvegarde atomique"""
-        temp_file = self.data_file + '.tmp'
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
-        os.replace(temp_file, self.data_file)
-    
-    def add_contact(self, contact_name: str) -> Dict:
-        """Ajoute ou récupère un contact"""
+        """Sauvegarde atomique complète (compaction du journal)"""
+        with self.lock, metrics.stage('storage.save') as stage:
+            self._measure_writes(stage, self.storage.save)
+            self._flush_listeners()
+    
+    def flush(self):
+        """Rend durables les mutations en attente (hors batch du thread appelant)"""
+        if self._batch_depth == 0:
+            with self.lock, metrics.stage('storage.flush') as stage:
+                self._measure_writes(stage, self.storage.flush)
+                self._flush_listeners()
+    
+    def _flush_listeners(self):
+        if self.rollups is not None:
+            self.rollups.flush(self.storage.revision)
+        for listener in self.listeners:
+            listener.flush(self.storage.revision)
+    
+    def _measure_writes(self, stage, write):
+        """Exécute une écriture du backend et compte les octets écrits (si le backend les mesure)"""
+        before = self.storage.bytes_written
+        write()
+        if before is not None:
+            stage.add('bytes', self.storage.bytes_written - before)
+    
+    @contextmanager
+    def batch(self):
+        """Regroupe de nombreuses mutations en une seule écriture durable"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            self.flush()
+    
+    def close(self):
+        """Ferme le backend de stockage (les mutations en attente sont écrites)"""
+        with self.lock:
+            revision = self.storage.revision
+            self.storage.close()
+            # Abonnés mis à jour après l'écriture des données: jamais en avance sur elles
+            if self.rollups is not None:
+                self.rollups.flush(revision)
+                self.rollups.close()
+                self.rollups = None
+            for listener in self.listeners:
+                listener.flush(revision)
+                listener.close()
+            self.listeners = []
+    
+    def add_contact(self, contact_name: str) -> str:
+        """Ajoute ou récupère un contact, retourne son nom normalisé"""
         # Normaliser le nom (garder jusqu'à 200 caractères)
         clean_name = self._normalize_name(contact_name)
-        
-        if clean_name not in self.data['contacts']:
-            self.data['contacts'][clean_name] = {
-                'original_name': contact_name,
-                'messages': [],
-                'audios': [],
-                'stats': {
-                    'text_count': 0,
-                    'audio_count': 0,
-                    'transcribed_count': 0
-                }
-            }
-        
-        return self.data['contacts'][clean_name]
+        with self.lock:
+            self.storage.add_contact(clean_name, contact_name)
+            if self.rollups is not None:
+                self.rollups.on_contact(clean_name, contact_name)
+        return clean_name
     
     def add_message(self, contact: str, message: Dict):
         """Ajoute un message texte"""
-        contact_data = self.add_contact(contact)
-        
         # Créer un ID unique pour le message
         msg_id = hashlib.md5(
             f"{contact}{message.get('date', '')}{message.get('time', '')}{message.get('content', '')}".encode()
         ).hexdigest()[:16]
         
-        # Éviter les doublons
-        existing_ids = {m['id'] for m in contact_data['messages'] if 'id' in m}
-        if msg_id not in existing_ids:
-            message['id'] = msg_id
-            contact_data['messages'].append(message)
-            contact_data['stats']['text_count'] += 1
-            self.data['stats']['total_messages'] += 1
+        with self.lock:
+            clean_name = self.add_contact(contact)
+            # Éviter les doublons (index d'IDs du backend)
+            if self.storage.insert_message(clean_name, msg_id, message):
+                if self.rollups is not None:
+                    self.rollups.on_message(clean_name, message)
+                for listener in self.listeners:
+                    listener.on_message(clean_name, msg_id, message)
     
     def add_audio(self, contact: str, audio_info: Dict) -> str:
         """Ajoute un fichier audio et retourne son ID"""
-        contact_data = self.add_contact(contact)
-        
+        return self.insert_audio(contact, audio_info)[1]
+    
+    def insert_audio(self, contact: str, audio_info: Dict) -> Tuple[str, str, bool]:
+        """Ajoute un fichier audio, retourne (contact normalisé, ID, True si nouveau)"""
         # Créer un ID unique pour l'audio
         audio_id = hashlib.md5(
             f"{contact}{audio_info.get('path', '')}{audio_info.get('date', '')}".encode()
         ).hexdigest()
         
-        # Vérifier si déjà existe
-        existing_ids = {a['id'] for a in contact_data['audios'] if 'id' in a}
-        if audio_id not in existing_ids:
-            audio_info['id'] = audio_id
-            audio_info['transcription'] = None  # Placeholder
-            audio_info['transcription_status'] = 'pending'
-            contact_data['audios'].append(audio_info)
-            contact_data['stats']['audio_count'] += 1
-            self.data['stats']['total_audios'] += 1
+        with self.lock:
+            clean_name = self.add_contact(contact)
+            # Vérifier si déjà existe
+            added = self.storage.insert_audio(clean_name, audio_id, audio_info)
+            if added:
+                if self.rollups is not None:
+                    self.rollups.on_audio(clean_name, audio_info)
+                for listener in self.listeners:
+                    listener.on_audio(clean_name, audio_id, audio_info)
         
-        return audio_id
+        return clean_name, audio_id, added
     
-    def update_transcription(self, contact: str, audio_id: str, transcription: str, status: str = 'success'):
-        """Met à jour la transcription d'un audio"""
-        contact_data = self.data['contacts'].get(self._normalize_name(contact))
-        if not contact_data:
-            return False
-        
-        for audio in contact_data['audios']:
-            if audio.get('id') == audio_id:
-                audio['transcription'] = transcription
-                audio['transcription_status'] = status
-                audio['transcribed_at'] = datetime.now().isoformat()
-                
-                if status == 'success' and transcription:
-                    contact_data['stats']['transcribed_count'] += 1
-                    self.data['stats']['total_transcribed'] += 1
-                
-                self.save()
-                return True
+    def update_transcription(self, contact: str, audio_id: str, transcription: str, status: str = 'success',
+                             error: Optional[str] = None):
+        """Met à jour la transcription d'un audio (`error`: raison d'un échec)"""
+        clean_name = self._normalize_name(contact)
+        with self.lock:
+            previous = self.storage.set_transcription(
+                clean_name,
+                audio_id,
+                transcription,
+                status,
+                datetime.now().isoformat(),
+                error
+            )
+            updated = previous is not None
+            if updated:
+                if self.rollups is not None:
+                    self.rollups.on_transcription(clean_name, previous, status, error)
+                for listener in self.listeners:
+                    listener.on_transcription(clean_name, audio_id, transcription, status)
         
-        return False
+        if updated:
+            self.flush()
+        return updated
     
     def get_all_pending_audios(self) -> List[Dict]:
         """Récupère tous les audios non transcrits"""
-        pending = []
-        
-        for contact_name, contact_data in self.data['contacts'].items():
-            for audio in contact_data['audios']:
-                if audio.get('transcription_status') == 'pending':
-                    pending.append({
-                        'contact': contact_name,
-                        'audio': audio
-                    })
+        with self.lock:
+            return [
+                {'contact': contact_name, 'audio': audio}
+                for contact_name, audio in self.storage.iter_pending_audios()
+            ]
+    
+    def get_failed_audios(self, error: str) -> List[Dict]:
+        """Audios en erreur pour la raison `error`, copiés et remis en attente"""
+        with self.lock:
+            return [
+                {'contact': contact_name,
+                 'audio': dict(audio, transcription=None, transcription_status='pending')}
+                for contact_name, _ in self.storage.iter_contacts()
+                for audio in self.storage.iter_audios(contact_name)
+                if audio.get('transcription_status') == 'error' and audio.get('error_message') == error
+            ]
+    
+    def iter_pending_audios(self) -> Iterator[Dict]:
+        """Audios non transcrits un par un, sans construire la liste complète.
         
-        return pending
+        Le verrou est tenu pendant l'itération: la consommer entièrement avant
+        de modifier les données.
+        """
+        with self.lock:
+            for contact_name, audio in self.storage.iter_pending_audios():
+                yield {'contact': contact_name, 'audio': audio}
+    
+    def get_stats(self) -> Dict:
+        """Compteurs globaux (messages, audios, transcriptions)"""
+        with self.lock:
+            return self.storage.get_stats()
+    
+    def contact_count(self) -> int:
+        """Nombre de contacts connus"""
+        with self.lock:
+            return self.storage.contact_count()
+    
+    @property
+    def dataset_id(self) -> str:
+        """Identifiant du jeu de données (change si les données sont recréées)"""
+        return self.storage.dataset_id
+    
+    @property
+    def revision(self) -> int:
+        """Compteur persistant des mutations, incrémenté à chaque modification"""
+        return self.storage.revision
+    
+    def changed_contacts(self, since: int) -> List[str]:
+        """Contacts (noms normalisés) modifiés depuis la révision `since`"""
+        return self.storage.changed_contacts(since)
+    
+    def iter_contacts(self) -> Iterator[Tuple[str, str]]:
+        """(nom normalisé, nom original) de chaque contact"""
+        return self.storage.iter_contacts()
+    
+    def iter_messages(self, contact_name: str) -> Iterator[Dict]:
+        """Messages d'un contact (nom normalisé), dans l'ordre d'insertion"""
+        return self.storage.iter_messages(contact_name)
+    
+    def iter_audios(self, contact_name: str) -> Iterator[Dict]:
+        """Audios d'un contact (nom normalisé), dans l'ordre d'insertion"""
+        return self.storage.iter_audios(contact_name)
     
     def get_export_data(self) -> Dict[str, str]:
         """Prépare les données pour l'export"""
         export = {}
         
-        for contact_name, contact_data in self.data['contacts'].items():
-            contents = []
-            
-            # Messages texte
-            for msg in sorted(contact_data['messages'], key=lambda x: (x.get('date', ''), x.get('time', ''))):
-                if msg.get('direction') in ['received', 'sent']:  # Inclure les deux
-                    contents.append(msg.get('content', ''))
-            
-            # Transcriptions audio
-            for audio in sorted(contact_data['audios'], key=lambda x: (x.get('date', ''), x.get('time', ''))):
-                if audio.get('transcription'):
-                    contents.append(f"[AUDIO] {audio['transcription']}")
-                elif audio.get('transcription_status') == 'error':
-                    contents.append(f"[AUDIO] [Erreur: {audio.get('error_message', 'Transcription échouée')}]")
-                else:
-                    contents.append("[AUDIO] [Non transcrit]")
-            
+        for contact, contact_name in self.iter_export():
             # Joindre tout le contenu
-            export[contact_data.get('original_name', contact_name)] = " | ".join(contents) if contents else "[Aucun contenu]"
+            parts = list(self.iter_export_contents(contact_name))
+            export[contact] = " | ".join(parts) if parts else "[Aucun contenu]"
         
         return export
     
-    def _normalize_name(self, name: str) -> str:
-        """Normalise un nom de contact"""
-        import re
-        # Garder lettres, chiffres, espaces, +, -, _
-        clean = re.sub(r'[^a-zA-Z0-9\s+\-_@.]', '', name)
-        clean = re.sub(r'\s+', ' ', clean).strip()
+    def iter_export(self) -> Iterator[Tuple[str, str]]:
+        """Génère (nom affiché, nom normalisé) par contact, trié par nom affiché.
         
-        # Limiter la longueur
-        if len(clean) > 200:
-            clean = clean[:200]
+        Les contenus se lisent ensuite avec iter_export_contents(), sans jamais
+        joindre l'historique d'un contact en mémoire.
+        """
+        # Un nom affiché partagé par deux contacts garde le dernier (comme l'export par dict)
+        names = {}
+        for contact_name, original_name in self.storage.iter_contacts():
+            names[original_name] = contact_name
         
-        # Si vide, générer un nom
-        if not clean:
-            clean = f"Contact_{hashlib.md5(name.encode()).hexdigest()[:8]}"
+        for original_name in sorted(names):
+            yield original_name, names[original_name]
+    
+    def iter_export_contents(self, contact_name: str) -> Iterator[str]:
+        """Contenus exportés d'un contact: messages puis transcriptions audio"""
+        # Messages texte
+        for msg in self.storage.iter_messages(contact_name, ordered=True):
+            if msg.get('direction') in ['received', 'sent']:  # Inclure les deux
+                yield msg.get('content', '')
+        
+        # Transcriptions audio
+        for audio in self.storage.iter_audios(contact_name, ordered=True):
+            if audio.get('transcription'):
+                yield f"[AUDIO] {audio['transcription']}"
+            elif audio.get('transcription_status') == 'error':
+                yield f"[AUDIO] [Erreur: {audio.get('error_message') or 'Transcription échouée'}]"
+            else:
+                yield "[AUDIO] [Non transcrit]"
+    
+    def _normalize_name(self, name: str) -> str:
+        """Normalise un nom de contact"""
+        cached = self._name_cache.get(name)
+        if cached is not None:
+            return cached
         
+        clean = normalize_contact_name(name)
+        self._name_cache[name] = clean
         return clean
@@ -0,0 +1,124 @@
+"""
+SourceManifest - Suivi des fichiers sources déjà extraits (taille, mtime, hash)
+"""
+import os
+import json
+from typing import Dict, List, Optional, Set
+from utils.helpers import file_fingerprint
+
+class SourceManifest:
+    """Manifeste des sources stocké à côté de whatsapp_data.json.
+
+    Un fichier dont la taille et le mtime n'ont pas changé est considéré comme
+    inchangé sans être relu; sinon son contenu est haché pour distinguer une
+    simple modification de date d'un vrai changement. Le manifeste porte le
+    dataset_id des données qu'il décrit: il est oublié si elles ont été
+    supprimées ou remplacées.
+    """
+    
+    NEW = 'new'
+    MODIFIED = 'modified'
+    UNCHANGED = 'unchanged'
+    
+    def __init__(self, output_dir: str):
+        self.manifest_file = os.path.join(output_dir, 'whatsapp_sources.json')
+        self.dataset_id: Optional[str] = None
+        self.files: Dict[str, Dict] = self._load()
+        # Chemins vus pendant cette exécution (pour détecter les disparitions)
+        self._seen: Set[str] = set()
+        # Hash calculés par check() et réutilisés par record()
+        self._digests: Dict[str, str] = {}
+        self.counts = {self.NEW: 0, self.MODIFIED: 0, self.UNCHANGED: 0}
+    
+    def reset_counts(self):
+        """Remet à zéro les compteurs (nouvelle passe d'extraction)"""
+        self.counts = {self.NEW: 0, self.MODIFIED: 0, self.UNCHANGED: 0}
+    
+    def _load(self) -> Dict[str, Dict]:
+        if os.path.exists(self.manifest_file):
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                self.dataset_id = manifest.get('dataset_id')
+                return manifest.get('files', {})
+            except (OSError, ValueError) as e:
+                print(f"[ATTENTION] Manifeste illisible, extraction complète: {e}")
+        return {}
+    
+    def reset_if_foreign(self, dataset_id: str):
+        """Oublie les sources extraites dans un autre jeu de données (supprimé ou remplacé)"""
+        if self.dataset_id != dataset_id:
+            if self.files:
+                print(f"[ATTENTION] Manifeste des sources d'un autre jeu de données: "
+                      f"{len(self.files)} sources seront réextraites")
+            self.dataset_id = dataset_id
+            self.files = {}
+            self._digests = {}
+    
+    def save(self):
+        """Sauvegarde atomique"""
+        temp_file = self.manifest_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'dataset_id': self.dataset_id, 'files': self.files},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.manifest_file)
+    
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+    
+    @staticmethod
+    def _digest(path: str) -> str:
+        """SHA-256 du contenu, lu par blocs"""
+        return file_fingerprint(path, 'sha256')
+    
+    def check(self, path: str) -> str:
+        """Statut d'un fichier source: 'new', 'modified' ou 'unchanged'"""
+        key = self._key(path)
+        self._seen.add(key)
+        stats = os.stat(path)
+        entry = self.files.get(key)
+        
+        if entry and entry['size'] == stats.st_size and entry['mtime_ns'] == stats.st_mtime_ns:
+            status = self.UNCHANGED
+        else:
+            digest = self._digest(path)
+            self._digests[key] = digest
+            if entry is None:
+                status = self.NEW
+            elif entry.get('sha256') == digest:
+                # Seul le mtime a changé: mettre à jour sans réextraire
+                self._store(key, stats, digest)
+                status = self.UNCHANGED
+            else:
+                status = self.MODIFIED
+        
+        self.counts[status] += 1
+        return status
+    
+    def record(self, path: str):
+        """Enregistre un fichier source après une extraction réussie"""
+        key = self._key(path)
+        self._seen.add(key)
+        digest = self._digests.pop(key, None) or self._digest(path)
+        self._store(key, os.stat(path), digest)
+    
+    def _store(self, key: str, stats: os.stat_result, digest: str):
+        self.files[key] = {
+            'size': stats.st_size,
+            'mtime_ns': stats.st_mtime_ns,
+            'sha256': digest
+        }
+    
+    def pop_vanished(self, roots: Optional[List[str]] = None) -> List[str]:
+        """Retire du manifeste et retourne les sources disparues sous `roots`"""
+        prefixes = [self._key(root) + os.sep for root in roots or []]
+        vanished = [
+            path for path in self.files
+            if path not in self._seen
+            and (not prefixes or any(path.startswith(p) for p in prefixes))
+            and not os.path.exists(path)
+        ]
+        for path in vanished:
+            del self.files[path]
+        return sorted(vanished)
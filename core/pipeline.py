@@ -0,0 +1,60 @@
+"""
+Pipeline - File bornée entre l'extraction et la transcription (mode --pipeline)
+"""
+import queue
+import threading
+from typing import Dict, Iterator, Optional
+
+class AudioQueue:
+    """File bornée des audios découverts pendant l'extraction.
+
+    L'extracteur publie (publish) et bloque quand la file est pleine: la
+    transcription régule ainsi l'extraction et la mémoire reste bornée. Le
+    consommateur itère sur la file; il reçoit None quand elle est momentanément
+    vide (pour traiter les résultats déjà disponibles) et l'itération s'arrête
+    après close(), ou aussitôt après abandon() sans vider la file.
+    """
+    
+    _CLOSED = object()
+    
+    def __init__(self, maxsize: int = 1000, idle_timeout: float = 0.2):
+        self.queue: 'queue.Queue' = queue.Queue(maxsize=max(1, maxsize))
+        self.idle_timeout = idle_timeout
+        # Consommateur arrêté (erreur): les publications sont ignorées au lieu de bloquer
+        self.abandoned = threading.Event()
+        self.published = 0
+        self.max_size = 0
+    
+    def publish(self, item: Dict):
+        while not self.abandoned.is_set():
+            try:
+                self.queue.put(item, timeout=self.idle_timeout)
+                self.published += 1
+                self.max_size = max(self.max_size, self.queue.qsize())
+                return
+            except queue.Full:
+                continue
+    
+    def close(self):
+        """Signale la fin de l'extraction"""
+        while not self.abandoned.is_set():
+            try:
+                self.queue.put(self._CLOSED, timeout=self.idle_timeout)
+                return
+            except queue.Full:
+                continue
+    
+    def abandon(self):
+        """Arrêt sans vider la file: les audios non consommés restent en attente dans les données"""
+        self.abandoned.set()
+    
+    def __iter__(self) -> Iterator[Optional[Dict]]:
+        while not self.abandoned.is_set():
+            try:
+                item = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                yield None
+                continue
+            if item is self._CLOSED:
+                return
+            yield item
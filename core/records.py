@@ -0,0 +1,266 @@
+"""
+Records - Représentation compacte en mémoire des messages et audios
+
+Chaque enregistrement est une classe à __slots__ qui se comporte comme le dict
+historique (get, [], in, items) et redevient un dict du schéma JSON avec to_dict().
+La date et l'heure canoniques ('YYYY/MM/DD', 'HH:MM') sont regroupées dans un
+seul entier (YYYYMMDDHHMM); les valeurs répétées (direction, type, statut) sont
+internées pour n'exister qu'une fois en mémoire.
+"""
+from typing import Dict, Iterator, Optional, Tuple
+
+# Horodatage de ('', ''): message rencontré avant la première date du fichier
+EMPTY_STAMP = 0
+
+class _Absent:
+    """Marque une clé absente du dict d'origine (distincte d'une valeur None)"""
+    __slots__ = ()
+    
+    def __repr__(self):
+        return '<absent>'
+
+ABSENT = _Absent()
+
+# Valeurs répétées (direction, type, statut): une seule instance de chaque chaîne
+_SHARED_VALUES: Dict = {ABSENT: ABSENT, None: None}
+
+def _intern(value):
+    return _SHARED_VALUES.setdefault(value, value)
+
+# Dates et heures se répètent (un jour, une minute): leur code est mémorisé
+_DAY_CODES: Dict[str, Optional[int]] = {'': -1}
+_MINUTE_CODES: Dict[str, Optional[int]] = {'': -1}
+_CODE_CACHE_MAX = 100000
+
+def _parse_day(date: str) -> Optional[int]:
+    """'YYYY/MM/DD' -> YYYYMMDD (None si la chaîne n'est pas canonique)"""
+    if len(date) == 10 and date[4] == '/' and date[7] == '/':
+        digits = date[0:4] + date[5:7] + date[8:10]
+        if digits.isascii() and digits.isdigit():
+            return int(digits) or None
+    return None
+
+def _parse_minute(time: str) -> Optional[int]:
+    """'HH:MM' -> HHMM (None si la chaîne n'est pas canonique)"""
+    if len(time) == 5 and time[2] == ':':
+        digits = time[0:2] + time[3:5]
+        if digits.isascii() and digits.isdigit():
+            return int(digits)
+    return None
+
+def _remember(cache: Dict, value: str, code: Optional[int]) -> Optional[int]:
+    if len(cache) < _CODE_CACHE_MAX:
+        cache[value] = code
+    return code
+
+def pack_timestamp(date, time) -> Optional[int]:
+    """Entier YYYYMMDDHHMM pour une date et une heure canoniques, sinon None"""
+    if type(date) is not str or type(time) is not str:
+        return None
+    
+    day = _DAY_CODES.get(date, ABSENT)
+    if day is ABSENT:
+        day = _remember(_DAY_CODES, date, _parse_day(date))
+    minute = _MINUTE_CODES.get(time, ABSENT)
+    if minute is ABSENT:
+        minute = _remember(_MINUTE_CODES, time, _parse_minute(time))
+    
+    if day is None or minute is None:
+        return None
+    if day == -1 or minute == -1:
+        # ('', ''): message rencontré avant la première date; un seul des deux vide n'est pas packé
+        return EMPTY_STAMP if day == minute else None
+    return day * 10000 + minute
+
+def unpack_timestamp(stamp: int) -> Tuple[str, str]:
+    """Inverse de pack_timestamp: ('YYYY/MM/DD', 'HH:MM')"""
+    if stamp == EMPTY_STAMP:
+        return '', ''
+    digits = f"{stamp:012d}"
+    return f"{digits[0:4]}/{digits[4:6]}/{digits[6:8]}", f"{digits[8:10]}:{digits[10:12]}"
+
+class _Record:
+    """Interface commune façon dict (lecture et écriture des clés du schéma)"""
+    __slots__ = ()
+    
+    # Clés du schéma dans l'ordre JSON ('date' représente aussi 'time')
+    FIELDS: Tuple[str, ...] = ()
+    # Clés stockées dans un slot du même nom
+    SLOTS: frozenset = frozenset()
+    # Clés dont la valeur est internée
+    INTERNED: Tuple[str, ...] = ()
+    
+    def _timestamp_items(self) -> Iterator[Tuple[str, str]]:
+        if self.stamp is not None:
+            date, time = unpack_timestamp(self.stamp)
+            yield 'date', date
+            yield 'time', time
+    
+    def items(self) -> Iterator[Tuple[str, object]]:
+        stamped = False
+        for key in self.FIELDS:
+            if key == 'date':
+                stamped = True
+                yield from self._timestamp_items()
+                continue
+            value = getattr(self, key)
+            if value is not ABSENT:
+                yield key, value
+        if not stamped:
+            yield from self._timestamp_items()
+        if self.extra:
+            yield from self.extra.items()
+    
+    def to_dict(self) -> Dict:
+        return dict(self.items())
+    
+    def keys(self):
+        return self.to_dict().keys()
+    
+    def values(self):
+        return self.to_dict().values()
+    
+    def __iter__(self):
+        return iter(self.to_dict())
+    
+    def __len__(self):
+        return len(self.to_dict())
+    
+    def __getitem__(self, key: str):
+        if key in self.SLOTS:
+            value = getattr(self, key)
+            if value is ABSENT:
+                raise KeyError(key)
+            return value
+        if (key == 'date' or key == 'time') and self.stamp is not None:
+            date, time = unpack_timestamp(self.stamp)
+            return date if key == 'date' else time
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+    
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def __contains__(self, key: str) -> bool:
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+    
+    def __setitem__(self, key: str, value):
+        if key in self.SLOTS:
+            setattr(self, key, _intern(value) if key in self.INTERNED else value)
+            return
+        if (key == 'date' or key == 'time') and self.stamp is not None:
+            # Date ou heure modifiée séparément: repasser en chaînes
+            date, time = unpack_timestamp(self.stamp)
+            self.stamp = None
+            self.extra = dict(self.extra or {}, date=date, time=time)
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (_Record, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+    
+    @classmethod
+    def _extra(cls, data: Dict, stamp: Optional[int]) -> Optional[Dict]:
+        """Clés hors schéma (et date/heure non canoniques), dans leur ordre d'origine"""
+        extra = {
+            key: value for key, value in data.items()
+            if key not in cls.SLOTS and (stamp is None or (key != 'date' and key != 'time'))
+        }
+        return extra or None
+
+class MessageRecord(_Record):
+    """Message texte: {'date', 'time', 'content', 'direction', 'type', 'id'}"""
+    __slots__ = ('content', 'direction', 'type', 'id', 'stamp', 'extra')
+    
+    FIELDS = ('date', 'content', 'direction', 'type', 'id')
+    SLOTS = frozenset(('content', 'direction', 'type', 'id'))
+    INTERNED = ('direction', 'type')
+    
+    @classmethod
+    def from_dict(cls, data: Dict, record_id: Optional[str] = None) -> 'MessageRecord':
+        """Construit l'enregistrement depuis un dict du schéma JSON (le dict n'est pas modifié)"""
+        record = cls.__new__(cls)
+        get = data.get
+        record.content = get('content', ABSENT)
+        record.direction = _intern(get('direction', ABSENT))
+        record.type = _intern(get('type', ABSENT))
+        record.id = get('id', ABSENT) if record_id is None else record_id
+        record.stamp = stamp = pack_timestamp(get('date', ABSENT), get('time', ABSENT))
+        
+        # Cas courant: uniquement les clés du schéma, rien à ranger dans extra
+        known = ((record.content is not ABSENT) + (record.direction is not ABSENT)
+                 + (record.type is not ABSENT) + ('id' in data) + (2 if stamp is not None else 0))
+        record.extra = cls._extra(data, stamp) if len(data) > known else None
+        return record
+    
+    def to_dict(self) -> Dict:
+        # Cas courant construit directement, sans passer par items()
+        if (self.stamp is None or self.extra is not None or self.content is ABSENT
+                or self.direction is ABSENT or self.type is ABSENT or self.id is ABSENT):
+            return dict(self.items())
+        date, time = unpack_timestamp(self.stamp)
+        return {'date': date, 'time': time, 'content': self.content,
+                'direction': self.direction, 'type': self.type, 'id': self.id}
+
+class AudioRecord(_Record):
+    """Audio: {'path', 'date', 'time', 'direction', 'id', 'transcription', 'transcription_status', ...}"""
+    __slots__ = ('path', 'direction', 'id', 'transcription', 'transcription_status', 'transcribed_at',
+                 'stamp', 'extra')
+    
+    FIELDS = ('path', 'date', 'direction', 'id', 'transcription', 'transcription_status', 'transcribed_at')
+    SLOTS = frozenset(('path', 'direction', 'id', 'transcription', 'transcription_status', 'transcribed_at'))
+    INTERNED = ('direction', 'transcription_status')
+    
+    @classmethod
+    def from_dict(cls, data: Dict, record_id: Optional[str] = None) -> 'AudioRecord':
+        """Construit l'enregistrement depuis un dict du schéma JSON (le dict n'est pas modifié)"""
+        record = cls.__new__(cls)
+        get = data.get
+        record.path = get('path', ABSENT)
+        record.direction = _intern(get('direction', ABSENT))
+        record.id = get('id', ABSENT) if record_id is None else record_id
+        record.transcription = get('transcription', ABSENT)
+        record.transcription_status = _intern(get('transcription_status', ABSENT))
+        record.transcribed_at = get('transcribed_at', ABSENT)
+        record.stamp = stamp = pack_timestamp(get('date', ABSENT), get('time', ABSENT))
+        record.extra = cls._extra(data, stamp)
+        return record
+
+def records_to_plain(obj):
+    """Hook `default` de json.dump / msgpack: enregistrement -> dict"""
+    if isinstance(obj, _Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def plain_document(data: Dict) -> Dict:
+    """Copie du document dont les listes d'enregistrements sont redevenues des dicts"""
+    contacts = {}
+    for contact_name, contact_data in data['contacts'].items():
+        contacts[contact_name] = dict(
+            contact_data,
+            messages=[m.to_dict() if isinstance(m, _Record) else m for m in contact_data['messages']],
+            audios=[a.to_dict() if isinstance(a, _Record) else a for a in contact_data['audios']]
+        )
+    return dict(data, contacts=contacts)
+
+def compact_contact(contact_data: Dict) -> Dict:
+    """Remplace en place les dicts d'un contact par des enregistrements compacts"""
+    contact_data['messages'] = [MessageRecord.from_dict(m) for m in contact_data['messages']]
+    contact_data['audios'] = [AudioRecord.from_dict(a) for a in contact_data['audios']]
+    return contact_data
@@ -0,0 +1,275 @@
+"""
+Rollups - Statistiques précalculées par contact et par jour (whatsapp_stats.db)
+"""
+import os
+import time
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from utils.helpers import date_key
+
+STATS_FILE = 'whatsapp_stats.db'
+# Raison d'un échec enregistré sans cause (données antérieures aux raisons d'erreur)
+UNKNOWN_ERROR = 'Transcription échouée'
+# Jour des messages sans date exploitable
+UNDATED = ''
+
+def day_of(record: Dict) -> str:
+    """Jour AAAA-MM-JJ d'un message ou d'un audio ('' si la date est inconnue)"""
+    key = date_key(record.get('date'))
+    return f"{key[0:4]}-{key[4:6]}-{key[6:8]}" if key else UNDATED
+
+class StatsRollups:
+    """Compteurs des données tenus à jour au fil des mutations du DataManager.
+
+    Par contact et par jour: messages, audios, envoyés et reçus (messages et
+    audios confondus); par contact: audios par statut de transcription et
+    échecs par raison. Les mutations s'accumulent en mémoire et sont écrites
+    en une transaction à chaque flush, avec la révision des données: la base
+    n'est jamais en avance sur elles. sync() recalcule les contacts modifiés
+    depuis cette révision (arrêt brutal, données modifiées sans statistiques).
+    read_stats() n'ouvre que ce fichier, jamais les données principales.
+    Appelé sous le verrou du DataManager.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS days (
+            contact TEXT NOT NULL,
+            day TEXT NOT NULL,
+            messages INTEGER NOT NULL DEFAULT 0,
+            audios INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            received INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (contact, day)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS statuses (
+            contact TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (contact, status)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS errors (
+            contact TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (contact, reason)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS contacts (name TEXT PRIMARY KEY, original_name TEXT);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+    
+    def __init__(self, output_dir: str):
+        self.stats_file = os.path.join(output_dir, STATS_FILE)
+        self.conn = sqlite3.connect(self.stats_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self._revision = int(self._meta('revision') or 0)
+        self._reset_deltas()
+    
+    def _reset_deltas(self):
+        # Variations en attente du prochain flush
+        self._days: Dict[Tuple[str, str], List[int]] = {}
+        self._statuses: Dict[Tuple[str, str], int] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self._contacts: Dict[str, str] = {}
+    
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def _set_meta(self, key: str, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+    
+    # --- Suivi des mutations ---
+    
+    def sync(self, data_manager) -> int:
+        """Recalcule les contacts modifiés depuis la dernière révision enregistrée, retourne leur nombre"""
+        start = time.monotonic()
+        since = int(self._meta('revision') or 0)
+        revision = data_manager.revision
+        if self._meta('dataset_id') != data_manager.dataset_id or revision < since:
+            # Données recréées ou restaurées: tout recalculer
+            for table in ('days', 'statuses', 'errors', 'contacts'):
+                self.conn.execute(f"DELETE FROM {table}")
+            self._set_meta('dataset_id', data_manager.dataset_id)
+            since = 0
+        
+        changed = data_manager.changed_contacts(since) if revision > since else []
+        names = dict(data_manager.iter_contacts()) if changed else {}
+        for contact_name in changed:
+            for table in ('days', 'statuses', 'errors'):
+                self.conn.execute(f"DELETE FROM {table} WHERE contact = ?", (contact_name,))
+            self.on_contact(contact_name, names.get(contact_name, contact_name))
+            for message in data_manager.iter_messages(contact_name):
+                self.on_message(contact_name, message)
+            for audio in data_manager.iter_audios(contact_name):
+                self._count_audio(contact_name, audio)
+        
+        self._revision = -1
+        self.flush(revision)
+        if changed:
+            print(f"[STATS] Statistiques recalculées: {len(changed)} contacts ({time.monotonic() - start:.2f}s)")
+        return len(changed)
+    
+    def _count_audio(self, contact_name: str, audio: Dict):
+        """Audio existant (sync): compté avec son statut actuel"""
+        self.on_audio(contact_name, audio)
+        status = audio.get('transcription_status') or 'pending'
+        if status != 'pending':
+            self.on_transcription(contact_name, ('pending', None), status, audio.get('error_message'))
+    
+    def _add_day(self, contact_name: str, record: Dict, column: int):
+        key = (contact_name, day_of(record))
+        counts = self._days.get(key)
+        if counts is None:
+            # messages, audios, envoyés, reçus
+            counts = self._days[key] = [0, 0, 0, 0]
+        counts[column] += 1
+        direction = record.get('direction')
+        if direction == 'sent':
+            counts[2] += 1
+        elif direction == 'received':
+            counts[3] += 1
+    
+    def on_contact(self, contact_name: str, original_name: str):
+        self._contacts[contact_name] = original_name
+    
+    def on_message(self, contact_name: str, message: Dict):
+        self._add_day(contact_name, message, 0)
+    
+    def on_audio(self, contact_name: str, audio: Dict):
+        """Nouvel audio: toujours inséré en attente de transcription"""
+        self._add_day(contact_name, audio, 1)
+        key = (contact_name, 'pending')
+        self._statuses[key] = self._statuses.get(key, 0) + 1
+    
+    def on_transcription(self, contact_name: str, previous: Tuple[Optional[str], Optional[str]],
+                         status: str, error: Optional[str] = None):
+        """Changement de statut d'un audio: `previous` = (statut, raison d'échec) avant la mise à jour"""
+        previous_status, previous_error = previous
+        previous_status = previous_status or 'pending'
+        for key, delta in (((contact_name, previous_status), -1), ((contact_name, status), 1)):
+            self._statuses[key] = self._statuses.get(key, 0) + delta
+        if previous_status == 'error':
+            key = (contact_name, previous_error or UNKNOWN_ERROR)
+            self._errors[key] = self._errors.get(key, 0) - 1
+        if status == 'error':
+            key = (contact_name, error or UNKNOWN_ERROR)
+            self._errors[key] = self._errors.get(key, 0) + 1
+    
+    def flush(self, revision: int):
+        """Écrit les variations accumulées (données écrites jusqu'à `revision`)"""
+        if revision == self._revision and not (self._days or self._statuses or self._errors or self._contacts):
+            return
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO contacts (name, original_name) VALUES (?, ?)", self._contacts.items()
+        )
+        self.conn.executemany(
+            "INSERT INTO days (contact, day, messages, audios, sent, received) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (contact, day) DO UPDATE SET messages = messages + excluded.messages, "
+            "audios = audios + excluded.audios, sent = sent + excluded.sent, received = received + excluded.received",
+            [key + tuple(counts) for key, counts in self._days.items()]
+        )
+        for table, column, deltas in (('statuses', 'status', self._statuses), ('errors', 'reason', self._errors)):
+            self.conn.executemany(
+                f"INSERT INTO {table} (contact, {column}, count) VALUES (?, ?, ?) "
+                f"ON CONFLICT (contact, {column}) DO UPDATE SET count = count + excluded.count",
+                [key + (delta,) for key, delta in deltas.items() if delta]
+            )
+            if deltas:
+                self.conn.execute(f"DELETE FROM {table} WHERE count <= 0")
+        self._reset_deltas()
+        
+        self._set_meta('revision', revision)
+        self._set_meta('updated', datetime.now().isoformat(timespec='seconds'))
+        self.conn.commit()
+        self._revision = revision
+    
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+def read_stats(output_dir: str, contact: Optional[str] = None, since: Optional[str] = None) -> Optional[Dict]:
+    """Statistiques précalculées, sans ouvrir les données principales (None si absentes).
+
+    `contact` (correspondance partielle sur le nom) ajoute le détail par jour
+    des contacts retenus; `since` (AAAA-MM-JJ) limite les comptes par jour
+    à partir de cette date. Les statuts de transcription ne sont pas datés.
+    """
+    stats_file = os.path.join(output_dir, STATS_FILE)
+    if not os.path.exists(stats_file):
+        return None
+    if since:
+        key = date_key(since)
+        if not key:
+            raise ValueError(f"Date invalide: {since} (format attendu: AAAA-MM-JJ)")
+        since = f"{key[0:4]}-{key[4:6]}-{key[6:8]}"
+    
+    conn = sqlite3.connect(f"file:{stats_file}?mode=ro", uri=True)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        conditions, params = [], []
+        if contact:
+            conditions.append("(c.name LIKE ? OR c.original_name LIKE ?)")
+            params = [f"%{contact}%", f"%{contact}%"]
+        where = "WHERE " + conditions[0] if conditions else ""
+        day_conditions = conditions + (["d.day >= ?"] if since else [])
+        day_where = "WHERE " + " AND ".join(day_conditions) if day_conditions else ""
+        day_params = params + ([since] if since else [])
+        
+        contacts = {}
+        for name, original_name in conn.execute(
+                f"SELECT c.name, COALESCE(c.original_name, c.name) FROM contacts c {where}", params):
+            contacts[name] = {
+                'name': name, 'original_name': original_name, 'messages': 0, 'audios': 0,
+                'sent': 0, 'received': 0, 'first_day': None, 'last_day': None,
+                'transcriptions': {}, 'errors': {}
+            }
+        
+        rows = conn.execute(
+            f"SELECT d.contact, d.day, d.messages, d.audios, d.sent, d.received FROM days d "
+            f"JOIN contacts c ON c.name = d.contact {day_where} ORDER BY d.contact, d.day", day_params
+        )
+        for name, day, messages, audios, sent, received in rows:
+            entry = contacts[name]
+            entry['messages'] += messages
+            entry['audios'] += audios
+            entry['sent'] += sent
+            entry['received'] += received
+            if day:
+                entry['first_day'] = entry['first_day'] or day
+                entry['last_day'] = day
+            if contact:
+                entry.setdefault('days', []).append({'day': day or None, 'messages': messages, 'audios': audios,
+                                                     'sent': sent, 'received': received})
+        
+        for table, column, key in (('statuses', 'status', 'transcriptions'), ('errors', 'reason', 'errors')):
+            for name, value, count in conn.execute(
+                    f"SELECT d.contact, d.{column}, d.count FROM {table} d "
+                    f"JOIN contacts c ON c.name = d.contact {where}", params):
+                contacts[name][key][value] = count
+    finally:
+        conn.close()
+    
+    totals = {'contacts': len(contacts), 'messages': 0, 'audios': 0, 'sent': 0, 'received': 0}
+    transcriptions: Dict[str, int] = {}
+    errors: Dict[str, int] = {}
+    for entry in contacts.values():
+        for key in ('messages', 'audios', 'sent', 'received'):
+            totals[key] += entry[key]
+        for status, count in entry['transcriptions'].items():
+            transcriptions[status] = transcriptions.get(status, 0) + count
+        for reason, count in entry['errors'].items():
+            errors[reason] = errors.get(reason, 0) + count
+    
+    return {
+        'dataset_id': meta.get('dataset_id'),
+        'revision': int(meta.get('revision') or 0),
+        'updated': meta.get('updated'),
+        'since': since,
+        'totals': totals,
+        'transcriptions': transcriptions,
+        'errors': dict(sorted(errors.items(), key=lambda item: -item[1])),
+        'contacts': sorted(contacts.values(), key=lambda entry: (-entry['messages'] - entry['audios'], entry['name']))
+    }
@@ -0,0 +1,119 @@
+"""
+Snapshot - Formats de snapshot du backend JSON (JSON indenté, binaire compact)
+
+Format binaire (whatsapp_data.bin): en-tête fixe suivi du document sérialisé
+    magic (4 octets) | version (1) | codec (1) | longueur (8) | crc32 (4) | données
+Le codec est msgpack s'il est installé, sinon marshal (bibliothèque standard).
+Le format marshal n'est pas garanti stable d'une version de Python à l'autre:
+avec ce codec le backend garde aussi le snapshot JSON, relu si le binaire ne
+l'est plus.
+"""
+import os
+import json
+import struct
+import zlib
+import marshal
+from typing import Dict, Optional
+
+from core.records import plain_document, records_to_plain
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAGIC = b'WADS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sBBQI')
+
+CODEC_MSGPACK = 1
+CODEC_MARSHAL = 2
+CODEC_NAMES = {CODEC_MSGPACK: 'msgpack', CODEC_MARSHAL: 'marshal'}
+
+FORMATS = ('json', 'binary', 'both')
+
+class SnapshotError(ValueError):
+    """Snapshot binaire absent, tronqué, corrompu ou illisible ici"""
+
+def default_codec() -> int:
+    return CODEC_MSGPACK if msgpack is not None else CODEC_MARSHAL
+
+def _dumps(data: Dict, codec: int) -> bytes:
+    if codec == CODEC_MSGPACK:
+        return msgpack.packb(data, use_bin_type=True, default=records_to_plain)
+    # marshal ne connaît que les types natifs: copie du document en dicts
+    return marshal.dumps(plain_document(data))
+
+def _loads(payload: bytes, codec: int) -> Dict:
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise SnapshotError("snapshot msgpack mais le module msgpack n'est pas installé")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    # marshal lève ValueError/EOFError/TypeError sur des données invalides
+    return marshal.loads(payload)
+
+def write_binary(path: str, data: Dict, codec: Optional[int] = None) -> int:
+    """Écriture atomique d'un snapshot binaire, retourne le nombre d'octets écrits"""
+    codec = codec or default_codec()
+    payload = _dumps(data, codec)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, codec, len(payload), zlib.crc32(payload))
+    
+    temp_file = path + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(header)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, path)
+    return len(header) + len(payload)
+
+def read_binary(path: str) -> Dict:
+    """Lit et vérifie un snapshot binaire, lève SnapshotError s'il est invalide"""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise SnapshotError(f"{path}: en-tête tronqué")
+        
+        magic, version, codec, length, crc = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path}: signature inconnue")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"{path}: version de format {version} non prise en charge")
+        if codec not in CODEC_NAMES:
+            raise SnapshotError(f"{path}: codec {codec} inconnu")
+        
+        payload = f.read(length)
+    
+    if len(payload) != length:
+        raise SnapshotError(f"{path}: données tronquées ({len(payload)}/{length} octets)")
+    if zlib.crc32(payload) != crc:
+        raise SnapshotError(f"{path}: somme de contrôle invalide")
+    
+    try:
+        data = _loads(payload, codec)
+    except (ValueError, EOFError, TypeError) as e:
+        raise SnapshotError(f"{path}: décodage {CODEC_NAMES[codec]} impossible ({e})")
+    if not isinstance(data, dict) or 'contacts' not in data:
+        raise SnapshotError(f"{path}: document inattendu")
+    return data
+
+def write_json(path: str, data: Dict) -> int:
+    """Écriture atomique du snapshot JSON indenté historique, retourne le nombre d'octets écrits"""
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=records_to_plain)
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(temp_file, path)
+    return size
+
+def read_json(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def read_snapshot(path: str) -> Dict:
+    """Lit un snapshot selon son extension (.bin binaire, sinon JSON)"""
+    if path.endswith('.bin'):
+        return read_binary(path)
+    return read_json(path)
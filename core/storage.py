@@ -0,0 +1,1091 @@
+"""
+Storage - Backends de stockage pour DataManager (JSON historique, SQLite, shards par contact)
+"""
+import os
+import json
+import uuid
+import sqlite3
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from datetime import datetime
+
+from core.records import ABSENT, AudioRecord, MessageRecord, compact_contact, records_to_plain
+from core.snapshot import (CODEC_MSGPACK, FORMATS, SnapshotError, default_codec, read_binary,
+                           read_json, write_binary, write_json)
+
+# Fichiers du backend json: leur présence déclenche la migration vers sqlite ou sharded
+JSON_STORE_FILES = ('whatsapp_data.json', 'whatsapp_data.bin', 'whatsapp_data.journal.jsonl')
+
+def new_dataset() -> Dict:
+    """Structure vide du document whatsapp_data.json"""
+    return {
+        'version': '3.0',
+        'created': datetime.now().isoformat(),
+        # Identifiant du jeu de données et compteur de mutations (caches d'export)
+        'dataset_id': uuid.uuid4().hex,
+        'revision': 0,
+        'contacts': {},  # Structure principale par contact
+        'stats': {
+            'total_messages': 0,
+            'total_audios': 0,
+            'total_transcribed': 0,
+            'last_update': None
+        }
+    }
+
+def new_contact(original_name: str) -> Dict:
+    """Structure vide d'un contact"""
+    return {
+        'original_name': original_name,
+        # Révision de la dernière mutation du contact
+        'revision': 0,
+        'messages': [],
+        'audios': [],
+        'stats': {
+            'text_count': 0,
+            'audio_count': 0,
+            'transcribed_count': 0
+        }
+    }
+
+def legacy_dataset_id(created: Optional[str]) -> str:
+    """Identifiant stable pour un fichier antérieur aux dataset_id (dérivé de sa date de création)"""
+    return hashlib.md5((created or '').encode()).hexdigest()
+
+def _sort_key(item: Dict) -> Tuple:
+    return (item.get('date', ''), item.get('time', ''))
+
+def _set_audio_transcription(audio: Dict, transcription: Optional[str], status: str, transcribed_at: str,
+                             error: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Écrit le résultat d'une transcription dans un audio, retourne (statut, raison d'échec) précédents"""
+    previous = (audio.get('transcription_status'), audio.get('error_message'))
+    audio['transcription'] = transcription
+    audio['transcription_status'] = status
+    audio['transcribed_at'] = transcribed_at
+    # Raison d'échec lue par l'export; effacée quand l'audio n'est plus en erreur
+    if error or audio.get('error_message') is not None:
+        audio['error_message'] = error if status == 'error' else None
+    return previous
+
+class JsonStorage:
+    """Stockage historique: un snapshot JSON en mémoire + journal JSONL des mutations"""
+    
+    name = 'json'
+    OPTIONS = ('compact_interval', 'compact_bytes', 'snapshot_format', 'compact_records')
+    
+    def __init__(self, output_dir: str, compact_interval: float = 300,
+                 compact_bytes: int = 64 * 1024 * 1024, snapshot_format: str = 'json',
+                 compact_records: bool = True):
+        if snapshot_format not in FORMATS:
+            raise ValueError(f"Format de snapshot inconnu: {snapshot_format} (choix: {', '.join(FORMATS)})")
+        
+        self.output_dir = output_dir
+        self.data_file = os.path.join(output_dir, 'whatsapp_data.json')
+        # Snapshot binaire compact (msgpack ou marshal), chargé en priorité s'il est valide
+        self.binary_file = os.path.join(output_dir, 'whatsapp_data.bin')
+        self.snapshot_format = snapshot_format
+        # Messages/audios en enregistrements à __slots__ (moins de mémoire, chargement plus long)
+        self.compact_records = compact_records
+        self.journal_file = os.path.join(output_dir, 'whatsapp_data.journal.jsonl')
+        # Compaction du journal dans le snapshot (intervalle en secondes ou taille en octets)
+        self.compact_interval = compact_interval
+        self.compact_bytes = compact_bytes
+        # Index en mémoire par contact (construits une seule fois au chargement)
+        self._message_ids: Dict[str, Set[str]] = {}
+        self._audio_index: Dict[str, Dict[str, Dict]] = {}
+        # Journal: opérations en attente d'écriture et numéro de séquence
+        self._pending_ops: List[str] = []
+        self._journal = None
+        self._journal_seq = 0
+        self._replaying = False
+        self._identity_replayed = False
+        # Octets écrits (journal et snapshots) depuis l'ouverture, pour les mesures
+        self.bytes_written = 0
+        self.data = self._load_or_create()
+        self._last_compaction = time.monotonic()
+    
+    def _load_or_create(self) -> Dict:
+        """Charge le snapshot (ou crée la structure) puis rejoue le journal"""
+        data = self._read_snapshot()
+        has_snapshot = data is not None
+        if not has_snapshot:
+            data = new_dataset()
+        
+        self._journal_seq = data.get('journal_seq', 0)
+        data.setdefault('dataset_id', legacy_dataset_id(data.get('created')))
+        data.setdefault('revision', 0)
+        self._build_indexes(data)
+        self.data = data
+        self._replay_journal()
+        
+        # Sans snapshot, l'identité du jeu de données vit dans le journal
+        if not has_snapshot and not self._identity_replayed:
+            self._log({'op': 'dataset', 'dataset_id': data['dataset_id'], 'created': data['created']})
+        return data
+    
+    def _read_snapshot(self) -> Optional[Dict]:
+        """Snapshot le plus rapide à charger parmi ceux valides (binaire puis JSON)"""
+        if os.path.exists(self.binary_file):
+            try:
+                return read_binary(self.binary_file)
+            except SnapshotError as e:
+                # Sans JSON de secours, repartir d'un document vide perdrait les données
+                if not os.path.exists(self.data_file):
+                    raise
+                print(f"[ATTENTION] Snapshot binaire ignoré: {e}")
+        
+        if os.path.exists(self.data_file):
+            return read_json(self.data_file)
+        return None
+    
+    def _build_indexes(self, data: Dict):
+        """Construit les index d'IDs (messages, audios) pour chaque contact"""
+        self._message_ids = {}
+        self._audio_index = {}
+        
+        for contact_name, contact_data in data['contacts'].items():
+            if self.compact_records:
+                compact_contact(contact_data)
+            self._message_ids[contact_name] = {
+                m['id'] for m in contact_data['messages'] if 'id' in m
+            }
+            self._audio_index[contact_name] = {
+                a['id']: a for a in contact_data['audios'] if 'id' in a
+            }
+    
+    def _replay_journal(self):
+        """Rejoue les opérations du journal postérieures au snapshot"""
+        if not os.path.exists(self.journal_file):
+            return
+        
+        replayed = 0
+        valid_size = 0
+        self._replaying = True
+        try:
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        op = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        # Dernière ligne tronquée par un arrêt brutal
+                        break
+                    
+                    valid_size += len(line)
+                    if op['seq'] <= self._journal_seq:
+                        continue
+                    
+                    self._apply(op)
+                    self._journal_seq = op['seq']
+                    replayed += 1
+        finally:
+            self._replaying = False
+        
+        # Retirer une fin tronquée pour que les prochains ajouts restent lisibles
+        if valid_size < os.path.getsize(self.journal_file):
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(valid_size)
+        
+        if replayed:
+            print(f"[STOCKAGE] Journal: {replayed} opérations rejouées")
+    
+    def _apply(self, op: Dict):
+        """Applique une opération du journal"""
+        kind = op['op']
+        if kind == 'dataset':
+            self.data['dataset_id'] = op['dataset_id']
+            self.data['created'] = op['created']
+            self._identity_replayed = True
+        elif kind == 'contact':
+            self.add_contact(op['contact'], op['original_name'])
+        elif kind == 'message':
+            self.insert_message(op['contact'], op['data']['id'], op['data'])
+        elif kind == 'audio':
+            audio = op['data']
+            self.insert_audio(op['contact'], audio['id'], audio)
+        elif kind == 'transcription':
+            self.set_transcription(op['contact'], op['id'], op['transcription'],
+                                   op['status'], op['transcribed_at'], op.get('error'))
+    
+    def _log(self, op: Dict):
+        """Ajoute une opération au tampon du journal"""
+        if self._replaying:
+            return
+        
+        self._journal_seq += 1
+        op['seq'] = self._journal_seq
+        self._pending_ops.append(json.dumps(op, ensure_ascii=False))
+    
+    def _touch(self, contact_data: Dict):
+        """Incrémente le compteur de mutations et date la dernière modification du contact"""
+        self.data['revision'] += 1
+        contact_data['revision'] = self.data['revision']
+    
+    def flush(self):
+        """Écrit durablement les opérations en attente dans le journal"""
+        if not self._pending_ops:
+            return
+        
+        if self._journal is None:
+            self._journal = open(self.journal_file, 'a', encoding='utf-8')
+        
+        start = self._journal.tell()
+        self._journal.write('\n'.join(self._pending_ops) + '\n')
+        self._journal.flush()
+        self.bytes_written += self._journal.tell() - start
+        os.fsync(self._journal.fileno())
+        self._pending_ops = []
+        
+        # Compaction périodique du journal dans le snapshot
+        if (time.monotonic() - self._last_compaction >= self.compact_interval
+                or self._journal.tell() >= self.compact_bytes):
+            self.save()
+    
+    def save(self):
+        """Compaction: snapshot atomique complet puis remise à zéro du journal"""
+        self._pending_ops = []
+        self.data['journal_seq'] = self._journal_seq
+        
+        # Écrire le(s) format(s) demandé(s), retirer l'autre devenu obsolète
+        if self.snapshot_format in ('binary', 'both'):
+            self.bytes_written += write_binary(self.binary_file, self.data)
+        elif os.path.exists(self.binary_file):
+            os.remove(self.binary_file)
+        
+        # marshal peut changer d'une version de Python à l'autre: sans msgpack,
+        # le JSON est toujours gardé comme snapshot de secours
+        if self.snapshot_format in ('json', 'both') or default_codec() != CODEC_MSGPACK:
+            self.bytes_written += write_json(self.data_file, self.data)
+        elif os.path.exists(self.data_file):
+            os.remove(self.data_file)
+        
+        # Le snapshot couvre tout le journal (journal_seq): on peut le vider
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self._last_compaction = time.monotonic()
+    
+    def close(self):
+        self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+    
+    # --- Écritures ---
+    
+    def _record(self, record_class, data: Dict, record_id: str):
+        """Copie du dict reçu avec son ID, compacte ou non selon compact_records"""
+        if self.compact_records:
+            return record_class.from_dict(data, record_id)
+        return dict(data, id=record_id)
+    
+    def add_contact(self, contact_name: str, original_name: str) -> Dict:
+        if contact_name not in self.data['contacts']:
+            self.data['contacts'][contact_name] = new_contact(original_name)
+            self._touch(self.data['contacts'][contact_name])
+            self._message_ids[contact_name] = set()
+            self._audio_index[contact_name] = {}
+            self._log({'op': 'contact', 'contact': contact_name, 'original_name': original_name})
+        
+        return self.data['contacts'][contact_name]
+    
+    def insert_message(self, contact_name: str, msg_id: str, message: Dict) -> bool:
+        """Insère un message s'il est nouveau, retourne True si ajouté"""
+        message_ids = self._message_ids[contact_name]
+        if msg_id in message_ids:
+            return False
+        
+        contact_data = self.data['contacts'][contact_name]
+        record = self._record(MessageRecord, message, msg_id)
+        contact_data['messages'].append(record)
+        message_ids.add(msg_id)
+        contact_data['stats']['text_count'] += 1
+        self.data['stats']['total_messages'] += 1
+        self._touch(contact_data)
+        self._log({'op': 'message', 'contact': contact_name, 'data': dict(record.items())})
+        return True
+    
+    def insert_audio(self, contact_name: str, audio_id: str, audio_info: Dict) -> bool:
+        """Insère un audio s'il est nouveau, retourne True si ajouté"""
+        audio_index = self._audio_index[contact_name]
+        if audio_id in audio_index:
+            return False
+        
+        contact_data = self.data['contacts'][contact_name]
+        record = self._record(AudioRecord, audio_info, audio_id)
+        record['transcription'] = None  # Placeholder
+        record['transcription_status'] = 'pending'
+        contact_data['audios'].append(record)
+        audio_index[audio_id] = record
+        contact_data['stats']['audio_count'] += 1
+        self.data['stats']['total_audios'] += 1
+        self._touch(contact_data)
+        self._log({'op': 'audio', 'contact': contact_name, 'data': dict(record.items())})
+        return True
+    
+    def set_transcription(self, contact_name: str, audio_id: str, transcription: Optional[str],
+                          status: str, transcribed_at: str,
+                          error: Optional[str] = None) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """Met à jour la transcription d'un audio.
+        
+        Retourne (statut, raison d'échec) de l'audio avant la mise à jour, None
+        si l'audio est introuvable.
+        """
+        contact_data = self.data['contacts'].get(contact_name)
+        if not contact_data:
+            return None
+        
+        audio = self._audio_index[contact_name].get(audio_id)
+        if audio is None:
+            return None
+        
+        previous = _set_audio_transcription(audio, transcription, status, transcribed_at, error)
+        
+        if status == 'success' and transcription:
+            contact_data['stats']['transcribed_count'] += 1
+            self.data['stats']['total_transcribed'] += 1
+        self._touch(contact_data)
+        
+        op = {
+            'op': 'transcription',
+            'contact': contact_name,
+            'id': audio_id,
+            'transcription': transcription,
+            'status': status,
+            'transcribed_at': transcribed_at
+        }
+        if error:
+            op['error'] = error
+        self._log(op)
+        return previous
+    
+    # --- Lectures ---
+    
+    def iter_contacts(self) -> Iterator[Tuple[str, str]]:
+        """Itère (nom normalisé, nom original) dans l'ordre d'insertion"""
+        for contact_name, contact_data in self.data['contacts'].items():
+            yield contact_name, contact_data.get('original_name', contact_name)
+    
+    def iter_messages(self, contact_name: str, ordered: bool = False) -> Iterator[Dict]:
+        messages = self.data['contacts'][contact_name]['messages']
+        return iter(sorted(messages, key=_sort_key) if ordered else messages)
+    
+    def iter_audios(self, contact_name: str, ordered: bool = False) -> Iterator[Dict]:
+        audios = self.data['contacts'][contact_name]['audios']
+        return iter(sorted(audios, key=_sort_key) if ordered else audios)
+    
+    def iter_pending_audios(self) -> Iterator[Tuple[str, Dict]]:
+        for contact_name, contact_data in self.data['contacts'].items():
+            for audio in contact_data['audios']:
+                if audio.get('transcription_status') == 'pending':
+                    yield contact_name, audio
+    
+    def contact_count(self) -> int:
+        return len(self.data['contacts'])
+    
+    @property
+    def dataset_id(self) -> str:
+        return self.data['dataset_id']
+    
+    @property
+    def revision(self) -> int:
+        return self.data['revision']
+    
+    def changed_contacts(self, since: int) -> List[str]:
+        """Contacts modifiés après la révision `since`"""
+        return [
+            contact_name for contact_name, contact_data in self.data['contacts'].items()
+            if contact_data.get('revision', 0) > since
+        ]
+    
+    def get_stats(self) -> Dict:
+        return dict(self.data['stats'])
+
+class SqliteStorage:
+    """Stockage SQLite (mode WAL) avec requêtes indexées par ID et statut"""
+    
+    name = 'sqlite'
+    OPTIONS = ()
+    # Écritures par pages gérées par SQLite: octets écrits non mesurés
+    bytes_written = None
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS contacts (
+            position INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            original_name TEXT,
+            revision INTEGER NOT NULL DEFAULT 0,
+            text_count INTEGER NOT NULL DEFAULT 0,
+            audio_count INTEGER NOT NULL DEFAULT 0,
+            transcribed_count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            seq INTEGER PRIMARY KEY,
+            contact TEXT NOT NULL,
+            id TEXT NOT NULL,
+            date TEXT,
+            time TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_id ON messages(id, contact);
+        CREATE INDEX IF NOT EXISTS idx_messages_contact ON messages(contact, date, time);
+        CREATE TABLE IF NOT EXISTS audios (
+            seq INTEGER PRIMARY KEY,
+            contact TEXT NOT NULL,
+            id TEXT NOT NULL,
+            date TEXT,
+            time TEXT,
+            transcription_status TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_audios_id ON audios(id, contact);
+        CREATE INDEX IF NOT EXISTS idx_audios_contact ON audios(contact, date, time);
+        CREATE INDEX IF NOT EXISTS idx_audios_status ON audios(transcription_status);
+    """
+    
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.db_file = os.path.join(output_dir, 'whatsapp_data.db')
+        # Migration automatique au premier lancement depuis le backend json (snapshot + journal)
+        if not os.path.exists(self.db_file) and json_store_exists(output_dir):
+            migrate_json_to_sqlite(output_dir, self.db_file)
+        
+        self.conn = self._connect(self.db_file)
+        self._contacts: Set[str] = {
+            row[0] for row in self.conn.execute("SELECT name FROM contacts")
+        }
+        
+        # Compteur de mutations (persisté dans meta à chaque validation)
+        meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        self.dataset_id = meta.get('dataset_id')
+        if not self.dataset_id:
+            self.dataset_id = uuid.uuid4().hex
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dataset_id', ?)",
+                              (self.dataset_id,))
+            self.conn.commit()
+        max_revision = self.conn.execute("SELECT COALESCE(MAX(revision), 0) FROM contacts").fetchone()[0]
+        self.revision = max(int(meta.get('revision') or 0), max_revision)
+    
+    @classmethod
+    def _connect(cls, db_file: str) -> sqlite3.Connection:
+        # Connexion partagée entre threads (mode pipeline), accès sérialisés par DataManager.lock
+        conn = sqlite3.connect(db_file, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(cls.SCHEMA)
+        # Bases créées avant le suivi des révisions
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(contacts)")}
+        if 'revision' not in columns:
+            conn.execute("ALTER TABLE contacts ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_contacts_revision ON contacts(revision)")
+        conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '3.0'), ('created', ?)",
+            (datetime.now().isoformat(),)
+        )
+        conn.commit()
+        return conn
+    
+    def flush(self):
+        """Valide la transaction en cours (WAL: écriture durable incrémentale)"""
+        self._commit()
+    
+    def save(self):
+        """Valide la transaction en cours"""
+        self._commit()
+    
+    def close(self):
+        self._commit()
+        self.conn.close()
+    
+    def _commit(self):
+        if self.conn.in_transaction:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', ?)",
+                              (str(self.revision),))
+        self.conn.commit()
+    
+    def _touch(self, contact_name: str, counter: Optional[str] = None):
+        """Incrémente le compteur de mutations (et un compteur du contact) dans la même requête"""
+        self.revision += 1
+        increment = f", {counter} = {counter} + 1" if counter else ""
+        self.conn.execute(
+            f"UPDATE contacts SET revision = ?{increment} WHERE name = ?", (self.revision, contact_name)
+        )
+    
+    # --- Écritures ---
+    
+    def add_contact(self, contact_name: str, original_name: str):
+        if contact_name not in self._contacts:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO contacts (name, original_name) VALUES (?, ?)",
+                (contact_name, original_name)
+            )
+            self._contacts.add(contact_name)
+            self._touch(contact_name)
+    
+    def insert_message(self, contact_name: str, msg_id: str, message: Dict) -> bool:
+        exists = self.conn.execute(
+            "SELECT 1 FROM messages WHERE id = ? AND contact = ?", (msg_id, contact_name)
+        ).fetchone()
+        if exists:
+            return False
+        
+        # Copie: le dict de l'appelant n'est pas modifié (comme les autres backends)
+        message = dict(message, id=msg_id)
+        self.conn.execute(
+            "INSERT INTO messages (contact, id, date, time, data) VALUES (?, ?, ?, ?, ?)",
+            (contact_name, msg_id, message.get('date'), message.get('time'),
+             json.dumps(message, ensure_ascii=False))
+        )
+        self._touch(contact_name, 'text_count')
+        return True
+    
+    def insert_audio(self, contact_name: str, audio_id: str, audio_info: Dict) -> bool:
+        exists = self.conn.execute(
+            "SELECT 1 FROM audios WHERE id = ? AND contact = ?", (audio_id, contact_name)
+        ).fetchone()
+        if exists:
+            return False
+        
+        # Copie: le dict de l'appelant n'est pas modifié (comme les autres backends)
+        audio = dict(audio_info, id=audio_id, transcription=None, transcription_status='pending')
+        self._insert_audio_row(contact_name, audio)
+        self._touch(contact_name, 'audio_count')
+        return True
+    
+    def _insert_audio_row(self, contact_name: str, audio: Dict):
+        self.conn.execute(
+            "INSERT INTO audios (contact, id, date, time, transcription_status, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (contact_name, audio['id'], audio.get('date'), audio.get('time'),
+             audio.get('transcription_status'), json.dumps(audio, ensure_ascii=False))
+        )
+    
+    def set_transcription(self, contact_name: str, audio_id: str, transcription: Optional[str],
+                          status: str, transcribed_at: str,
+                          error: Optional[str] = None) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        row = self.conn.execute(
+            "SELECT seq, data FROM audios WHERE id = ? AND contact = ?", (audio_id, contact_name)
+        ).fetchone()
+        if row is None:
+            return None
+        
+        audio = json.loads(row[1])
+        previous = _set_audio_transcription(audio, transcription, status, transcribed_at, error)
+        self.conn.execute(
+            "UPDATE audios SET transcription_status = ?, data = ? WHERE seq = ?",
+            (status, json.dumps(audio, ensure_ascii=False), row[0])
+        )
+        
+        self._touch(contact_name, 'transcribed_count' if status == 'success' and transcription else None)
+        return previous
+    
+    # --- Lectures ---
+    
+    def iter_contacts(self) -> Iterator[Tuple[str, str]]:
+        rows = self.conn.execute(
+            "SELECT name, COALESCE(original_name, name) FROM contacts ORDER BY position"
+        ).fetchall()
+        return iter(rows)
+    
+    def iter_messages(self, contact_name: str, ordered: bool = False) -> Iterator[Dict]:
+        order = "date, time, seq" if ordered else "seq"
+        cursor = self.conn.execute(
+            f"SELECT data FROM messages WHERE contact = ? ORDER BY {order}", (contact_name,)
+        )
+        return (json.loads(row[0]) for row in cursor)
+    
+    def iter_audios(self, contact_name: str, ordered: bool = False) -> Iterator[Dict]:
+        order = "date, time, seq" if ordered else "seq"
+        cursor = self.conn.execute(
+            f"SELECT data FROM audios WHERE contact = ? ORDER BY {order}", (contact_name,)
+        )
+        return (json.loads(row[0]) for row in cursor)
+    
+    def iter_pending_audios(self) -> Iterator[Tuple[str, Dict]]:
+        rows = self.conn.execute(
+            "SELECT a.contact, a.data FROM audios a JOIN contacts c ON c.name = a.contact "
+            "WHERE a.transcription_status = 'pending' ORDER BY c.position, a.seq"
+        ).fetchall()
+        return ((contact, json.loads(data)) for contact, data in rows)
+    
+    def contact_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+    
+    def changed_contacts(self, since: int) -> List[str]:
+        """Contacts modifiés après la révision `since`"""
+        return [row[0] for row in self.conn.execute(
+            "SELECT name FROM contacts WHERE revision > ? ORDER BY position", (since,)
+        )]
+    
+    def get_stats(self) -> Dict:
+        row = self.conn.execute(
+            "SELECT COALESCE(SUM(text_count), 0), COALESCE(SUM(audio_count), 0), "
+            "COALESCE(SUM(transcribed_count), 0) FROM contacts"
+        ).fetchone()
+        return {
+            'total_messages': row[0],
+            'total_audios': row[1],
+            'total_transcribed': row[2],
+            'last_update': None
+        }
+
+def json_store_exists(output_dir: str) -> bool:
+    """Vrai si le backend json a des données (snapshot JSON ou binaire, ou seulement un journal)"""
+    return any(os.path.exists(os.path.join(output_dir, name)) for name in JSON_STORE_FILES)
+
+def migrate_json_to_sqlite(output_dir: str, db_file: str) -> Dict:
+    """Convertit les données du backend json (snapshot + journal) en base SQLite (une seule fois)"""
+    print(f"[STOCKAGE] Migration whatsapp_data -> {db_file}...")
+    
+    # Journal rejoué: les mutations pas encore compactées dans le snapshot sont migrées aussi
+    source = JsonStorage(output_dir, compact_records=False)
+    data = source.data
+    
+    temp_file = db_file + '.tmp'
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+    
+    conn = SqliteStorage._connect(temp_file)
+    counts = {'contacts': 0, 'messages': 0, 'audios': 0}
+    try:
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'created'",
+                     (data.get('created') or datetime.now().isoformat(),))
+        # Conserver l'identité et les révisions: les caches d'export restent valides
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [('dataset_id', source.dataset_id), ('revision', str(source.revision))]
+        )
+        
+        for contact_name, contact_data in data.get('contacts', {}).items():
+            stats = contact_data.get('stats', {})
+            conn.execute(
+                "INSERT INTO contacts (name, original_name, revision, text_count, audio_count, transcribed_count) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (contact_name, contact_data.get('original_name', contact_name), contact_data.get('revision', 0),
+                 stats.get('text_count', 0), stats.get('audio_count', 0),
+                 stats.get('transcribed_count', 0))
+            )
+            counts['contacts'] += 1
+            
+            conn.executemany(
+                "INSERT OR IGNORE INTO messages (contact, id, date, time, data) VALUES (?, ?, ?, ?, ?)",
+                ((contact_name, m['id'], m.get('date'), m.get('time'), json.dumps(m, ensure_ascii=False))
+                 for m in contact_data.get('messages', []) if 'id' in m)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO audios (contact, id, date, time, transcription_status, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((contact_name, a['id'], a.get('date'), a.get('time'),
+                  a.get('transcription_status'), json.dumps(a, ensure_ascii=False))
+                 for a in contact_data.get('audios', []) if 'id' in a)
+            )
+            counts['messages'] += len(contact_data.get('messages', []))
+            counts['audios'] += len(contact_data.get('audios', []))
+        
+        conn.commit()
+    finally:
+        conn.close()
+        source.close()
+    
+    # Le fichier WAL éventuel a été intégré par close()
+    os.replace(temp_file, db_file)
+    print(f"[STOCKAGE] Migration terminée: {counts['contacts']} contacts, "
+          f"{counts['messages']} messages, {counts['audios']} audios")
+    return counts
+
+class ShardedStorage:
+    """Stockage partitionné: un fichier par contact, chargé à la demande (LRU borné en mémoire).
+
+    whatsapp_shards/index.json contient les noms, compteurs et révisions des contacts;
+    les audios en attente de chaque contact sont résumés dans <shard>.pending.json pour
+    lister le travail de transcription sans ouvrir les shards.
+    """
+    
+    name = 'sharded'
+    OPTIONS = ('cache_bytes',)
+    
+    # Rapport approximatif mémoire Python / taille JSON d'un shard (index des IDs inclus)
+    MEMORY_FACTOR = 5
+    
+    def __init__(self, output_dir: str, cache_bytes: int = 256 * 1024 * 1024):
+        self.output_dir = output_dir
+        self.shard_dir = os.path.join(output_dir, 'whatsapp_shards')
+        self.index_file = os.path.join(self.shard_dir, 'index.json')
+        # Shards écrits depuis la dernière écriture de l'index (reprise après arrêt brutal)
+        self.recovery_file = os.path.join(self.shard_dir, 'recovery.json')
+        self.cache_bytes = cache_bytes
+        
+        # Contacts résidents, du moins au plus récemment utilisé
+        self._resident: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._resident_bytes = 0
+        self._message_ids: Dict[str, Set[str]] = {}
+        self._audio_index: Dict[str, Dict[str, Dict]] = {}
+        self._dirty: Set[str] = set()
+        self._unindexed: Set[str] = set()
+        self._index_dirty = False
+        self.loads = 0
+        self.evictions = 0
+        self.bytes_written = 0
+        
+        if not os.path.exists(self.index_file):
+            os.makedirs(self.shard_dir, exist_ok=True)
+            # Migration automatique depuis le backend json (snapshot + journal)
+            if json_store_exists(output_dir):
+                migrate_json_to_shards(output_dir)
+        
+        self.index = self._load_index()
+        if os.path.exists(self.recovery_file):
+            self._recover()
+    
+    def _load_index(self) -> Dict:
+        if os.path.exists(self.index_file):
+            return read_json(self.index_file)
+        
+        dataset = new_dataset()
+        return {
+            'version': 1,
+            'created': dataset['created'],
+            'dataset_id': dataset['dataset_id'],
+            'revision': 0,
+            'stats': dataset['stats'],
+            'contacts': {}
+        }
+    
+    def _recover(self):
+        """Reconstruit l'index des contacts dont le shard a été écrit après l'index"""
+        names = read_json(self.recovery_file)
+        for contact_name in names:
+            entry = self.index['contacts'].get(contact_name)
+            if entry is None or not os.path.exists(self._shard_path(entry)):
+                continue
+            
+            contact_data = read_json(self._shard_path(entry))
+            pending = [a for a in contact_data['audios'] if a.get('transcription_status') == 'pending']
+            entry['revision'] = contact_data.get('revision', 0)
+            entry['stats'] = contact_data['stats']
+            entry['pending'] = len(pending)
+            self._write_pending(entry, pending)
+            self.index['revision'] = max(self.index['revision'], entry['revision'])
+        
+        for key in ('total_messages', 'total_audios', 'total_transcribed'):
+            self.index['stats'][key] = 0
+        for entry in self.index['contacts'].values():
+            self.index['stats']['total_messages'] += entry['stats']['text_count']
+            self.index['stats']['total_audios'] += entry['stats']['audio_count']
+            self.index['stats']['total_transcribed'] += entry['stats']['transcribed_count']
+        
+        self._write_index()
+        print(f"[STOCKAGE] Reprise: {len(names)} shards réindexés")
+    
+    # --- Fichiers ---
+    
+    def _shard_path(self, entry: Dict) -> str:
+        return os.path.join(self.shard_dir, entry['shard'] + '.json')
+    
+    def _pending_path(self, entry: Dict) -> str:
+        return os.path.join(self.shard_dir, entry['shard'] + '.pending.json')
+    
+    @staticmethod
+    def _write_file(path: str, payload) -> int:
+        """Écriture atomique d'un fichier JSON compact, retourne le nombre d'octets écrits"""
+        temp_file = path + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(',', ':'), default=records_to_plain)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(temp_file, path)
+        return size
+    
+    def _write_pending(self, entry: Dict, pending: List[Dict]):
+        path = self._pending_path(entry)
+        if pending:
+            self.bytes_written += self._write_file(path, pending)
+        elif os.path.exists(path):
+            os.remove(path)
+    
+    def _write_shard(self, contact_name: str):
+        """Écrit le shard d'un contact résident et le résumé de ses audios en attente"""
+        if contact_name not in self._unindexed:
+            self._unindexed.add(contact_name)
+            self.bytes_written += self._write_file(self.recovery_file, sorted(self._unindexed))
+        
+        entry = self.index['contacts'][contact_name]
+        contact_data = self._resident[contact_name]
+        self._write_pending(entry, [
+            a for a in contact_data['audios'] if a.get('transcription_status') == 'pending'
+        ])
+        self.bytes_written += self._write_file(self._shard_path(entry), contact_data)
+        self._dirty.discard(contact_name)
+    
+    def _write_index(self):
+        self.bytes_written += self._write_file(self.index_file, self.index)
+        self._index_dirty = False
+        # L'index couvre désormais tous les shards écrits
+        self._unindexed = set()
+        if os.path.exists(self.recovery_file):
+            os.remove(self.recovery_file)
+    
+    def flush(self):
+        """Écrit les shards modifiés puis l'index"""
+        if not self._dirty and not self._index_dirty:
+            return
+        
+        if self._dirty:
+            self._unindexed |= self._dirty
+            self.bytes_written += self._write_file(self.recovery_file, sorted(self._unindexed))
+            for contact_name in list(self._dirty):
+                self._write_shard(contact_name)
+        self._write_index()
+    
+    def save(self):
+        self.flush()
+    
+    def close(self):
+        self.flush()
+        self._resident.clear()
+        self._sizes.clear()
+        self._resident_bytes = 0
+    
+    # --- Cache LRU des contacts ---
+    
+    def _contact(self, contact_name: str) -> Dict:
+        """Contact résident (chargé depuis son shard si besoin), marqué le plus récent"""
+        contact_data = self._resident.get(contact_name)
+        if contact_data is not None:
+            self._resident.move_to_end(contact_name)
+            return contact_data
+        
+        entry = self.index['contacts'][contact_name]
+        path = self._shard_path(entry)
+        contact_data = compact_contact(read_json(path))
+        # Les compteurs de l'index font foi
+        contact_data['stats'] = entry['stats']
+        self.loads += 1
+        self._make_resident(contact_name, contact_data, os.path.getsize(path))
+        return contact_data
+    
+    def _make_resident(self, contact_name: str, contact_data: Dict, size: int):
+        self._resident[contact_name] = contact_data
+        self._message_ids[contact_name] = {m.id for m in contact_data['messages'] if m.id is not ABSENT}
+        self._audio_index[contact_name] = {a.id: a for a in contact_data['audios'] if a.id is not ABSENT}
+        self._sizes[contact_name] = 0
+        self._grow(contact_name, size)
+    
+    def _grow(self, contact_name: str, size: int):
+        size *= self.MEMORY_FACTOR
+        self._sizes[contact_name] += size
+        self._resident_bytes += size
+        if self._resident_bytes > self.cache_bytes:
+            self._evict(keep=contact_name)
+    
+    def _evict(self, keep: str):
+        """Décharge les contacts les moins récemment utilisés jusqu'à repasser sous la limite"""
+        for contact_name in list(self._resident):
+            if self._resident_bytes <= self.cache_bytes:
+                break
+            if contact_name == keep:
+                continue
+            if contact_name in self._dirty:
+                self._write_shard(contact_name)
+            del self._resident[contact_name]
+            del self._message_ids[contact_name]
+            del self._audio_index[contact_name]
+            self._resident_bytes -= self._sizes.pop(contact_name)
+            self.evictions += 1
+    
+    def _touch(self, contact_name: str, contact_data: Dict):
+        """Incrémente le compteur de mutations et marque le contact à écrire"""
+        self.index['revision'] += 1
+        contact_data['revision'] = self.index['revision']
+        self.index['contacts'][contact_name]['revision'] = self.index['revision']
+        self._dirty.add(contact_name)
+        self._index_dirty = True
+    
+    # --- Écritures ---
+    
+    def add_contact(self, contact_name: str, original_name: str):
+        if contact_name in self.index['contacts']:
+            return
+        
+        contact_data = new_contact(original_name)
+        key = hashlib.md5(contact_name.encode('utf-8')).hexdigest()
+        self.index['contacts'][contact_name] = {
+            'original_name': original_name,
+            'shard': key,
+            'revision': 0,
+            'stats': contact_data['stats'],
+            'pending': 0
+        }
+        self._make_resident(contact_name, contact_data, 0)
+        self._touch(contact_name, contact_data)
+    
+    def insert_message(self, contact_name: str, msg_id: str, message: Dict) -> bool:
+        contact_data = self._contact(contact_name)
+        message_ids = self._message_ids[contact_name]
+        if msg_id in message_ids:
+            return False
+        
+        contact_data['messages'].append(MessageRecord.from_dict(message, msg_id))
+        message_ids.add(msg_id)
+        contact_data['stats']['text_count'] += 1
+        self.index['stats']['total_messages'] += 1
+        self._touch(contact_name, contact_data)
+        self._grow(contact_name, len(json.dumps(message, ensure_ascii=False)))
+        return True
+    
+    def insert_audio(self, contact_name: str, audio_id: str, audio_info: Dict) -> bool:
+        contact_data = self._contact(contact_name)
+        audio_index = self._audio_index[contact_name]
+        if audio_id in audio_index:
+            return False
+        
+        record = AudioRecord.from_dict(audio_info, audio_id)
+        record.transcription = None  # Placeholder
+        record.transcription_status = 'pending'
+        contact_data['audios'].append(record)
+        audio_index[audio_id] = record
+        contact_data['stats']['audio_count'] += 1
+        self.index['stats']['total_audios'] += 1
+        self.index['contacts'][contact_name]['pending'] += 1
+        self._touch(contact_name, contact_data)
+        self._grow(contact_name, len(json.dumps(audio_info, ensure_ascii=False)))
+        return True
+    
+    def set_transcription(self, contact_name: str, audio_id: str, transcription: Optional[str],
+                          status: str, transcribed_at: str,
+                          error: Optional[str] = None) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        if contact_name not in self.index['contacts']:
+            return None
+        
+        contact_data = self._contact(contact_name)
+        audio = self._audio_index[contact_name].get(audio_id)
+        if audio is None:
+            return None
+        
+        entry = self.index['contacts'][contact_name]
+        if audio.get('transcription_status') == 'pending' and status != 'pending':
+            entry['pending'] -= 1
+        elif audio.get('transcription_status') != 'pending' and status == 'pending':
+            entry['pending'] += 1
+        
+        previous = _set_audio_transcription(audio, transcription, status, transcribed_at, error)
+        
+        if status == 'success' and transcription:
+            contact_data['stats']['transcribed_count'] += 1
+            self.index['stats']['total_transcribed'] += 1
+        self._touch(contact_name, contact_data)
+        self._grow(contact_name, len(transcription or ''))
+        return previous
+    
+    # --- Lectures ---
+    
+    def iter_contacts(self) -> Iterator[Tuple[str, str]]:
+        for contact_name, entry in list(self.index['contacts'].items()):
+            yield contact_name, entry['original_name']
+    
+    def iter_messages(self, contact_name: str, ordered: bool = False) -> Iterator[Dict]:
+        messages = self._contact(contact_name)['messages']
+        return iter(sorted(messages, key=_sort_key) if ordered else messages)
+    
+    def iter_audios(self, contact_name: str, ordered: bool = False) -> Iterator[Dict]:
+        audios = self._contact(contact_name)['audios']
+        return iter(sorted(audios, key=_sort_key) if ordered else audios)
+    
+    def iter_pending_audios(self) -> Iterator[Tuple[str, Dict]]:
+        """Audios en attente, lus depuis les résumés sans charger les shards"""
+        for contact_name, entry in list(self.index['contacts'].items()):
+            if not entry['pending']:
+                continue
+            
+            contact_data = self._resident.get(contact_name)
+            if contact_data is not None:
+                # Résident: peut contenir des audios pas encore écrits sur disque
+                pending = [a for a in contact_data['audios'] if a.get('transcription_status') == 'pending']
+            else:
+                pending = read_json(self._pending_path(entry))
+            
+            for audio in pending:
+                yield contact_name, audio
+    
+    def contact_count(self) -> int:
+        return len(self.index['contacts'])
+    
+    @property
+    def dataset_id(self) -> str:
+        return self.index['dataset_id']
+    
+    @property
+    def revision(self) -> int:
+        return self.index['revision']
+    
+    def changed_contacts(self, since: int) -> List[str]:
+        """Contacts modifiés après la révision `since`"""
+        return [
+            contact_name for contact_name, entry in self.index['contacts'].items()
+            if entry['revision'] > since
+        ]
+    
+    def get_stats(self) -> Dict:
+        return dict(self.index['stats'])
+
+def migrate_json_to_shards(output_dir: str) -> Dict:
+    """Découpe le document du backend json (snapshot + journal) en un shard par contact"""
+    print("[STOCKAGE] Migration whatsapp_data -> whatsapp_shards...")
+    
+    source = JsonStorage(output_dir)
+    shard_dir = os.path.join(output_dir, 'whatsapp_shards')
+    index = {
+        'version': 1,
+        'created': source.data.get('created'),
+        'dataset_id': source.dataset_id,
+        'revision': source.revision,
+        'stats': dict(source.data['stats']),
+        'contacts': {}
+    }
+    
+    for contact_name, contact_data in source.data['contacts'].items():
+        entry = {
+            'original_name': contact_data.get('original_name', contact_name),
+            'shard': hashlib.md5(contact_name.encode('utf-8')).hexdigest(),
+            'revision': contact_data.get('revision', 0),
+            'stats': contact_data['stats'],
+            'pending': 0
+        }
+        pending = [a for a in contact_data['audios'] if a.get('transcription_status') == 'pending']
+        entry['pending'] = len(pending)
+        ShardedStorage._write_file(os.path.join(shard_dir, entry['shard'] + '.json'), contact_data)
+        if pending:
+            ShardedStorage._write_file(os.path.join(shard_dir, entry['shard'] + '.pending.json'), pending)
+        index['contacts'][contact_name] = entry
+    
+    # L'index en dernier: une migration interrompue est recommencée au prochain lancement
+    ShardedStorage._write_file(os.path.join(shard_dir, 'index.json'), index)
+    source.close()
+    print(f"[STOCKAGE] Migration terminée: {len(index['contacts'])} contacts")
+    return index
+
+BACKENDS = {
+    JsonStorage.name: JsonStorage,
+    SqliteStorage.name: SqliteStorage,
+    ShardedStorage.name: ShardedStorage,
+}
+
+def open_storage(output_dir: str, backend: str = 'json', options: Optional[Dict] = None):
+    """Instancie le backend de stockage demandé"""
+    try:
+        storage_class = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Backend de stockage inconnu: {backend} (choix: {', '.join(BACKENDS)})")
+    
+    # Ne transmettre que les options comprises par le backend
+    options = {k: v for k, v in (options or {}).items() if k in storage_class.OPTIONS and v is not None}
+    return storage_class(output_dir, **options)
@@ -0,0 +1,160 @@
+"""
+Watcher - Surveillance des dossiers sources par scrutation (mode --watch)
+"""
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from processors.media_index import AUDIO_EXTENSIONS
+
+class SourceWatcher:
+    """Détecte les fichiers nouveaux ou modifiés des dossiers sources.
+
+    Chaque scrutation relève (taille, mtime) des fichiers surveillés avec
+    os.scandir, sans lire leur contenu: *.html de html_dir, conversation.json
+    et audio_mp3/* des dossiers de contacts de output_dir, fichiers audio de
+    media_dir (récursif). Les changements sont regroupés (anti-rebond): un lot
+    n'est rendu qu'après `debounce` secondes sans nouveau changement, si bien
+    qu'un export en cours de copie n'est traité qu'une fois complet;
+    `max_delay` borne l'attente quand les changements ne cessent pas.
+    """
+    
+    SOURCE = 'source'
+    MEDIA = 'media'
+    REMOVED = 'removed'
+    
+    def __init__(self, html_dir: Optional[str], media_dir: Optional[str], output_dir: Optional[str],
+                 poll_interval: float = 5, debounce: float = 10, max_delay: float = 300):
+        self.html_dir = html_dir
+        self.media_dir = media_dir
+        self.output_dir = output_dir
+        self.poll_interval = max(0.1, poll_interval)
+        self.debounce = max(0.0, debounce)
+        self.max_delay = max(self.debounce, max_delay)
+        # Dernier relevé: chemin -> (taille, mtime_ns)
+        self.snapshot: Dict[str, Tuple[int, int]] = {}
+        # Changements en attente de stabilisation: chemin -> type (source ou media)
+        self._pending: Dict[str, str] = {}
+        self._removed: Set[str] = set()
+        self._first_change: Optional[float] = None
+        self._last_change: Optional[float] = None
+        self.polls = 0
+    
+    def start(self):
+        """Relevé de référence: seuls les changements ultérieurs seront signalés"""
+        self.snapshot = self.scan()
+    
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        """(taille, mtime_ns) de chaque fichier surveillé"""
+        files = {}
+        
+        if self.html_dir and os.path.isdir(self.html_dir):
+            for entry in self._entries(self.html_dir):
+                if entry.name.endswith('.html'):
+                    self._stat(files, entry)
+        
+        if self.output_dir and os.path.isdir(self.output_dir):
+            for folder in self._entries(self.output_dir, files=False):
+                if folder.name.startswith('.'):
+                    continue
+                conv_file = os.path.join(folder.path, 'conversation.json')
+                try:
+                    stats = os.stat(conv_file)
+                    files[conv_file] = (stats.st_size, stats.st_mtime_ns)
+                except OSError:
+                    pass
+                audio_dir = os.path.join(folder.path, 'audio_mp3')
+                if os.path.isdir(audio_dir):
+                    for entry in self._entries(audio_dir):
+                        if entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                            self._stat(files, entry)
+        
+        if self.media_dir and os.path.isdir(self.media_dir):
+            directories = [self.media_dir]
+            while directories:
+                directory = directories.pop()
+                for entry in self._entries(directory, files=None):
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                        self._stat(files, entry)
+        
+        return files
+    
+    @staticmethod
+    def _entries(directory: str, files: Optional[bool] = True) -> List[os.DirEntry]:
+        """Entrées d'un dossier: fichiers (True), dossiers (False) ou tout (None)"""
+        try:
+            with os.scandir(directory) as entries:
+                if files is None:
+                    return list(entries)
+                return [entry for entry in entries if (entry.is_file() if files else entry.is_dir())]
+        except OSError:
+            # Dossier supprimé ou inaccessible pendant le parcours
+            return []
+    
+    @staticmethod
+    def _stat(files: Dict[str, Tuple[int, int]], entry: os.DirEntry):
+        try:
+            stats = entry.stat()
+        except OSError:
+            return
+        files[entry.path] = (stats.st_size, stats.st_mtime_ns)
+    
+    def _kind(self, path: str) -> str:
+        if os.path.basename(path) == 'conversation.json' or path.endswith('.html'):
+            return self.SOURCE
+        return self.MEDIA
+    
+    def poll(self) -> int:
+        """Compare un nouveau relevé au précédent; retourne le nombre de changements"""
+        current = self.scan()
+        self.polls += 1
+        changes = 0
+        for path, signature in current.items():
+            if self.snapshot.get(path) != signature:
+                self._pending[path] = self._kind(path)
+                self._removed.discard(path)
+                changes += 1
+        for path in self.snapshot.keys() - current.keys():
+            self._pending.pop(path, None)
+            self._removed.add(path)
+            changes += 1
+        self.snapshot = current
+        
+        if changes:
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+        return changes
+    
+    def next_batch(self, timeout: float) -> Optional[Dict[str, List[str]]]:
+        """Scrute jusqu'à ce qu'un lot de changements soit stable, ou None après `timeout` secondes.
+
+        Le lot contient les chemins nouveaux ou modifiés par type ('source',
+        'media') et les chemins supprimés ('removed').
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            self.poll()
+            now = time.monotonic()
+            if self._first_change is not None:
+                ready_at = min(self._last_change + self.debounce, self._first_change + self.max_delay)
+                if now >= ready_at:
+                    return self._release()
+                wake = min(ready_at, deadline)
+            else:
+                wake = deadline
+            if now >= deadline:
+                return None
+            time.sleep(min(self.poll_interval, max(0.0, wake - now)))
+    
+    def _release(self) -> Dict[str, List[str]]:
+        batch = {self.SOURCE: [], self.MEDIA: [], self.REMOVED: sorted(self._removed)}
+        for path in sorted(self._pending):
+            batch[self._pending[path]].append(path)
+        self._pending = {}
+        self._removed = set()
+        self._first_change = None
+        self._last_change = None
+        return batch
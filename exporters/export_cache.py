@@ -0,0 +1,76 @@
+"""
+ExportCache - Fragments d'export rendus par contact, réutilisés tant que le contact n'a pas changé
+"""
+import os
+import json
+import hashlib
+from typing import Dict, Iterable, Set, Tuple
+
+class ExportCache:
+    """Cache des fragments CSV/TXT par contact dans output/.export_cache.
+
+    L'index mémorise l'identifiant du jeu de données et la révision de DataManager
+    au dernier export: seuls les contacts modifiés depuis sont rendus à nouveau.
+    """
+    
+    def __init__(self, output_dir: str):
+        self.cache_dir = os.path.join(output_dir, '.export_cache')
+        self.index_file = os.path.join(self.cache_dir, 'index.json')
+        self.dataset_id = None
+        self.revision = 0
+        # Nom normalisé -> {'revision': révision au rendu, 'has_content': bool}
+        self.fragments: Dict[str, Dict] = {}
+        self._load()
+    
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self.dataset_id = index['dataset_id']
+            self.revision = index['revision']
+            self.fragments = index['fragments']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[ATTENTION] Cache d'export illisible, export complet: {e}")
+            self.dataset_id, self.revision, self.fragments = None, 0, {}
+    
+    def reset_if_foreign(self, dataset_id: str):
+        """Oublie les fragments rendus pour un autre jeu de données"""
+        if self.dataset_id != dataset_id:
+            self.dataset_id = dataset_id
+            self.revision = 0
+            self.fragments = {}
+    
+    def paths(self, contact_name: str) -> Tuple[str, str]:
+        """Chemins (csv, txt) des fragments d'un contact"""
+        key = hashlib.md5(contact_name.encode('utf-8')).hexdigest()
+        return (os.path.join(self.cache_dir, key + '.csv'),
+                os.path.join(self.cache_dir, key + '.txt'))
+    
+    def is_fresh(self, contact_name: str, changed: Set[str]) -> bool:
+        """Vrai si les fragments du contact existent et sont à jour"""
+        if contact_name in changed or contact_name not in self.fragments:
+            return False
+        csv_path, txt_path = self.paths(contact_name)
+        return os.path.exists(csv_path) and os.path.exists(txt_path)
+    
+    def save(self, revision: int, contact_names: Iterable[str]):
+        """Enregistre l'index et supprime les fragments des contacts absents"""
+        keep = set(contact_names)
+        for contact_name in [name for name in self.fragments if name not in keep]:
+            for path in self.paths(contact_name):
+                if os.path.exists(path):
+                    os.remove(path)
+            del self.fragments[contact_name]
+        
+        self.revision = revision
+        temp_file = self.index_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': 1,
+                'dataset_id': self.dataset_id,
+                'revision': self.revision,
+                'fragments': self.fragments
+            }, f, ensure_ascii=False)
+        os.replace(temp_file, self.index_file)
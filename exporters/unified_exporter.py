@@ -2,8 +2,26 @@
 UnifiedExporter - Export simple et efficace
 """
 import os
-import csv
+import shutil
+from functools import partial
+from typing import Callable, Iterator
 from core.data_manager import DataManager
+from exporters.export_cache import ExportCache
+from utils.metrics import metrics
+
+# Caractères qui imposent des guillemets dans un champ CSV (dialecte excel de csv.writer)
+CSV_SPECIAL_CHARS = (',', '"', '\r', '\n')
+CONTENT_SEPARATOR = " | "
+NO_CONTENT = "[Aucun contenu]"
+
+def _needs_quotes(value: str) -> bool:
+    return any(char in value for char in CSV_SPECIAL_CHARS)
+
+def _csv_field(value: str) -> str:
+    """Champ CSV quoté comme csv.writer (QUOTE_MINIMAL)"""
+    if _needs_quotes(value):
+        return '"' + value.replace('"', '""') + '"'
+    return value
 
 class UnifiedExporter:
     def __init__(self, data_manager: DataManager, output_dir: str):
@@ -11,39 +29,107 @@ class UnifiedExporter:
         self.output_dir = output_dir
         
     def export_simple(self):
-        """Export simple en CSV avec tous les contacts et contenus"""
-        export_data = self.data_manager.get_export_data()
+        """Export simple en CSV et TXT, assemblé à partir des fragments par contact.
         
-        if not export_data:
+        Seuls les contacts modifiés depuis le dernier export sont rendus à nouveau;
+        les autres fragments sont recopiés tels quels depuis le cache.
+        """
+        with metrics.stage('export') as stage:
+            self._export_simple(stage)
+    
+    def _export_simple(self, stage):
+        if not self.data_manager.contact_count():
             print("[EXPORT] Aucune donnée à exporter")
             return
         
-        # Fichier CSV
+        # Les révisions référencées par le cache doivent être durables
+        self.data_manager.flush()
+        revision = self.data_manager.revision
+        cache = ExportCache(self.output_dir)
+        cache.reset_if_foreign(self.data_manager.dataset_id)
+        changed = set(self.data_manager.changed_contacts(cache.revision))
+        os.makedirs(cache.cache_dir, exist_ok=True)
+        
         csv_path = os.path.join(self.output_dir, 'whatsapp_export.csv')
+        txt_path = os.path.join(self.output_dir, 'whatsapp_export.txt')
+        exported = []
+        rendered = 0
+        contacts_with_content = 0
         
-        with open(csv_path, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['Contact', 'Contenu'])
+        # Fragments copiés en binaire: mêmes octets que s'ils étaient écrits directement
+        with open(csv_path, 'wb') as csv_file, open(txt_path, 'wb') as txt_file:
+            csv_file.write("Contact,Contenu\r\n".encode('utf-8'))
+            txt_file.write(("EXPORT WHATSAPP - TOUS LES CONTACTS" + os.linesep).encode('utf-8'))
+            txt_file.write(("="*50 + os.linesep*2).encode('utf-8'))
             
-            for contact, content in sorted(export_data.items()):
-                writer.writerow([contact, content])
+            for contact, contact_name in self.data_manager.iter_export():
+                exported.append(contact_name)
+                if not cache.is_fresh(contact_name, changed):
+                    self._render_fragments(cache, contact, contact_name, revision)
+                    rendered += 1
+                if cache.fragments[contact_name]['has_content']:
+                    contacts_with_content += 1
+                
+                csv_fragment, txt_fragment = cache.paths(contact_name)
+                for fragment, output in ((csv_fragment, csv_file), (txt_fragment, txt_file)):
+                    with open(fragment, 'rb') as f:
+                        shutil.copyfileobj(f, output)
         
-        print(f"[EXPORT] CSV créé: {csv_path} ({len(export_data)} contacts)")
+        cache.save(revision, exported)
         
-        # Fichier TXT
-        txt_path = os.path.join(self.output_dir, 'whatsapp_export.txt')
-        
-        with open(txt_path, 'w', encoding='utf-8') as f:
-            f.write("EXPORT WHATSAPP - TOUS LES CONTACTS\n")
-            f.write("="*50 + "\n\n")
-            
-            for contact, content in sorted(export_data.items()):
-                f.write(f"CONTACT: {contact}\n")
-                f.write(f"{content}\n")
-                f.write("-"*50 + "\n\n")
+        stage.add('contacts', len(exported))
+        stage.add('rendered', rendered)
+        stage.add('bytes', os.path.getsize(csv_path) + os.path.getsize(txt_path))
         
+        print(f"[EXPORT] CSV créé: {csv_path} ({len(exported)} contacts)")
         print(f"[EXPORT] TXT créé: {txt_path}")
+        print(f"[EXPORT] {rendered} contacts rendus, {len(exported) - rendered} depuis le cache")
+        print(f"[EXPORT] {contacts_with_content}/{len(exported)} contacts ont du contenu")
+    
+    def _render_fragments(self, cache: ExportCache, contact: str, contact_name: str, revision: int):
+        """Rend les fragments CSV et TXT d'un contact dans le cache"""
+        csv_fragment, txt_fragment = cache.paths(contact_name)
+        with open(csv_fragment, 'w', encoding='utf-8', newline='') as csv_file, \
+             open(txt_fragment, 'w', encoding='utf-8') as txt_file:
+            has_content = self._write_contact(
+                csv_file, txt_file, contact,
+                partial(self.data_manager.iter_export_contents, contact_name)
+            )
+        cache.fragments[contact_name] = {'revision': revision, 'has_content': has_content}
+    
+    def _write_contact(self, csv_file, txt_file, contact: str,
+                       contents: Callable[[], Iterator[str]]) -> bool:
+        """Écrit un contact dans les deux fichiers sans joindre son contenu en mémoire.
+        
+        Un premier parcours détermine si le champ CSV doit être quoté, le second
+        écrit les morceaux au fil de l'eau. Retourne False si le contact est vide.
+        """
+        has_content = False
+        quoted = False
+        for piece in contents():
+            has_content = True
+            if _needs_quotes(piece):
+                quoted = True
+                break
+        
+        csv_file.write(_csv_field(contact) + ",")
+        txt_file.write(f"CONTACT: {contact}\n")
+        
+        if not has_content:
+            csv_file.write(NO_CONTENT + "\r\n")
+            txt_file.write(NO_CONTENT + "\n")
+        else:
+            if quoted:
+                csv_file.write('"')
+            separator = ""
+            for piece in contents():
+                txt_file.write(separator)
+                txt_file.write(piece)
+                csv_file.write(separator)
+                csv_file.write(piece.replace('"', '""') if quoted else piece)
+                separator = CONTENT_SEPARATOR
+            csv_file.write('"\r\n' if quoted else "\r\n")
+            txt_file.write("\n")
         
-        # Stats
-        contacts_with_content = sum(1 for c in export_data.values() if c != "[Aucun contenu]")
-        print(f"[EXPORT] {contacts_with_content}/{len(export_data)} contacts ont du contenu")
+        txt_file.write("-"*50 + "\n\n")
+        return has_content
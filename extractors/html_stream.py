@@ -0,0 +1,192 @@
+"""
+HtmlStream - Extraction en une seule passe (lxml iterparse) des exports HTML WhatsApp
+"""
+import re
+from lxml import etree
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DATE_RE = re.compile(r'(\d{4}/\d{2}/\d{2})\s+(\d{2}:\d{2})')
+
+def _first_class(elem) -> str:
+    """Première classe CSS (équivalent de tag.get('class')[0] avec BeautifulSoup)"""
+    classes = (elem.get('class') or '').split()
+    return classes[0] if classes else ''
+
+def _has_class(elem, name: str) -> bool:
+    return name in (elem.get('class') or '').split()
+
+def _text(elem) -> str:
+    """Texte d'un élément et de ses descendants, commentaires exclus (comme .text)"""
+    parts = [elem.text or '']
+    for child in elem:
+        if isinstance(child.tag, str):
+            parts.append(_text(child))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+def _mentions_audio(table) -> bool:
+    """Cherche 'opus'/'audio' dans les balises, attributs et textes (sans sérialiser)"""
+    for elem in table.iter():
+        tag = elem.tag if isinstance(elem.tag, str) else ''
+        chunks = [tag, elem.text or '']
+        if elem is not table:
+            chunks.append(elem.tail or '')
+        for key, value in elem.attrib.items():
+            chunks.append(key)
+            chunks.append(value)
+        for chunk in chunks:
+            if 'opus' in chunk or 'audio' in chunk:
+                return True
+    return False
+
+class StreamingHtmlParser:
+    """Parcourt un export HTML en une passe avant en gardant la date courante en état.
+
+    Produit les mêmes enregistrements message/audio que le parcours BeautifulSoup
+    de UnifiedExtractor._extract_messages, avec une mémoire bornée: chaque bloc
+    traité est libéré de l'arbre.
+    """
+    
+    def __init__(self, html_path: str):
+        self.html_path = html_path
+        # Date/heure du dernier <p class="date"> rencontré
+        self._date = ('', '')
+        self._h3: Optional[str] = None
+        self._title: Optional[str] = None
+    
+    def parse(self) -> Iterator[Tuple[str, str, Dict]]:
+        """Génère des tuples (contact, 'message' | 'audio', enregistrement)"""
+        # Enregistrements en attente tant que le nom du contact (<h3>) est inconnu
+        buffered: List[Tuple[str, Dict]] = []
+        
+        for kind, record in self._iter_records():
+            if self._h3 is None:
+                buffered.append((kind, record))
+                continue
+            
+            for pending_kind, pending_record in buffered:
+                yield self._h3, pending_kind, pending_record
+            buffered = []
+            
+            yield self._h3, kind, record
+        
+        contact_name = self.contact_name()
+        for kind, record in buffered:
+            yield contact_name, kind, record
+    
+    def contact_name(self) -> str:
+        """Nom du contact: premier <h3>, sinon <title>"""
+        if self._h3 is not None:
+            return self._h3
+        
+        if self._title is not None:
+            return self._title.replace("'s WhatsApp", "").strip()
+        
+        return "Contact_Inconnu"
+    
+    def _iter_records(self) -> Iterator[Tuple[str, Dict]]:
+        # Nombre de <p>/<table> ouverts: on ne libère que les blocs de premier niveau
+        open_blocks = 0
+        # Date courante au moment où chaque <p>/<table> ouvert a commencé
+        block_dates = []
+        
+        context = etree.iterparse(
+            self.html_path,
+            events=('start', 'end'),
+            html=True,
+            encoding='utf-8',
+            huge_tree=True
+        )
+        
+        for event, elem in context:
+            tag = elem.tag if isinstance(elem.tag, str) else ''
+            
+            if event == 'start':
+                if tag in ('p', 'table'):
+                    open_blocks += 1
+                    block_dates.append(self._date)
+                continue
+            
+            if tag == 'h3' and self._h3 is None:
+                self._h3 = _text(elem).strip()
+            elif tag == 'title' and self._title is None:
+                self._title = _text(elem)
+            
+            if tag in ('p', 'table'):
+                open_blocks -= 1
+                date_str, time_str = block_dates.pop()
+                
+                try:
+                    if tag == 'p':
+                        record = self._message_record(elem, date_str, time_str)
+                        if _has_class(elem, 'date'):
+                            # Les blocs suivants sont datés par ce <p class="date">
+                            date_match = DATE_RE.search(_text(elem))
+                            self._date = date_match.groups() if date_match else ('', '')
+                        if record:
+                            yield 'message', record
+                    else:
+                        record = self._audio_record(elem, date_str, time_str)
+                        if record:
+                            yield 'audio', record
+                except Exception:
+                    pass
+            
+            # Libérer la mémoire des blocs complètement traités
+            if open_blocks == 0:
+                elem.clear(keep_tail=True)
+                parent = elem.getparent()
+                if parent is not None:
+                    while elem.getprevious() is not None:
+                        del parent[0]
+        
+        del context
+    
+    def _message_record(self, p_tag, date_str: str, time_str: str) -> Optional[Dict]:
+        css_class = _first_class(p_tag)
+        
+        # Déterminer la direction
+        direction = 'unknown'
+        if 'triangle-isosceles' in css_class:
+            if any(x in css_class for x in ['2', '3']):
+                direction = 'sent'
+            else:
+                direction = 'received'
+        
+        # Extraire le contenu
+        font_tag = next(p_tag.iterdescendants('font'), None)
+        content = _text(font_tag) if font_tag is not None else _text(p_tag)
+        
+        if not content or not content.strip():
+            return None
+        
+        return {
+            'date': date_str,
+            'time': time_str,
+            'content': content.strip(),
+            'direction': direction,
+            'type': 'text'
+        }
+    
+    def _audio_record(self, table, date_str: str, time_str: str) -> Optional[Dict]:
+        if not _mentions_audio(table):
+            return None
+        
+        a_tag = next((a for a in table.iterdescendants('a') if a.get('href') is not None), None)
+        if a_tag is None:
+            return None
+        
+        # Direction depuis la classe CSS
+        css_class = _first_class(table)
+        direction = 'sent' if any(x in css_class for x in ['2', '3']) else 'received'
+        
+        return {
+            'path': a_tag.get('href'),
+            'date': date_str,
+            'time': time_str,
+            'direction': direction
+        }
+
+def iter_html_records(html_path: str) -> Iterator[Tuple[str, str, Dict]]:
+    """Raccourci: enregistrements (contact, type, données) d'un fichier HTML"""
+    return StreamingHtmlParser(html_path).parse()
@@ -4,57 +4,220 @@ UnifiedExtractor - Extraction unifiée depuis toutes les sources
 import os
 import json
 import re
+import itertools
+from collections import deque
 from bs4 import BeautifulSoup
-from typing import Dict, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 from core.data_manager import DataManager
+from core.manifest import SourceManifest
+from core.pipeline import AudioQueue
+from extractors.html_stream import StreamingHtmlParser, iter_html_records
+from utils.metrics import metrics
 
 class UnifiedExtractor:
-    def __init__(self, data_manager: DataManager, config: dict):
+    # Moteurs d'analyse HTML: 'lxml' (une passe, mémoire bornée) ou 'bs4' (historique)
+    HTML_ENGINES = ('lxml', 'bs4')
+    # Fichiers soumis par processus en mode parallèle: borne les résultats en attente d'insertion
+    IN_FLIGHT_PER_WORKER = 2
+    
+    def __init__(self, data_manager: DataManager, config: dict, audio_queue: Optional[AudioQueue] = None):
         self.data_manager = data_manager
         self.config = config
+        # Mode pipeline: les nouveaux audios sont publiés pour être transcrits pendant l'extraction
+        self.audio_queue = audio_queue
+        self.html_engine = config.get('html_engine') or 'lxml'
+        if self.html_engine not in self.HTML_ENGINES:
+            raise ValueError(f"Moteur HTML inconnu: {self.html_engine} (choix: {', '.join(self.HTML_ENGINES)})")
+        # Nombre de processus pour l'analyse HTML (1 = séquentiel)
+        self.workers = max(1, int(config.get('workers') or 1))
+        # Manifeste des sources: les fichiers inchangés ne sont pas réextraits
+        self.force_reextract = bool(config.get('force_reextract'))
+        self.manifest = SourceManifest(data_manager.output_dir)
+        self.manifest.reset_if_foreign(data_manager.dataset_id)
+        # Sources extraites pendant cette exécution (mesures)
+        self.extracted_files = 0
+        self.extracted_bytes = 0
         
     def extract_all(self):
         """Extrait depuis toutes les sources disponibles"""
-        print("[EXTRACTION] Début de l'extraction unifiée...")
+        with metrics.stage('extract') as stage:
+            self._extract_all(stage)
+    
+    def extract_sources(self, paths: List[str]):
+        """Extrait seulement les sources données: fichiers HTML et conversation.json (mode --watch)"""
+        with metrics.stage('extract') as stage:
+            self._extract_all(stage, paths)
+    
+    def _extract_all(self, stage, paths: Optional[List[str]] = None):
+        print("[EXTRACTION] Début de l'extraction unifiée..." if paths is None else
+              f"[EXTRACTION] {len(paths)} sources modifiées...")
+        if self.force_reextract:
+            print("[EXTRACTION] Réextraction forcée: le manifeste des sources est ignoré")
         
-        # 1. HTML WhatsApp
+        # L'extracteur peut servir plusieurs passes (mode --watch): compteurs par passe
+        self.manifest.reset_counts()
+        self.extracted_files = 0
+        self.extracted_bytes = 0
+        stats_before = self.data_manager.get_stats()
         html_dir = self.config.get('html_dir')
-        if html_dir and os.path.exists(html_dir):
-            self._extract_from_html(html_dir)
-        
-        # 2. Dossiers de contacts existants
         output_dir = self.config.get('output_dir')
-        if output_dir and os.path.exists(output_dir):
-            self._extract_from_folders(output_dir)
         
-        # Sauvegarder
-        self.data_manager.save()
+        # Toutes les insertions sont regroupées en une seule écriture durable
+        with self.data_manager.batch():
+            if paths is not None:
+                html_paths = [path for path in paths if path.endswith('.html')]
+                if html_paths:
+                    with metrics.stage('extract.html'):
+                        self._extract_html_files(html_paths)
+                with metrics.stage('extract.folders'):
+                    for path in paths:
+                        if os.path.basename(path) == 'conversation.json':
+                            self._extract_conversation(os.path.basename(os.path.dirname(path)), path)
+            else:
+                # 1. HTML WhatsApp
+                if html_dir and os.path.exists(html_dir):
+                    with metrics.stage('extract.html'):
+                        self._extract_from_html(html_dir)
+            
+                # 2. Dossiers de contacts existants
+                if output_dir and os.path.exists(output_dir):
+                    with metrics.stage('extract.folders'):
+                        self._extract_from_folders(output_dir)
+        
+        # Sauvegarder (compaction du journal dans le snapshot) si quelque chose a changé
+        stats = self.data_manager.get_stats()
+        if stats != stats_before:
+            self.data_manager.save()
+        
+        # Manifeste: écrit après les données pour ne jamais marquer une source non sauvegardée
+        vanished = []
+        if paths is None:
+            vanished = self.manifest.pop_vanished([d for d in (html_dir, output_dir) if d])
+        for path in vanished:
+            print(f"[ATTENTION] Source disparue: {path}")
+        self.manifest.save()
+        
+        counts = self.manifest.counts
+        print(f"[EXTRACTION] Sources: {counts['new']} nouvelles, {counts['modified']} modifiées, "
+              f"{counts['unchanged']} inchangées (ignorées), {len(vanished)} disparues")
         
         # Stats
-        total_contacts = len(self.data_manager.data['contacts'])
-        total_messages = self.data_manager.data['stats']['total_messages']
-        total_audios = self.data_manager.data['stats']['total_audios']
+        total_contacts = self.data_manager.contact_count()
+        total_messages = stats['total_messages']
+        total_audios = stats['total_audios']
+        
+        stage.add('files', self.extracted_files)
+        stage.add('bytes_read', self.extracted_bytes)
+        stage.add('messages', total_messages - stats_before['total_messages'])
+        stage.add('audios', total_audios - stats_before['total_audios'])
         
         print(f"[EXTRACTION] Terminée: {total_contacts} contacts, {total_messages} messages, {total_audios} audios")
     
     def _extract_from_html(self, html_dir: str):
         """Extrait depuis les fichiers HTML"""
         html_files = [f for f in os.listdir(html_dir) if f.endswith('.html')]
+        self._extract_html_files([os.path.join(html_dir, f) for f in html_files])
+    
+    def _extract_html_files(self, html_paths: List[str]):
+        """Extrait les fichiers HTML nouveaux ou modifiés parmi `html_paths`"""
+        html_paths = [path for path in html_paths if self._source_changed(path)]
+        
+        if self.workers > 1 and len(html_paths) > 1:
+            self._extract_from_html_parallel(html_paths)
+            return
         
-        for html_file in html_files:
+        for html_path in html_paths:
+            html_file = os.path.basename(html_path)
             try:
-                with open(os.path.join(html_dir, html_file), 'r', encoding='utf-8') as f:
-                    soup = BeautifulSoup(f.read(), 'html.parser')
-                
-                # Extraire le nom du contact
-                contact_name = self._extract_contact_name(soup)
+                if self.html_engine == 'lxml':
+                    self._extract_streaming(html_path)
+                else:
+                    with open(html_path, 'r', encoding='utf-8') as f:
+                        soup = BeautifulSoup(f.read(), 'html.parser')
+                    
+                    # Extraire le nom du contact
+                    contact_name = self._extract_contact_name(soup)
+                    
+                    # Extraire les messages
+                    self._extract_messages(soup, contact_name)
                 
-                # Extraire les messages
-                self._extract_messages(soup, contact_name)
+                self._record_source(html_path)
                 
             except Exception as e:
                 print(f"[ERREUR] HTML {html_file}: {e}")
     
+    def _extract_from_html_parallel(self, html_paths: List[str]):
+        """Analyse les fichiers HTML dans un pool de processus.
+        
+        Les résultats sont fusionnés dans l'ordre des fichiers pour obtenir
+        exactement les mêmes données qu'une exécution séquentielle. Au plus
+        IN_FLIGHT_PER_WORKER fichiers par processus sont soumis à la fois: les
+        enregistrements analysés n'attendent pas en mémoire d'être insérés.
+        """
+        window = self.workers * self.IN_FLIGHT_PER_WORKER
+        paths = iter(html_paths)
+        pending = deque()
+        
+        print(f"[EXTRACTION] {len(html_paths)} fichiers HTML sur {self.workers} processus...")
+        
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for html_path in itertools.islice(paths, window):
+                pending.append((html_path, executor.submit(parse_html_file, html_path, self.html_engine)))
+            
+            while pending:
+                html_path, future = pending.popleft()
+                contact_name, records, error = future.result()
+                next_path = next(paths, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(parse_html_file, next_path, self.html_engine)))
+                
+                if error:
+                    print(f"[ERREUR] HTML {os.path.basename(html_path)}: {error}")
+                    continue
+                
+                for kind, record in records:
+                    if kind == 'message':
+                        self.data_manager.add_message(contact_name, record)
+                    else:
+                        self._add_audio(contact_name, record)
+                
+                self._record_source(html_path)
+    
+    def _add_audio(self, contact_name: str, audio_info: Dict):
+        """Ajoute un audio et le publie dans la file du pipeline s'il est nouveau"""
+        clean_name, audio_id, added = self.data_manager.insert_audio(contact_name, audio_info)
+        if added and self.audio_queue is not None:
+            # Copie: le consommateur ne partage pas l'enregistrement du backend
+            self.audio_queue.publish({
+                'contact': clean_name,
+                'audio': dict(audio_info, id=audio_id, transcription=None, transcription_status='pending')
+            })
+    
+    def _record_source(self, path: str):
+        """Marque une source comme extraite dans le manifeste"""
+        self.manifest.record(path)
+        self.extracted_files += 1
+        self.extracted_bytes += os.path.getsize(path)
+    
+    def _source_changed(self, path: str) -> bool:
+        """Vrai si la source est nouvelle ou modifiée depuis la dernière extraction"""
+        if self.force_reextract:
+            return True
+        
+        try:
+            return self.manifest.check(path) != SourceManifest.UNCHANGED
+        except OSError:
+            return True
+    
+    def _extract_streaming(self, html_path: str):
+        """Extrait un fichier HTML en une seule passe (date courante gardée en état)"""
+        for contact_name, kind, record in iter_html_records(html_path):
+            if kind == 'message':
+                self.data_manager.add_message(contact_name, record)
+            else:
+                self._add_audio(contact_name, record)
+    
     def _extract_from_folders(self, output_dir: str):
         """Extrait depuis les dossiers existants (conversation.json, etc.)"""
         for folder in os.listdir(output_dir):
@@ -66,27 +229,37 @@ class UnifiedExtractor:
             # Chercher conversation.json
             conv_file = os.path.join(folder_path, 'conversation.json')
             if os.path.exists(conv_file):
-                try:
-                    with open(conv_file, 'r', encoding='utf-8') as f:
-                        messages = json.load(f)
-                    
-                    for msg in messages:
-                        self.data_manager.add_message(folder, msg)
-                        
-                        # Si c'est un audio
-                        if msg.get('type') == 'audio' and msg.get('media_path'):
-                            audio_info = {
-                                'path': msg['media_path'],
-                                'date': msg.get('date'),
-                                'time': msg.get('time'),
-                                'direction': msg.get('direction')
-                            }
-                            self.data_manager.add_audio(folder, audio_info)
-                            
-                except Exception as e:
-                    print(f"[ERREUR] conversation.json {folder}: {e}")
-    
-    def _extract_contact_name(self, soup) -> str:
+                self._extract_conversation(folder, conv_file)
+    
+    def _extract_conversation(self, folder: str, conv_file: str):
+        """Extrait le conversation.json d'un dossier de contact s'il est nouveau ou modifié"""
+        if not self._source_changed(conv_file):
+            return
+        
+        try:
+            with open(conv_file, 'r', encoding='utf-8') as f:
+                messages = json.load(f)
+            
+            for msg in messages:
+                self.data_manager.add_message(folder, msg)
+                
+                # Si c'est un audio
+                if msg.get('type') == 'audio' and msg.get('media_path'):
+                    audio_info = {
+                        'path': msg['media_path'],
+                        'date': msg.get('date'),
+                        'time': msg.get('time'),
+                        'direction': msg.get('direction')
+                    }
+                    self._add_audio(folder, audio_info)
+            
+            self._record_source(conv_file)
+            
+        except Exception as e:
+            print(f"[ERREUR] conversation.json {folder}: {e}")
+    
+    @staticmethod
+    def _extract_contact_name(soup) -> str:
         """Extrait le nom depuis le HTML"""
         # Logique d'extraction du nom
         h3 = soup.find('h3')
@@ -101,6 +274,15 @@ class UnifiedExtractor:
     
     def _extract_messages(self, soup, contact_name: str):
         """Extrait tous les messages du HTML WhatsApp"""
+        for kind, record in self._iter_soup_records(soup):
+            if kind == 'message':
+                self.data_manager.add_message(contact_name, record)
+            else:
+                self._add_audio(contact_name, record)
+    
+    @staticmethod
+    def _iter_soup_records(soup) -> Iterator[Tuple[str, Dict]]:
+        """Génère les enregistrements ('message' | 'audio', données) du HTML WhatsApp"""
         # Chercher tous les messages
         for p_tag in soup.find_all('p'):
             try:
@@ -138,7 +320,7 @@ class UnifiedExtractor:
                         'direction': direction,
                         'type': 'text'
                     }
-                    self.data_manager.add_message(contact_name, message)
+                    yield 'message', message
                     
             except Exception as e:
                 continue
@@ -173,7 +355,28 @@ class UnifiedExtractor:
                             'time': time_str,
                             'direction': direction
                         }
-                        self.data_manager.add_audio(contact_name, audio_info)
+                        yield 'audio', audio_info
                         
             except Exception as e:
                 continue
+
+def parse_html_file(html_path: str, html_engine: str = 'lxml') -> Tuple[str, List[Tuple[str, Dict]], str]:
+    """Analyse un fichier HTML dans un processus de travail.
+    
+    Retourne (contact, [(type, données)], erreur) avec uniquement des objets
+    simples, sans toucher au DataManager.
+    """
+    try:
+        if html_engine == 'lxml':
+            parser = StreamingHtmlParser(html_path)
+            records = [(kind, record) for _, kind, record in parser.parse()]
+            return parser.contact_name(), records, ''
+        
+        with open(html_path, 'r', encoding='utf-8') as f:
+            soup = BeautifulSoup(f.read(), 'html.parser')
+        
+        contact_name = UnifiedExtractor._extract_contact_name(soup)
+        return contact_name, list(UnifiedExtractor._iter_soup_records(soup)), ''
+    
+    except Exception as e:
+        return '', [], str(e)
@@ -6,15 +6,24 @@ WhatsApp Extractor V3 - Version refaite proprement
 
 import os
 import sys
+import json
+import time
 import argparse
+import threading
 import configparser
 from datetime import datetime
 
 # Imports
 from core.data_manager import DataManager
+from core.rollups import read_stats
+from core.pipeline import AudioQueue
+from core.watcher import SourceWatcher
 from extractors.unified_extractor import UnifiedExtractor
-from processors.smart_transcriber import SmartTranscriber
+from processors.job_queue import TranscriptionJobQueue
+from processors.media_index import MediaIndex
+from processors.search_index import SearchIndex
 from exporters.unified_exporter import UnifiedExporter
+from utils.metrics import metrics
 
 def load_config():
     """Charge la configuration"""
@@ -25,54 +34,459 @@ def load_config():
         'html_dir': config.get('Paths', 'html_dir', fallback=''),
         'media_dir': config.get('Paths', 'media_dir', fallback=''),
         'output_dir': config.get('Paths', 'output_dir', fallback='output'),
-        'api_key': config.get('API', 'openai_key', fallback='')
+        'api_key': config.get('API', 'openai_key', fallback=''),
+        'api_base_url': config.get('API', 'base_url', fallback=''),
+        'transcription': {
+            'concurrency': config.getint('Transcription', 'concurrency', fallback=1),
+            'requests_per_minute': config.getfloat('Transcription', 'requests_per_minute', fallback=50),
+            'audio_seconds_per_minute': config.getfloat('Transcription', 'audio_minutes_per_minute', fallback=0) * 60,
+            'batch_size': config.getint('Transcription', 'batch_size', fallback=50),
+            'cache_max_entries': config.getint('Transcription', 'cache_max_entries', fallback=200000),
+            'cache_max_mb': config.getfloat('Transcription', 'cache_max_mb', fallback=256),
+            'priority': config.get('Transcription', 'priority', fallback=''),
+            'priority_contacts': [
+                contact.strip() for contact in config.get('Transcription', 'priority_contacts', fallback='').split(',')
+                if contact.strip()
+            ],
+            'retry_rounds': config.getint('Transcription', 'retry_rounds', fallback=2),
+            'retry_cooldown': config.getfloat('Transcription', 'retry_cooldown', fallback=60)
+        },
+        'preprocess': {
+            'enabled': config.getboolean('Preprocess', 'enabled', fallback=True),
+            'ffmpeg_path': config.get('Preprocess', 'ffmpeg_path', fallback=''),
+            'workers': config.getint('Preprocess', 'workers', fallback=0),
+            'bitrate': config.get('Preprocess', 'bitrate', fallback='24k'),
+            'sample_rate': config.getint('Preprocess', 'sample_rate', fallback=16000),
+            'trim_silence': config.getboolean('Preprocess', 'trim_silence', fallback=True),
+            'silence_threshold_db': config.getfloat('Preprocess', 'silence_threshold_db', fallback=-45),
+            'min_size_kb': config.getfloat('Preprocess', 'min_size_kb', fallback=64),
+            'max_segment_seconds': config.getfloat('Preprocess', 'max_segment_seconds', fallback=120),
+            'split_silence_db': config.getfloat('Preprocess', 'split_silence_db', fallback=-35),
+            'min_silence_seconds': config.getfloat('Preprocess', 'min_silence_seconds', fallback=0.5)
+        },
+        'html_engine': config.get('Processing', 'html_engine', fallback='lxml'),
+        'workers': config.getint('Processing', 'workers', fallback=1),
+        'pipeline': config.getboolean('Processing', 'pipeline', fallback=False),
+        'pipeline_queue_size': config.getint('Processing', 'pipeline_queue_size', fallback=1000),
+        'queue': {
+            'lease_seconds': config.getfloat('Queue', 'lease_seconds', fallback=600),
+            'max_attempts': config.getint('Queue', 'max_attempts', fallback=3),
+            'journal_mode': config.get('Queue', 'journal_mode', fallback='wal'),
+            'poll_interval': config.getfloat('Queue', 'poll_interval', fallback=5)
+        },
+        'search_index': config.getboolean('Search', 'index', fallback=True),
+        'stats_rollups': config.getboolean('Stats', 'rollups', fallback=True),
+        'watch': {
+            'poll_interval': config.getfloat('Watch', 'poll_interval', fallback=5),
+            'debounce': config.getfloat('Watch', 'debounce', fallback=10),
+            'max_delay': config.getfloat('Watch', 'max_delay', fallback=300),
+            'export_interval': config.getfloat('Watch', 'export_interval', fallback=300)
+        },
+        'storage_backend': config.get('Storage', 'backend', fallback='json'),
+        'storage_options': {
+            'compact_interval': config.getfloat('Storage', 'compact_interval', fallback=300),
+            'compact_bytes': config.getint('Storage', 'compact_max_mb', fallback=64) * 1024 * 1024,
+            'snapshot_format': config.get('Storage', 'snapshot_format', fallback='json'),
+            'compact_records': config.getboolean('Storage', 'compact_records', fallback=True),
+            'cache_bytes': int(config.getfloat('Storage', 'cache_mb', fallback=256) * 1024 * 1024)
+        }
     }
 
+def convert_snapshot(output_dir: str, config: dict, snapshot_format: str):
+    """Convertit le snapshot whatsapp_data (json <-> binaire)"""
+    if config['storage_backend'] != 'json':
+        print(f"[ERREUR] Conversion de snapshot réservée au backend json "
+              f"(backend configuré: {config['storage_backend']})")
+        return
+    
+    options = dict(config['storage_options'], snapshot_format=snapshot_format)
+    data_manager = DataManager(output_dir, 'json', options)
+    data_manager.save()
+    data_manager.close()
+    
+    written = [name for name in ('whatsapp_data.json', 'whatsapp_data.bin')
+               if os.path.exists(os.path.join(output_dir, name))]
+    print(f"[STOCKAGE] Snapshot converti ({snapshot_format}): {', '.join(written)}")
+    print(f"[STOCKAGE] Pensez à régler [Storage] snapshot_format = {snapshot_format} dans config.ini")
+
+def api_key_configured(config: dict) -> bool:
+    return bool(config['api_key']) and config['api_key'] != 'sk-xxxxxxxxxxxxxxxxxxxxx'
+
+def create_transcriber(data_manager: DataManager, config: dict, **options):
+    # Import différé: le client openai coûte près d'une seconde au démarrage, inutile pour --stats et --search
+    from processors.smart_transcriber import SmartTranscriber
+    return SmartTranscriber(data_manager, config['api_key'],
+                            base_url=config['api_base_url'],
+                            media_dir=config['media_dir'],
+                            preprocess=config['preprocess'],
+                            **config['transcription'], **options)
+
+def open_job_queue(config: dict) -> TranscriptionJobQueue:
+    queue = config['queue']
+    return TranscriptionJobQueue(config['output_dir'], queue['lease_seconds'], queue['max_attempts'],
+                                 queue['journal_mode'])
+
+def sync_job_queue(data_manager: DataManager, config: dict):
+    """Coordinateur de la file partagée: reporte les résultats des workers puis publie les audios en attente"""
+    job_queue = open_job_queue(config)
+    with data_manager.batch():
+        collected = job_queue.collect(data_manager.update_transcription)
+    
+    media_index = MediaIndex(config['output_dir'], config['media_dir'], normalize=data_manager._normalize_name)
+    pending = data_manager.get_all_pending_audios()
+    added = job_queue.enqueue(pending, lambda item: media_index.resolve(item['contact'], item['audio']))
+    
+    print(f"[FILE] {collected} résultats reportés, {added} audios ajoutés ({len(pending)} en attente)")
+    print(f"[FILE] État: {job_queue.counts()}")
+    job_queue.close()
+
+def run_worker(config: dict, worker_id: str = None):
+    """Worker de transcription: vide la file partagée sans ouvrir les données principales"""
+    if not api_key_configured(config):
+        print("[ATTENTION] Clé API OpenAI manquante - Worker arrêté")
+        return
+    
+    job_queue = open_job_queue(config)
+    transcriber = create_transcriber(None, config, output_dir=config['output_dir'],
+                                     cache_journal_mode=config['queue']['journal_mode'])
+    try:
+        transcriber.run_worker(job_queue, worker_id, config['queue']['poll_interval'])
+    finally:
+        transcriber.close()
+        job_queue.close()
+
+def run_search(config: dict, query: str, contact: str = None, since: str = None, limit: int = 50):
+    """Recherche dans l'index plein texte, sans charger les données principales"""
+    if not os.path.exists(os.path.join(config['output_dir'], 'search_index.db')):
+        print("[RECHERCHE] Index absent: lancer d'abord une extraction (section [Search], index = true)")
+        return
+    
+    index = SearchIndex(config['output_dir'])
+    try:
+        start = time.perf_counter()
+        try:
+            results = index.search(query, contact, since, limit)
+        except ValueError as e:
+            print(f"[ERREUR] {e}")
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+    finally:
+        index.close()
+    
+    print(f"[RECHERCHE] {len(results)} résultats pour \"{query}\" ({elapsed:.1f} ms)")
+    for result in results:
+        kind = 'audio' if result['kind'] == 'audio' else (result['direction'] or 'message')
+        print(f"{result['date'] or '?':<10} {result['time'] or '':<5}  {result['contact']}  [{kind}]  "
+              f"{result['snippet']}")
+
+def run_stats(config: dict, contact: str = None, since: str = None, as_json: bool = False):
+    """Statistiques précalculées (whatsapp_stats.db), sans charger les données principales"""
+    start = time.perf_counter()
+    try:
+        stats = read_stats(config['output_dir'], contact, since)
+    except ValueError as e:
+        print(f"[ERREUR] {e}")
+        return
+    elapsed = (time.perf_counter() - start) * 1000
+    if stats is None:
+        print("[STATS] Statistiques absentes: lancer d'abord une extraction (section [Stats], rollups = true)")
+        return
+    
+    if as_json:
+        json.dump(stats, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+    
+    totals = stats['totals']
+    print(f"[STATS] Données au {stats['updated']} (révision {stats['revision']}"
+          f"{', depuis le ' + stats['since'] if stats['since'] else ''}) - lu en {elapsed:.1f} ms")
+    print(f"Contacts: {totals['contacts']}  Messages: {totals['messages']}  Audios: {totals['audios']}  "
+          f"Envoyés: {totals['sent']}  Reçus: {totals['received']}")
+    statuses = stats['transcriptions']
+    print("Transcriptions: " + (', '.join(f"{status} {count}" for status, count in sorted(statuses.items()))
+                                or 'aucun audio'))
+    for reason, count in stats['errors'].items():
+        print(f"  {count:>6}  {reason}")
+    
+    print(f"\n{'Contact':<32} {'Messages':>8} {'Audios':>7} {'Envoyés':>8} {'Reçus':>7} "
+          f"{'Transcrits':>10} {'Erreurs':>7}  Période")
+    for entry in stats['contacts']:
+        period = f"{entry['first_day']} -> {entry['last_day']}" if entry['first_day'] else ''
+        print(f"{entry['original_name'][:32]:<32} {entry['messages']:>8} {entry['audios']:>7} {entry['sent']:>8} "
+              f"{entry['received']:>7} {entry['transcriptions'].get('success', 0):>10} "
+              f"{entry['transcriptions'].get('error', 0):>7}  {period}")
+        for day in entry.get('days', []):
+            print(f"  {day['day'] or 'sans date':<30} {day['messages']:>8} {day['audios']:>7} {day['sent']:>8} "
+                  f"{day['received']:>7}")
+
+def run_pipeline(data_manager: DataManager, config: dict):
+    """Extraction et transcription simultanées.
+    
+    L'extracteur publie les nouveaux audios dans une file bornée pendant
+    l'analyse; un thread de transcription les consomme au fur et à mesure.
+    """
+    audio_queue = AudioQueue(config['pipeline_queue_size'])
+    transcriber = create_transcriber(data_manager, config)
+    # Audios restés en attente d'une exécution précédente, transcrits en premier
+    backlog = data_manager.get_all_pending_audios()
+    
+    def consume():
+        try:
+            transcriber.transcribe_stream(audio_queue, backlog)
+        except Exception as e:
+            print(f"[ERREUR] Transcription interrompue: {e}")
+    
+    consumer = threading.Thread(target=consume, name='transcription', daemon=True)
+    consumer.start()
+    try:
+        UnifiedExtractor(data_manager, config, audio_queue).extract_all()
+    finally:
+        audio_queue.close()
+        consumer.join()
+        transcriber.close()
+
+def arrived_audios(data_manager: DataManager, transcriber):
+    """Audios en erreur faute de fichier dont le fichier est maintenant dans l'index média"""
+    from processors.smart_transcriber import MISSING_FILE
+    return [item for item in data_manager.get_failed_audios(MISSING_FILE)
+            if transcriber.media_index.resolve(item['contact'], item['audio'])]
+
+def run_watch(data_manager: DataManager, config: dict):
+    """Ingestion continue des nouveaux exports jusqu'à Ctrl+C.
+    
+    Le DataManager, l'extracteur (manifeste des sources) et le transcripteur
+    restent en mémoire: chaque lot de changements n'extrait que les fichiers
+    nouveaux ou modifiés, et leurs audios sont publiés vers un thread de
+    transcription permanent. L'export est rafraîchi au plus toutes les
+    `export_interval` secondes quand les données ont changé.
+    """
+    watch = config['watch']
+    audio_queue = None
+    transcriber = None
+    consumer = None
+    if api_key_configured(config):
+        audio_queue = AudioQueue(config['pipeline_queue_size'])
+        transcriber = create_transcriber(data_manager, config)
+        transcriber.media_index.build()
+        backlog = data_manager.get_all_pending_audios() + arrived_audios(data_manager, transcriber)
+        
+        def consume():
+            try:
+                transcriber.transcribe_stream(audio_queue, backlog)
+            except Exception as e:
+                print(f"[ERREUR] Transcription interrompue: {e}")
+        
+        consumer = threading.Thread(target=consume, name='transcription', daemon=True)
+        consumer.start()
+    else:
+        print("[ATTENTION] Clé API OpenAI manquante - Les audios resteront en attente")
+    
+    extractor = UnifiedExtractor(data_manager, config, audio_queue)
+    exporter = UnifiedExporter(data_manager, config['output_dir'])
+    watcher = SourceWatcher(config['html_dir'], config['media_dir'], config['output_dir'],
+                            watch['poll_interval'], watch['debounce'], watch['max_delay'])
+    exported_revision = None
+    last_export = 0.0
+    
+    def export():
+        nonlocal exported_revision, last_export
+        # Verrou des données: pas d'écriture de transcription pendant la lecture de l'export
+        with data_manager.lock:
+            revision = data_manager.revision
+            exporter.export_simple()
+        exported_revision = revision
+        last_export = time.monotonic()
+    
+    try:
+        # Relevé pris avant le rattrapage: un fichier copié pendant celui-ci sera vu au premier lot
+        watcher.start()
+        extractor.extract_all()
+        print(f"[WATCH] Surveillance de {len(watcher.snapshot)} fichiers "
+              f"(scrutation {watch['poll_interval']:g}s, anti-rebond {watch['debounce']:g}s) - Ctrl+C pour arrêter")
+        
+        while True:
+            if data_manager.revision != exported_revision and \
+                    time.monotonic() - last_export >= watch['export_interval']:
+                export()
+            
+            timeout = max(watch['poll_interval'], last_export + watch['export_interval'] - time.monotonic())
+            batch = watcher.next_batch(timeout)
+            if batch is None:
+                continue
+            
+            sources, media, removed = batch[SourceWatcher.SOURCE], batch[SourceWatcher.MEDIA], \
+                batch[SourceWatcher.REMOVED]
+            print(f"\n[WATCH] {datetime.now():%H:%M:%S} {len(sources)} sources, {len(media)} audios modifiés, "
+                  f"{len(removed)} fichiers supprimés")
+            if media and transcriber is not None:
+                # Avant l'extraction: les audios publiés doivent trouver leurs nouveaux fichiers
+                transcriber.media_index.build()
+                # Audios vus avant l'arrivée de leur fichier: republiés maintenant qu'il est là
+                retried = arrived_audios(data_manager, transcriber)
+                for item in retried:
+                    audio_queue.publish(item)
+                if retried:
+                    print(f"[WATCH] {len(retried)} audios republiés (fichier arrivé)")
+            if sources:
+                extractor.extract_sources(sources)
+    except KeyboardInterrupt:
+        print("\n[WATCH] Arrêt demandé")
+    finally:
+        if audio_queue is not None:
+            # Audios encore dans la file: restés en attente, repris au prochain lancement
+            audio_queue.abandon()
+            consumer.join()
+            transcriber.close()
+    
+    if data_manager.revision != exported_revision:
+        export()
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--extract-only', action='store_true', help='Extraction seulement')
     parser.add_argument('--transcribe-only', action='store_true', help='Transcription seulement')
     parser.add_argument('--export-only', action='store_true', help='Export seulement')
     parser.add_argument('--full', action='store_true', help='Processus complet')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Processus complet en transcrivant pendant l\'extraction')
+    parser.add_argument('--watch', action='store_true',
+                        help='Surveille les dossiers sources et traite les nouveaux exports en continu (Ctrl+C pour arrêter)')
+    parser.add_argument('--html-engine', choices=['lxml', 'bs4'], default=None,
+                        help="Moteur d'analyse HTML (lxml: une passe, bs4: historique)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Nombre de processus pour l'analyse des fichiers HTML")
+    parser.add_argument('--force-reextract', action='store_true',
+                        help='Réextraire toutes les sources en ignorant le manifeste')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='Nombre de requêtes de transcription simultanées')
+    parser.add_argument('--priority', default=None,
+                        help="Ordre de transcription: recent, contacts, shortest (combinables: recent,shortest)")
+    parser.add_argument('--convert-snapshot', choices=['json', 'binary', 'both'], default=None,
+                        help='Réécrit le snapshot du backend json dans ce format puis quitte')
+    parser.add_argument('--enqueue', action='store_true',
+                        help='Publie les audios en attente dans la file partagée et reporte les résultats des workers')
+    parser.add_argument('--worker', action='store_true',
+                        help='Transcrit les tâches de la file partagée (plusieurs workers possibles)')
+    parser.add_argument('--worker-id', default=None,
+                        help='Identifiant du worker (par défaut: machine:pid)')
+    parser.add_argument('--search', metavar='REQUÊTE', default=None,
+                        help='Recherche plein texte dans les messages et transcriptions puis quitte')
+    parser.add_argument('--stats', action='store_true',
+                        help='Affiche les statistiques précalculées (par contact, par jour, transcriptions) puis quitte')
+    parser.add_argument('--json', action='store_true', help='Avec --stats: sortie JSON')
+    parser.add_argument('--contact', default=None,
+                        help='Avec --search: limite la recherche à ce contact; avec --stats: détail par jour')
+    parser.add_argument('--since', metavar='DATE', default=None,
+                        help='Avec --search ou --stats: à partir de cette date (AAAA-MM-JJ)')
+    parser.add_argument('--limit', type=int, default=50, help='Avec --search: nombre maximal de résultats')
+    parser.add_argument('--metrics', metavar='FICHIER', default=None,
+                        help='Écrit les mesures par étape (temps, débits, latences API) en JSON')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile chaque étape avec cProfile (fichiers .prof dans output/profiles)')
     
     args = parser.parse_args()
     
     # Charger config
     config = load_config()
+    if args.html_engine:
+        config['html_engine'] = args.html_engine
+    if args.workers:
+        config['workers'] = args.workers
+    config['force_reextract'] = args.force_reextract
+    if args.concurrency:
+        config['transcription']['concurrency'] = args.concurrency
+    if args.priority is not None:
+        config['transcription']['priority'] = args.priority
+    if args.pipeline:
+        args.full = True
+        config['pipeline'] = True
     output_dir = config['output_dir']
     
     # Créer output dir
     os.makedirs(output_dir, exist_ok=True)
     
+    if args.convert_snapshot:
+        convert_snapshot(output_dir, config, args.convert_snapshot)
+        return
+    
+    if args.search is not None:
+        run_search(config, args.search, args.contact, args.since, args.limit)
+        return
+    
+    if args.stats:
+        run_stats(config, args.contact, args.since, args.json)
+        return
+    
+    if args.profile:
+        metrics.enable_profiling(os.path.join(output_dir, 'profiles'))
+    
+    if args.worker:
+        run_worker(config, args.worker_id)
+        if args.metrics or args.profile:
+            metrics.print_summary()
+            metrics.write_profiles()
+        if args.metrics:
+            metrics.write(args.metrics)
+        return
+    
     # Initialiser le gestionnaire de données
-    data_manager = DataManager(output_dir)
+    data_manager = DataManager(output_dir, config['storage_backend'], config['storage_options'],
+                               rollups=config['stats_rollups'])
+    if config['search_index']:
+        # Index de recherche tenu à jour au fil des mutations
+        SearchIndex(output_dir).attach(data_manager)
     
     print("="*60)
     print("WHATSAPP EXTRACTOR V3")
     print("="*60)
     
-    # Processus
-    if args.full or args.extract_only or (not any(vars(args).values())):
-        # Extraction
-        print("\n[1/3] EXTRACTION")
-        extractor = UnifiedExtractor(data_manager, config)
-        extractor.extract_all()
+    if args.enqueue:
+        sync_job_queue(data_manager, config)
+        data_manager.close()
+        return
+    
+    # Sans mode explicite: extraction + export
+    default_mode = not (args.full or args.extract_only or args.transcribe_only or args.export_only)
     
-    if args.full or args.transcribe_only:
-        # Transcription
-        print("\n[2/3] TRANSCRIPTION")
-        if config['api_key'] and config['api_key'] != 'sk-xxxxxxxxxxxxxxxxxxxxx':
-            transcriber = SmartTranscriber(data_manager, config['api_key'])
-            transcriber.transcribe_all_pending()
-        else:
-            print("[ATTENTION] Clé API OpenAI manquante - Transcription ignorée")
+    # Processus
+    if args.watch:
+        print("\n[WATCH] INGESTION CONTINUE")
+        run_watch(data_manager, config)
+    elif args.full and config['pipeline'] and api_key_configured(config):
+        # Extraction et transcription en parallèle
+        print("\n[1-2/3] EXTRACTION + TRANSCRIPTION (pipeline)")
+        run_pipeline(data_manager, config)
+    else:
+        if args.full or args.extract_only or default_mode:
+            # Extraction
+            print("\n[1/3] EXTRACTION")
+            extractor = UnifiedExtractor(data_manager, config)
+            extractor.extract_all()
+        
+        if args.full or args.transcribe_only:
+            # Transcription
+            print("\n[2/3] TRANSCRIPTION")
+            if api_key_configured(config):
+                transcriber = create_transcriber(data_manager, config)
+                transcriber.transcribe_all_pending()
+                transcriber.close()
+            else:
+                print("[ATTENTION] Clé API OpenAI manquante - Transcription ignorée")
     
-    if args.full or args.export_only or (not any(vars(args).values())):
+    if (args.full or args.export_only or default_mode) and not args.watch:
         # Export
         print("\n[3/3] EXPORT")
         exporter = UnifiedExporter(data_manager, output_dir)
         exporter.export_simple()
     
+    data_manager.close()
+    
+    if args.metrics or args.profile:
+        metrics.print_summary()
+        metrics.write_profiles()
+    if args.metrics:
+        metrics.write(args.metrics)
+    
     print("\n" + "="*60)
     print("TERMINÉ!")
     print("="*60)
@@ -0,0 +1,209 @@
+"""
+JobQueue - File durable des transcriptions partagée entre plusieurs processus (--worker)
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+class TranscriptionJobQueue:
+    """File SQLite des audios à transcrire: pending -> leased -> done / error.
+
+    Un processus coordinateur (--enqueue) y publie les audios en attente du
+    DataManager et y relit les résultats. Les workers (--worker) prennent des
+    baux sur des lots de tâches; un bail expiré (worker arrêté) remet la tâche
+    en file. Chaque prise de bail compte une tentative: au-delà de
+    `max_attempts`, la tâche passe en erreur définitive.
+    """
+    
+    PENDING = 'pending'
+    LEASED = 'leased'
+    DONE = 'done'
+    ERROR = 'error'
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            contact TEXT NOT NULL,
+            audio_id TEXT NOT NULL,
+            audio TEXT NOT NULL,
+            path TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            transcription TEXT,
+            error TEXT,
+            applied INTEGER NOT NULL DEFAULT 0,
+            updated REAL NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_audio ON jobs(audio_id, contact);
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, lease_expires);
+        CREATE INDEX IF NOT EXISTS idx_jobs_applied ON jobs(applied, status);
+    """
+    
+    def __init__(self, output_dir: str, lease_seconds: float = 600, max_attempts: int = 3,
+                 journal_mode: str = 'wal'):
+        self.queue_file = os.path.join(output_dir, 'transcription_jobs.db')
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.lock = threading.Lock()
+        self._last_renewal = 0.0
+        
+        # Plusieurs processus: attendre le verrou d'écriture plutôt qu'échouer.
+        # Sur un système de fichiers partagé (NFS, SMB), utiliser journal_mode = delete
+        self.conn = sqlite3.connect(self.queue_file, timeout=60, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.conn.executescript(self.SCHEMA)
+    
+    @staticmethod
+    def default_worker_id() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+    
+    def _write(self, statements: Callable[[sqlite3.Connection], object]):
+        """Exécute `statements` dans une transaction d'écriture exclusive"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self.conn)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+    
+    # --- Coordinateur ---
+    
+    def enqueue(self, items: Iterable[Dict], resolve: Callable[[Dict], Optional[str]]) -> int:
+        """Publie les audios en attente (déjà présents: ignorés), retourne le nombre ajouté"""
+        now = time.time()
+        rows = [
+            (item['contact'], item['audio']['id'], json.dumps(dict(item['audio'].items()), ensure_ascii=False),
+             resolve(item), now)
+            for item in items
+        ]
+        
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (contact, audio_id, audio, path, updated) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            return conn.total_changes - before
+        
+        return self._write(insert)
+    
+    def collect(self, apply: Callable[[str, str, Optional[str], str, Optional[str]], object]) -> int:
+        """Applique les résultats terminés (done / error, avec la raison) non encore reportés, retourne leur nombre"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, contact, audio_id, transcription, status, error FROM jobs "
+                "WHERE applied = 0 AND status IN (?, ?) ORDER BY seq", (self.DONE, self.ERROR)
+            ).fetchall()
+        
+        for _, contact, audio_id, transcription, status, error in rows:
+            if status == self.DONE:
+                apply(contact, audio_id, transcription, 'success', None)
+            else:
+                apply(contact, audio_id, transcription, 'error', error)
+        
+        # Marqué après l'application: un arrêt entre les deux réapplique sans perte
+        if rows:
+            self._write(lambda conn: conn.executemany(
+                "UPDATE jobs SET applied = 1 WHERE seq = ?", [(row[0],) for row in rows]
+            ))
+        return len(rows)
+    
+    # --- Workers ---
+    
+    def lease(self, worker_id: str, count: int) -> List[Dict]:
+        """Prend un bail sur au plus `count` tâches (en attente ou dont le bail a expiré)"""
+        def claim(conn):
+            now = time.time()
+            self._expire(conn, now)
+            rows = conn.execute(
+                "SELECT seq, contact, audio, path, attempts FROM jobs "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY seq LIMIT ?",
+                (self.PENDING, self.LEASED, now, count)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE seq = ?",
+                [(self.LEASED, worker_id, now + self.lease_seconds, now, row[0]) for row in rows]
+            )
+            return rows
+        
+        self._last_renewal = time.monotonic()
+        return [
+            {'job': seq, 'contact': contact, 'audio': json.loads(audio), 'path': path, 'attempt': attempts + 1}
+            for seq, contact, audio, path, attempts in self._write(claim)
+        ]
+    
+    def _expire(self, conn: sqlite3.Connection, now: float):
+        """Baux expirés dont les tentatives sont épuisées: erreur définitive"""
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, updated = ? "
+            "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+            (self.ERROR, 'bail expiré (worker arrêté?)', now, self.LEASED, now, self.max_attempts)
+        )
+    
+    def renew(self, worker_id: str):
+        """Prolonge les baux du worker (au plus une fois par tiers de durée de bail)"""
+        if time.monotonic() - self._last_renewal < self.lease_seconds / 3:
+            return
+        self._last_renewal = time.monotonic()
+        now = time.time()
+        self._write(lambda conn: conn.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE status = ? AND lease_owner = ?",
+            (now + self.lease_seconds, self.LEASED, worker_id)
+        ))
+    
+    def complete(self, results: List[Tuple[Dict, Optional[str]]], worker_id: str,
+                 error: str = 'transcription échouée'):
+        """Enregistre les résultats d'un lot: succès -> done, échec -> nouvelle tentative ou error.
+        
+        Seules les tâches encore sous bail de `worker_id` sont mises à jour: le
+        résultat tardif d'un bail expiré puis repris par un autre worker est
+        ignoré. La raison d'un échec est celle de la tâche (item['error']),
+        sinon `error`.
+        """
+        now = time.time()
+        
+        def store(conn):
+            for item, transcription in results:
+                if transcription:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, transcription = ?, error = NULL, lease_owner = NULL, "
+                        "updated = ? WHERE seq = ? AND status = ? AND lease_owner = ?",
+                        (self.DONE, transcription, now, item['job'], self.LEASED, worker_id)
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                        "error = ?, lease_owner = NULL, updated = ? WHERE seq = ? AND status = ? AND lease_owner = ?",
+                        (self.max_attempts, self.ERROR, self.PENDING, item.get('error') or error, now, item['job'],
+                         self.LEASED, worker_id)
+                    )
+        
+        if results:
+            self._write(store)
+    
+    def active_leases(self) -> int:
+        """Tâches sous bail non expiré (détenues par d'autres workers en cours)"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND lease_expires >= ?", (self.LEASED, time.time())
+            ).fetchone()[0]
+    
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return {status: counts.get(status, 0) for status in (self.PENDING, self.LEASED, self.DONE, self.ERROR)}
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
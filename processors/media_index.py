@@ -0,0 +1,117 @@
+"""
+MediaIndex - Index des fichiers audio (media_dir + dossiers audio_mp3) construit une fois par exécution
+"""
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from utils.helpers import date_key, time_key
+
+AUDIO_EXTENSIONS = ('.opus', '.mp3', '.ogg', '.oga', '.m4a', '.aac', '.amr', '.wav')
+
+# Date (2024-01-05, 2024_01_05, 20240105) suivie éventuellement d'une heure (14-30, 1430)
+FILE_DATE_RE = re.compile(r'(\d{4})[-_]?(\d{2})[-_]?(\d{2})(?:\D{1,3}(\d{2})[-_:h.]?(\d{2}))?')
+
+class MediaIndex:
+    """Associe (contact, date, heure, nom de fichier) aux chemins audio en O(1)"""
+    
+    def __init__(self, output_dir: str, media_dir: Optional[str] = None, normalize=None):
+        self.output_dir = output_dir
+        self.media_dir = media_dir
+        # Normalisation des noms de dossiers vers les noms de contacts (DataManager._normalize_name)
+        self.normalize = normalize or (lambda name: name)
+        self.by_basename: Dict[str, List[str]] = {}
+        self.by_contact_datetime: Dict[Tuple[str, str, str], List[str]] = {}
+        self.by_contact_date: Dict[Tuple[str, str], List[str]] = {}
+        self.by_contact: Dict[str, List[str]] = {}
+        self.file_count = 0
+        self.built = False
+    
+    def build(self):
+        """Parcourt media_dir et les dossiers <contact>/audio_mp3 une seule fois"""
+        start = time.monotonic()
+        # Index construit à part puis substitué: une recherche concurrente (mode --watch)
+        # voit l'ancien ou le nouvel index, jamais un index partiel
+        fresh = MediaIndex(self.output_dir, self.media_dir, self.normalize)
+        fresh._scan()
+        self.by_basename = fresh.by_basename
+        self.by_contact_datetime = fresh.by_contact_datetime
+        self.by_contact_date = fresh.by_contact_date
+        self.by_contact = fresh.by_contact
+        self.file_count = fresh.file_count
+        self.built = True
+        print(f"[MEDIA] Index: {self.file_count} fichiers audio ({time.monotonic() - start:.2f}s)")
+    
+    def _scan(self):
+        if self.media_dir and os.path.isdir(self.media_dir):
+            for root, _, files in os.walk(self.media_dir):
+                for name in files:
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        self._add(None, root, name)
+        
+        if self.output_dir and os.path.isdir(self.output_dir):
+            for folder in os.listdir(self.output_dir):
+                audio_dir = os.path.join(self.output_dir, folder, 'audio_mp3')
+                if folder.startswith('.') or not os.path.isdir(audio_dir):
+                    continue
+                # Ordre de os.listdir conservé: repli historique sur le premier fichier
+                for name in os.listdir(audio_dir):
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        self._add(folder, audio_dir, name)
+    
+    def _add(self, folder: Optional[str], directory: str, name: str):
+        path = os.path.join(directory, name)
+        self.file_count += 1
+        self.by_basename.setdefault(name.lower(), []).append(path)
+        
+        if folder is None:
+            return
+        
+        contacts = {folder, self.normalize(folder)}
+        match = FILE_DATE_RE.search(name)
+        for contact in contacts:
+            self.by_contact.setdefault(contact, []).append(path)
+            if match:
+                day = ''.join(match.group(1, 2, 3))
+                self.by_contact_date.setdefault((contact, day), []).append(path)
+                if match.group(4):
+                    hour = match.group(4) + match.group(5)
+                    self.by_contact_datetime.setdefault((contact, day, hour), []).append(path)
+    
+    def resolve(self, contact: str, audio_info: Dict) -> Optional[str]:
+        """Chemin existant d'un audio: son chemin enregistré, sinon une recherche dans l'index"""
+        audio_path = audio_info.get('path')
+        if audio_path and os.path.exists(audio_path):
+            return audio_path
+        return self.find(contact, audio_info)
+    
+    def find(self, contact: str, audio_info: Dict) -> Optional[str]:
+        """Résout le fichier d'un audio: nom exact, puis date+heure, puis date, puis dossier du contact"""
+        if not self.built:
+            self.build()
+        
+        audio_path = audio_info.get('path')
+        if audio_path:
+            candidates = self.by_basename.get(os.path.basename(audio_path.replace('\\', '/')).lower())
+            if candidates:
+                # Préférer le fichier rangé dans le dossier du contact
+                for candidate in candidates:
+                    if os.sep + contact + os.sep in candidate:
+                        return candidate
+                return candidates[0]
+        
+        day = date_key(audio_info.get('date'))
+        if day:
+            hour = time_key(audio_info.get('time'))
+            if hour:
+                paths = self.by_contact_datetime.get((contact, day, hour))
+                if paths:
+                    return paths[0]
+            
+            paths = self.by_contact_date.get((contact, day))
+            if paths:
+                return paths[0]
+        
+        # Si pas de match par date, prendre le premier fichier du contact
+        paths = self.by_contact.get(contact)
+        return paths[0] if paths else None
@@ -0,0 +1,249 @@
+"""
+Preprocessor - Conversion des audios avant envoi (mono, débit réduit, silences retirés, longs audios découpés)
+"""
+import os
+import time
+import shutil
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+from processors.segmenter import detect_silences, plan_cuts, read_parts, split_audio
+from utils.audio import audio_duration
+from utils.metrics import metrics
+
+class AudioPreprocessor:
+    """Réduit les fichiers audio avec ffmpeg avant leur envoi à l'API.
+
+    Chaque fichier est converti en Opus mono basse fréquence, débit de parole,
+    en retirant les silences de début et de fin. Le résultat est rangé dans
+    `cache_dir` sous l'empreinte du contenu source et des réglages: il sert
+    d'une exécution à l'autre et aux workers qui partagent output_dir. Un
+    fichier que la conversion n'allège pas, ou qu'elle ne sait pas lire, est
+    envoyé tel quel (marqueur .orig dans le cache pour ne pas réessayer).
+    Un audio plus long que `max_segment_seconds` est découpé aux silences en
+    segments plus courts, envoyés séparément (même cache, un dossier par
+    fichier). Les conversions tournent dans des processus ffmpeg en parallèle,
+    en avance sur les envois. Sans ffmpeg, les fichiers originaux sont envoyés.
+    """
+    
+    STAGE = 'transcribe.preprocess'
+    
+    def __init__(self, cache_dir: str, enabled: bool = True, ffmpeg_path: str = '', workers: int = 0,
+                 bitrate: str = '24k', sample_rate: int = 16000, trim_silence: bool = True,
+                 silence_threshold_db: float = -45, min_size_kb: float = 64,
+                 max_segment_seconds: float = 0, split_silence_db: float = -35, min_silence_seconds: float = 0.5):
+        self.cache_dir = cache_dir
+        self.ffmpeg = (ffmpeg_path or shutil.which('ffmpeg')) if enabled else None
+        if self.ffmpeg and not os.path.exists(self.ffmpeg):
+            self.ffmpeg = None
+        if enabled and self.ffmpeg is None:
+            print(f"[PRETRAITEMENT] ffmpeg introuvable{': ' + ffmpeg_path if ffmpeg_path else ''} "
+                  f"- fichiers originaux envoyés")
+        self.workers = workers or os.cpu_count() or 1
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.trim_silence = trim_silence
+        self.silence_threshold_db = silence_threshold_db
+        # Petits fichiers envoyés tels quels: gain négligeable pour le coût d'un processus ffmpeg
+        self.min_bytes = int(min_size_kb * 1024)
+        # Découpage des longs audios (0 = jamais)
+        self.max_segment_seconds = max_segment_seconds
+        self.split_silence_db = split_silence_db
+        self.min_silence_seconds = min_silence_seconds
+        # Les réglages font partie de la clé: les changer reconvertit les fichiers
+        self.settings_key = self._settings_hash(self._filter_args())
+        self.segment_key = self._settings_hash(self._encode_args() + [
+            f"{max_segment_seconds:g}", f"{split_silence_db:g}", f"{min_silence_seconds:g}"
+        ])
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.lock = threading.Lock()
+        # Fichiers préparés par issue: convertis, servis par le cache, envoyés tels quels, échecs
+        self.counts = {'converted': 0, 'cache_hits': 0, 'kept': 0, 'failed': 0, 'segmented': 0}
+        self.segments = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.converted_bytes_in = 0
+        self.busy_seconds = 0.0
+        self._first_start: Optional[float] = None
+        self._last_end: Optional[float] = None
+    
+    @property
+    def active(self) -> bool:
+        return self.ffmpeg is not None
+    
+    @staticmethod
+    def _settings_hash(args: List[str]) -> str:
+        return hashlib.sha256(' '.join(args).encode('utf-8')).hexdigest()[:12]
+    
+    def _encode_args(self) -> List[str]:
+        return ['-ac', '1', '-ar', str(self.sample_rate), '-c:a', 'libopus', '-b:a', self.bitrate,
+                '-application', 'voip']
+    
+    def _filter_args(self) -> List[str]:
+        args = self._encode_args()
+        if self.trim_silence:
+            # Silence de début retiré, puis celui de fin (audio inversé); 0,3s conservées de chaque côté
+            trim = (f"silenceremove=start_periods=1:start_silence=0.3:"
+                    f"start_threshold={self.silence_threshold_db:g}dB:detection=peak")
+            args = ['-af', f"{trim},areverse,{trim},areverse"] + args
+        return args
+    
+    def _cache_path(self, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, fingerprint[:2], f"{fingerprint}_{self.settings_key}.ogg")
+    
+    def submit(self, fingerprint: str, audio_path: str) -> Future:
+        """Lance la préparation d'un fichier; le résultat est la liste des fichiers à envoyer"""
+        if not self.active:
+            future = Future()
+            future.set_result([audio_path])
+            return future
+        
+        with self.lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='preprocess')
+        return self._executor.submit(self.prepare_parts, fingerprint, audio_path)
+    
+    def prepare_parts(self, fingerprint: str, audio_path: str) -> List[str]:
+        """Fichiers à envoyer pour `audio_path`: segments d'un long audio, sinon un seul fichier"""
+        if self.active and self.max_segment_seconds and audio_duration(audio_path) > self.max_segment_seconds:
+            parts = self._split(fingerprint, audio_path)
+            if parts:
+                return parts
+        return [self.prepare(fingerprint, audio_path)]
+    
+    def _split(self, fingerprint: str, audio_path: str) -> Optional[List[str]]:
+        """Segments de `audio_path` coupés aux silences (cache), None si le découpage échoue"""
+        directory = os.path.join(self.cache_dir, fingerprint[:2], f"{fingerprint}_{self.segment_key}")
+        try:
+            size = os.path.getsize(audio_path)
+        except OSError:
+            # Fichier disparu ou illisible: le chemin d'un seul fichier signale l'erreur
+            return None
+        parts = read_parts(directory)
+        if parts is not None:
+            self._done('cache_hits', audio_path, size, sum(os.path.getsize(part) for part in parts), len(parts))
+            return parts
+        
+        start = time.monotonic()
+        silences = detect_silences(self.ffmpeg, audio_path, self.split_silence_db, self.min_silence_seconds)
+        duration = audio_duration(audio_path)
+        cuts = plan_cuts(duration, silences or [], self.max_segment_seconds) if silences is not None else []
+        parts = split_audio(self.ffmpeg, audio_path, cuts, directory, self._encode_args()) if cuts else None
+        self._timed(start)
+        if not parts:
+            print(f"[PRETRAITEMENT] Découpage impossible: {os.path.basename(audio_path)} - envoyé en un seul fichier")
+            return None
+        
+        print(f"[PRETRAITEMENT] {os.path.basename(audio_path)}: {duration:.0f}s découpées en {len(parts)} segments")
+        self._done('segmented', audio_path, size, sum(os.path.getsize(part) for part in parts), len(parts))
+        return parts
+    
+    def prepare(self, fingerprint: str, audio_path: str) -> str:
+        """Chemin à envoyer pour `audio_path`: version convertie (cache) ou fichier original"""
+        if not self.active:
+            return audio_path
+        
+        try:
+            size = os.path.getsize(audio_path)
+        except OSError:
+            return audio_path
+        if size < self.min_bytes:
+            return self._done('kept', audio_path, size, size)
+        
+        target = self._cache_path(fingerprint)
+        marker = target + '.orig'
+        if os.path.exists(marker):
+            return self._done('cache_hits', audio_path, size, size)
+        if os.path.exists(target):
+            return self._done('cache_hits', target, size, os.path.getsize(target))
+        
+        converted = self._convert(audio_path, target)
+        if converted is not None and converted < size:
+            return self._done('converted', target, size, converted)
+        
+        # Conversion impossible ou sans gain: l'original sera envoyé à chaque fois
+        if converted is not None:
+            os.remove(target)
+        try:
+            open(marker, 'w').close()
+        except OSError:
+            pass
+        return self._done('failed' if converted is None else 'kept', audio_path, size, size)
+    
+    def _convert(self, source: str, target: str) -> Optional[int]:
+        """Convertit `source` vers `target`; retourne la taille obtenue, None en cas d'échec"""
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Fichier temporaire propre au processus et au thread: plusieurs workers peuvent convertir en même temps
+        temp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp.ogg"
+        start = time.monotonic()
+        try:
+            result = subprocess.run(
+                [self.ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y', '-i', source]
+                + self._filter_args() + [temp],
+                capture_output=True, text=True, timeout=600
+            )
+            if result.returncode != 0 or not os.path.exists(temp):
+                error = (result.stderr or '').strip().splitlines()
+                print(f"[PRETRAITEMENT] Échec {os.path.basename(source)}: "
+                      f"{error[-1] if error else result.returncode} - fichier original envoyé")
+                return None
+            os.replace(temp, target)
+            return os.path.getsize(target)
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"[PRETRAITEMENT] Échec {os.path.basename(source)}: {e} - fichier original envoyé")
+            return None
+        finally:
+            self._timed(start)
+            if os.path.exists(temp):
+                os.remove(temp)
+    
+    def _timed(self, start: float):
+        """Comptabilise une opération ffmpeg commencée à `start`"""
+        end = time.monotonic()
+        metrics.observe('preprocess_latency', end - start)
+        with self.lock:
+            self.busy_seconds += end - start
+            self._first_start = start if self._first_start is None else min(self._first_start, start)
+            self._last_end = end if self._last_end is None else max(self._last_end, end)
+    
+    def _done(self, outcome: str, upload_path: str, size_in: int, size_out: int, segments: int = 0) -> str:
+        with self.lock:
+            self.counts[outcome] += 1
+            self.bytes_in += size_in
+            self.bytes_out += size_out
+            self.segments += segments
+            if outcome in ('converted', 'segmented'):
+                self.converted_bytes_in += size_in
+        metrics.count(self.STAGE, 'files')
+        metrics.count(self.STAGE, outcome)
+        metrics.count(self.STAGE, 'bytes_in', size_in)
+        metrics.count(self.STAGE, 'bytes_saved', size_in - size_out)
+        if segments:
+            metrics.count(self.STAGE, 'segments', segments)
+        return upload_path
+    
+    def print_summary(self):
+        counts = self.counts
+        files = sum(counts.values())
+        if not files:
+            return
+        saved = self.bytes_in - self.bytes_out
+        ratio = saved / self.bytes_in * 100 if self.bytes_in else 0
+        print(f"[PRETRAITEMENT] {files} fichiers: {counts['converted']} convertis, "
+              f"{counts['segmented']} découpés ({self.segments} segments), {counts['cache_hits']} depuis "
+              f"le cache, {counts['kept']} envoyés tels quels, {counts['failed']} échecs")
+        print(f"[PRETRAITEMENT] {self.bytes_in / 1e6:.1f} Mo -> {self.bytes_out / 1e6:.1f} Mo envoyés "
+              f"({saved / 1e6:.1f} Mo économisés, -{ratio:.0f}%)")
+        processed = counts['converted'] + counts['segmented']
+        if processed and self._last_end is not None:
+            window = max(1e-6, self._last_end - self._first_start)
+            print(f"[PRETRAITEMENT] Débit: {processed / window:.1f} fichiers/s, "
+                  f"{self.converted_bytes_in / 1e6 / window:.1f} Mo/s "
+                  f"({self.workers} conversions simultanées, {self.busy_seconds:.1f}s de conversion)")
+    
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
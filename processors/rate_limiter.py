@@ -0,0 +1,97 @@
+"""
+RateLimiter - Seau à jetons et concurrence adaptative pour les appels API
+"""
+import time
+import threading
+from typing import Optional
+
+class TokenBucket:
+    """Seau à jetons thread-safe: `rate_per_minute` jetons rechargés en continu"""
+    
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        # Par défaut: rafale maximale d'une seconde de débit (au moins un jeton)
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def acquire(self, amount: float = 1.0) -> float:
+        """Bloque jusqu'à disposer de `amount` jetons, retourne le temps attendu"""
+        # Une demande plus grande que le seau attendrait indéfiniment
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait = (amount - self.tokens) / self.rate
+            
+            time.sleep(wait)
+            waited += wait
+
+class AdaptiveConcurrency:
+    """Limite de requêtes simultanées ajustée dynamiquement (AIMD).
+
+    La limite est divisée par deux à chaque 429 et remonte d'une unité après
+    `limit` succès consécutifs, sans dépasser `max_limit`.
+    """
+    
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self._successes = 0
+        self.rate_limited = 0
+        self.condition = threading.Condition()
+    
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+    
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+    
+    def on_success(self):
+        with self.condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self.condition.notify_all()
+    
+    def on_rate_limited(self):
+        with self.condition:
+            self.rate_limited += 1
+            self._successes = 0
+            self.limit = max(self.min_limit, self.limit // 2)
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Délai demandé par le serveur (en-têtes Retry-After / retry-after-ms)"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        return None
+    
+    return None
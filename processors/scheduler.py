@@ -0,0 +1,115 @@
+"""
+Scheduler - Ordre de transcription des audios en attente (priorités, reprises différées)
+"""
+import time
+import heapq
+import itertools
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from utils.helpers import date_key, time_key
+from utils.audio import audio_duration
+
+POLICIES = ('recent', 'contacts', 'shortest')
+
+def parse_policies(value: str) -> List[str]:
+    """'recent, shortest' -> ['recent', 'shortest'] (vide: ordre d'extraction)"""
+    policies = [policy.strip().lower() for policy in (value or '').split(',') if policy.strip()]
+    unknown = [policy for policy in policies if policy not in POLICIES]
+    if unknown:
+        raise ValueError(f"Priorité inconnue: {', '.join(unknown)} (valeurs possibles: {', '.join(POLICIES)})")
+    return policies
+
+class TranscriptionScheduler:
+    """Tas des audios en attente, servis selon les priorités configurées.
+
+    Les politiques se combinent dans l'ordre donné (clé de tri lexicographique):
+    - recent: les audios les plus récents d'abord
+    - contacts: les contacts de `priority_contacts` d'abord (dans l'ordre de la liste)
+    - shortest: les audios les plus courts d'abord (durée lue dans le fichier)
+    À priorité égale, l'ordre d'extraction est conservé.
+
+    Un audio en échec passe dans une file de reprise différée (délai doublé à
+    chaque échec, au plus `retry_rounds` reprises): un fichier définitivement
+    illisible ne monopolise pas le débit et les autres audios passent avant.
+    Chaque audio servi doit être rendu par done() ou retry(); l'itération
+    s'arrête quand plus rien n'est en attente, en reprise ou en cours.
+    """
+    
+    def __init__(self, policies: Optional[List[str]] = None, priority_contacts: Optional[List[str]] = None,
+                 resolve: Optional[Callable[[Dict], Optional[str]]] = None,
+                 retry_rounds: int = 2, retry_cooldown: float = 60, idle_timeout: float = 0.2):
+        self.policies = list(policies or [])
+        self.contact_rank = {contact: rank for rank, contact in enumerate(priority_contacts or [])}
+        # Chemin du fichier d'un audio (nécessaire pour la politique shortest)
+        self.resolve = resolve
+        self.retry_rounds = max(0, retry_rounds)
+        self.retry_cooldown = retry_cooldown
+        self.idle_timeout = idle_timeout
+        self._heap: List[Tuple] = []
+        # Reprises: (instant de disponibilité, ordre, élément)
+        self._cooldown: List[Tuple[float, int, Dict]] = []
+        self._seq = itertools.count()
+        self._failures: Dict[Tuple[str, str], int] = {}
+        self.outstanding = 0
+        self.pushed = 0
+        self.retried = 0
+    
+    def _key(self, item: Dict) -> Tuple:
+        key = []
+        for policy in self.policies:
+            if policy == 'recent':
+                audio = item['audio']
+                stamp = (date_key(audio.get('date')) or '00000000') + (time_key(audio.get('time')) or '0000')
+                key.append(-int(stamp))
+            elif policy == 'contacts':
+                key.append(self.contact_rank.get(item['contact'], len(self.contact_rank)))
+            elif policy == 'shortest':
+                path = self.resolve(item) if self.resolve else None
+                # Fichier introuvable: servi en premier, l'erreur est signalée sans appel API
+                key.append(audio_duration(path) if path else 0.0)
+        return tuple(key)
+    
+    def push(self, item: Dict):
+        heapq.heappush(self._heap, (self._key(item), next(self._seq), item))
+        self.pushed += 1
+    
+    def __len__(self) -> int:
+        return len(self._heap) + len(self._cooldown)
+    
+    def done(self, item: Dict):
+        """Audio terminé (transcrit ou en échec définitif)"""
+        self.outstanding -= 1
+        self._failures.pop((item['contact'], item['audio']['id']), None)
+    
+    def retry(self, item: Dict) -> Optional[float]:
+        """Replanifie un audio en échec; retourne le délai, ou None si les reprises sont épuisées"""
+        audio_key = (item['contact'], item['audio']['id'])
+        failures = self._failures.get(audio_key, 0)
+        if failures >= self.retry_rounds:
+            return None
+        
+        self._failures[audio_key] = failures + 1
+        delay = self.retry_cooldown * (2 ** failures)
+        heapq.heappush(self._cooldown, (time.monotonic() + delay, next(self._seq), item))
+        self.outstanding -= 1
+        self.retried += 1
+        return delay
+    
+    def __iter__(self) -> Iterator[Optional[Dict]]:
+        """Audios dans l'ordre de priorité; None pendant l'attente d'une reprise ou d'un résultat"""
+        while True:
+            now = time.monotonic()
+            if self._cooldown and self._cooldown[0][0] <= now:
+                # Une reprise prête passe devant: son délai lui a déjà été imposé
+                item = heapq.heappop(self._cooldown)[2]
+            elif self._heap:
+                item = heapq.heappop(self._heap)[2]
+            elif self._cooldown or self.outstanding > 0:
+                wait = self._cooldown[0][0] - now if self._cooldown else self.idle_timeout
+                time.sleep(min(self.idle_timeout, max(0.0, wait)))
+                yield None
+                continue
+            else:
+                return
+            
+            self.outstanding += 1
+            yield item
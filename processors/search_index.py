@@ -0,0 +1,259 @@
+"""
+SearchIndex - Index plein texte des messages et transcriptions (search_index.db, SQLite FTS5)
+"""
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+from core.data_manager import normalize_contact_name
+from core.records import pack_timestamp
+from utils.helpers import date_key, time_key
+
+# Élisions françaises (l', d', qu', jusqu'...) retirées des requêtes: "l'école" cherche "école"
+ELISION_RE = re.compile(r"^(?:[cdjlmnst]|qu|jusqu|lorsqu|puisqu|quoiqu)['’]", re.IGNORECASE)
+# Requête: "expression exacte" ou mot (éventuellement suivi de * pour un préfixe)
+QUERY_TERM_RE = re.compile(r'"([^"]+)"|(\S+)')
+# Identifiant d'un document: horodatage << STAMP_SHIFT | compteur d'insertion (modulo 2^24),
+# l'index FTS parcourt ainsi les documents par date sans tri
+STAMP_SHIFT = 24
+SEQ_MASK = (1 << STAMP_SHIFT) - 1
+
+def timestamp(date: Optional[str], time_value: Optional[str]) -> int:
+    """Horodatage YYYYMMDDHHMM d'un message (0 si la date est inconnue)"""
+    stamp = pack_timestamp(date or '', time_value or '')
+    if stamp is not None:
+        return stamp
+    day = date_key(date)
+    return int(day + (time_key(time_value) or '0000')) if day else 0
+
+def contact_tag(contact_name: str) -> str:
+    """Jeton indexé propre à un contact (liste de documents du contact dans l'index)"""
+    return 'c' + hashlib.md5(contact_name.encode('utf-8')).hexdigest()[:16]
+
+def build_query(text: str) -> str:
+    """Requête FTS5 (termes combinés en ET) à partir d'une saisie libre"""
+    terms = []
+    for phrase, word in QUERY_TERM_RE.findall(text):
+        prefix = False
+        if word:
+            prefix = word.endswith('*')
+            phrase = ELISION_RE.sub('', word.rstrip('*'))
+        # Ponctuation seule ou article élidé isolé: rien à chercher
+        if not re.search(r'\w', phrase):
+            continue
+        terms.append('"' + phrase.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+class SearchIndex:
+    """Index inversé des messages et des transcriptions, par contact et par date.
+
+    Les documents (contact, type, horodatage, texte) sont dans la table docs;
+    la table FTS5 docs_fts en est l'index (contenu externe, accents ignorés).
+    L'identifiant d'un document commence par son horodatage: les résultats
+    sortent de l'index du plus récent au plus ancien et la recherche s'arrête
+    à `limit`. Chaque document porte aussi le jeton de son contact, si bien
+    que le filtre par contact est une intersection de listes de l'index.
+    Abonné au DataManager, l'index suit add_message / insert_audio /
+    update_transcription et valide ses écritures à chaque flush avec la
+    révision des données; sync() rattrape les modifications faites sans lui
+    (contacts modifiés depuis cette révision). La recherche n'ouvre que ce
+    fichier, jamais les données principales.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS docs (
+            id INTEGER PRIMARY KEY,
+            contact TEXT NOT NULL,
+            ref TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            direction TEXT,
+            date TEXT,
+            time TEXT,
+            stamp INTEGER NOT NULL,
+            text TEXT NOT NULL DEFAULT '',
+            tag TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_docs_ref ON docs(contact, ref);
+        CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+            text, tag, content='docs', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TABLE IF NOT EXISTS contacts (name TEXT PRIMARY KEY, tag TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+    
+    def __init__(self, output_dir: str):
+        self.index_file = os.path.join(output_dir, 'search_index.db')
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.index_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self._tags: Dict[str, str] = dict(self.conn.execute("SELECT name, tag FROM contacts"))
+        self._seq = int(self._meta('seq') or 0)
+    
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def _set_meta(self, key: str, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+    
+    # --- Indexation ---
+    
+    def attach(self, data_manager):
+        """Rattrape les modifications manquées puis suit celles du DataManager"""
+        self.sync(data_manager)
+        data_manager.add_listener(self)
+    
+    def sync(self, data_manager) -> int:
+        """Réindexe les contacts modifiés depuis la dernière révision indexée, retourne leur nombre"""
+        start = time.monotonic()
+        with self.lock:
+            since = int(self._meta('revision') or 0)
+            if self._meta('dataset_id') != data_manager.dataset_id:
+                # Données recréées: index reconstruit entièrement
+                self.conn.execute("DELETE FROM docs")
+                self.conn.execute("DELETE FROM contacts")
+                self.conn.execute("INSERT INTO docs_fts(docs_fts) VALUES ('delete-all')")
+                self._tags = {}
+                self._set_meta('dataset_id', data_manager.dataset_id)
+                since = 0
+            
+            revision = data_manager.revision
+            changed = data_manager.changed_contacts(since) if revision > since else []
+            for contact_name in changed:
+                self._remove_contact(contact_name)
+                for message in data_manager.iter_messages(contact_name):
+                    self._add_message(contact_name, message.get('id'), message)
+                for audio in data_manager.iter_audios(contact_name):
+                    self._add_audio(contact_name, audio.get('id'), audio)
+            
+            self._set_meta('seq', self._seq)
+            self._set_meta('revision', revision)
+            self.conn.commit()
+        
+        if changed:
+            print(f"[RECHERCHE] Index mis à jour: {len(changed)} contacts ({time.monotonic() - start:.2f}s)")
+        return len(changed)
+    
+    def _remove_contact(self, contact_name: str):
+        self.conn.execute(
+            "INSERT INTO docs_fts(docs_fts, rowid, text, tag) "
+            "SELECT 'delete', id, text, tag FROM docs WHERE contact = ?", (contact_name,)
+        )
+        self.conn.execute("DELETE FROM docs WHERE contact = ?", (contact_name,))
+    
+    def _insert(self, contact_name: str, ref: str, kind: str, record: Dict, text: str):
+        tag = self._tags.get(contact_name)
+        if tag is None:
+            tag = self._tags[contact_name] = contact_tag(contact_name)
+            self.conn.execute("INSERT OR IGNORE INTO contacts (name, tag) VALUES (?, ?)", (contact_name, tag))
+        
+        date, time_value = record.get('date'), record.get('time')
+        stamp = timestamp(date, time_value)
+        while True:
+            self._seq += 1
+            doc_id = stamp << STAMP_SHIFT | (self._seq & SEQ_MASK)
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO docs (id, contact, ref, kind, direction, date, time, stamp, text, tag) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, contact_name, ref, kind, record.get('direction'), date, time_value, stamp, text, tag)
+            )
+            if cursor.rowcount:
+                break
+            # Document déjà indexé, sinon identifiant déjà pris (compteur revenu au même rang)
+            if self.conn.execute("SELECT 1 FROM docs WHERE contact = ? AND ref = ?", (contact_name, ref)).fetchone():
+                return
+        
+        # Chaque document est indexé, même vide: l'index reste le reflet exact de docs
+        self.conn.execute("INSERT INTO docs_fts(rowid, text, tag) VALUES (?, ?, ?)", (doc_id, text, tag))
+    
+    def _add_message(self, contact_name: str, msg_id: str, message: Dict):
+        content = message.get('content') or ''
+        if content:
+            self._insert(contact_name, msg_id, 'message', message, content)
+    
+    def _add_audio(self, contact_name: str, audio_id: str, audio: Dict):
+        # Audio non transcrit: document vide, rempli par on_transcription
+        text = audio.get('transcription') if audio.get('transcription_status') == 'success' else None
+        self._insert(contact_name, audio_id, 'audio', audio, text or '')
+    
+    def on_message(self, contact_name: str, msg_id: str, message: Dict):
+        with self.lock:
+            self._add_message(contact_name, msg_id, message)
+    
+    def on_audio(self, contact_name: str, audio_id: str, audio_info: Dict):
+        with self.lock:
+            self._add_audio(contact_name, audio_id, audio_info)
+    
+    def on_transcription(self, contact_name: str, audio_id: str, transcription: Optional[str], status: str):
+        text = transcription if status == 'success' and transcription else ''
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, text, tag FROM docs WHERE contact = ? AND ref = ?", (contact_name, audio_id)
+            ).fetchone()
+            if row is None:
+                # Audio absent de l'index: rien à mettre à jour
+                return
+            doc_id, old_text, tag = row
+            if old_text == text:
+                return
+            self.conn.execute("INSERT INTO docs_fts(docs_fts, rowid, text, tag) VALUES ('delete', ?, ?, ?)",
+                              (doc_id, old_text, tag))
+            self.conn.execute("UPDATE docs SET text = ? WHERE id = ?", (text, doc_id))
+            self.conn.execute("INSERT INTO docs_fts(rowid, text, tag) VALUES (?, ?, ?)", (doc_id, text, tag))
+    
+    def flush(self, revision: int):
+        """Valide les documents ajoutés depuis le dernier flush (données écrites jusqu'à `revision`)"""
+        with self.lock:
+            self._set_meta('seq', self._seq)
+            self._set_meta('revision', revision)
+            self.conn.commit()
+    
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+    
+    # --- Recherche ---
+    
+    def search(self, query: str, contact: Optional[str] = None, since: Optional[str] = None,
+               limit: int = 50) -> List[Dict]:
+        """Documents correspondant à `query`, du plus récent au plus ancien"""
+        terms = build_query(query)
+        if not terms:
+            return []
+        
+        since_id = 0
+        if since:
+            day = date_key(since)
+            if not day:
+                raise ValueError(f"Date invalide: {since} (format attendu: AAAA-MM-JJ)")
+            since_id = int(day + '0000') << STAMP_SHIFT
+        
+        with self.lock:
+            match = f"text : ({terms})"
+            if contact:
+                # Même normalisation que les noms enregistrés; correspondance partielle
+                tags = [row[0] for row in self.conn.execute(
+                    "SELECT tag FROM contacts WHERE name LIKE ?", (f"%{normalize_contact_name(contact)}%",)
+                )]
+                if not tags:
+                    return []
+                match += " AND tag : (" + ' OR '.join(f'"{tag}"' for tag in tags) + ")"
+            
+            rows = self.conn.execute(
+                "SELECT d.contact, d.kind, d.direction, d.date, d.time, "
+                "snippet(docs_fts, 0, '[', ']', '…', 16) "
+                "FROM docs_fts JOIN docs d ON d.id = docs_fts.rowid "
+                "WHERE docs_fts MATCH ? AND docs_fts.rowid >= ? ORDER BY docs_fts.rowid DESC LIMIT ?",
+                (match, since_id, limit)
+            ).fetchall()
+        return [
+            {'contact': row[0], 'kind': row[1], 'direction': row[2], 'date': row[3], 'time': row[4],
+             'snippet': row[5]}
+            for row in rows
+        ]
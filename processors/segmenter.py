@@ -0,0 +1,120 @@
+"""
+Segmenter - Découpage des longs audios aux silences (ffmpeg silencedetect + segment)
+"""
+import os
+import re
+import json
+import shutil
+import threading
+import subprocess
+from typing import List, Optional, Tuple
+
+SILENCE_START_RE = re.compile(r'silence_start:\s*(-?[\d.]+)')
+SILENCE_END_RE = re.compile(r'silence_end:\s*(-?[\d.]+)')
+# Liste des segments d'un fichier découpé, écrite en dernier (découpage complet)
+PARTS_FILE = 'parts.json'
+
+def detect_silences(ffmpeg: str, path: str, threshold_db: float = -35,
+                    min_silence: float = 0.5) -> Optional[List[Tuple[float, float]]]:
+    """Intervalles de silence (début, fin) en secondes, None si ffmpeg échoue"""
+    try:
+        result = subprocess.run(
+            [ffmpeg, '-nostdin', '-hide_banner', '-i', path,
+             '-af', f"silencedetect=noise={threshold_db:g}dB:d={min_silence:g}", '-f', 'null', '-'],
+            capture_output=True, text=True, timeout=600
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    
+    silences = []
+    start = None
+    for line in result.stderr.splitlines():
+        match = SILENCE_START_RE.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = SILENCE_END_RE.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    if start is not None:
+        # Silence jusqu'à la fin du fichier
+        silences.append((start, float('inf')))
+    return silences
+
+def plan_cuts(duration: float, silences: List[Tuple[float, float]], max_seconds: float) -> List[float]:
+    """Instants de coupe donnant des segments de moins de `max_seconds`.
+
+    Chaque segment s'arrête au milieu du dernier silence de sa fenêtre; sans
+    silence dans la seconde moitié de la fenêtre, la coupe tombe à la limite.
+    """
+    cuts = []
+    start = 0.0
+    middles = [(begin + min(end, duration)) / 2 for begin, end in silences]
+    while duration - start > max_seconds:
+        limit = start + max_seconds
+        candidates = [middle for middle in middles if start + max_seconds / 2 <= middle < limit]
+        cut = candidates[-1] if candidates else limit
+        cuts.append(round(cut, 3))
+        start = cut
+    return cuts
+
+def read_parts(directory: str) -> Optional[List[str]]:
+    """Segments d'un découpage déjà fait (None si absent ou incomplet)"""
+    try:
+        with open(os.path.join(directory, PARTS_FILE), 'r', encoding='utf-8') as f:
+            names = json.load(f)['parts']
+    except (OSError, ValueError, KeyError):
+        return None
+    parts = [os.path.join(directory, name) for name in names]
+    return parts if all(os.path.exists(part) for part in parts) else None
+
+def split_audio(ffmpeg: str, path: str, cuts: List[float], directory: str,
+                encode_args: List[str]) -> Optional[List[str]]:
+    """Découpe `path` aux instants `cuts` en une passe (segments réencodés), None en cas d'échec.
+    
+    Le découpage se fait dans un dossier propre au processus et au thread,
+    renommé en `directory` une fois complet: deux workers qui découpent le même
+    contenu ne suppriment jamais les segments l'un de l'autre.
+    """
+    temp_dir = f"{directory}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    try:
+        pattern = os.path.join(temp_dir, 'part_%03d.ogg')
+        try:
+            result = subprocess.run(
+                [ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y', '-i', path] + encode_args
+                + ['-f', 'segment', '-segment_times', ','.join(f"{cut:g}" for cut in cuts),
+                   '-reset_timestamps', '1', pattern],
+                capture_output=True, text=True, timeout=1800
+            )
+        except (OSError, subprocess.SubprocessError):
+            return None
+        if result.returncode != 0:
+            return None
+        
+        names = sorted(name for name in os.listdir(temp_dir) if name.startswith('part_') and name.endswith('.ogg'))
+        if not names:
+            return None
+        with open(os.path.join(temp_dir, PARTS_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'source': os.path.basename(path), 'cuts': cuts, 'parts': names}, f)
+        
+        try:
+            os.replace(temp_dir, directory)
+        except OSError:
+            # Dossier non vide: découpage complet d'un autre worker, gardé tel quel
+            parts = read_parts(directory)
+            if parts is not None:
+                return parts
+            # Sinon restes d'un découpage interrompu, remplacés
+            shutil.rmtree(directory, ignore_errors=True)
+            try:
+                os.replace(temp_dir, directory)
+            except OSError:
+                return read_parts(directory)
+        return [os.path.join(directory, name) for name in names]
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
@@ -2,89 +2,466 @@
 SmartTranscriber - Transcription intelligente avec gestion d'erreurs
 """
 import os
-import re
 import time
+import random
+import itertools
 import openai
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from core.data_manager import DataManager
+from core.pipeline import AudioQueue
+from processors.rate_limiter import TokenBucket, AdaptiveConcurrency, retry_after_seconds
+from processors.transcription_cache import TranscriptionCache
+from processors.media_index import MediaIndex
+from processors.job_queue import TranscriptionJobQueue
+from processors.scheduler import TranscriptionScheduler, parse_policies
+from processors.preprocessor import AudioPreprocessor
+from utils.audio import audio_duration
+from utils.helpers import FingerprintCache
+from utils.metrics import metrics
+
+# Raisons d'échec enregistrées avec les audios (statistiques --stats, export)
+MISSING_FILE = 'Fichier audio introuvable'
+UNREADABLE_FILE = 'Fichier audio illisible'
+
+def error_reason(error: Exception) -> str:
+    """Raison courte et stable d'un échec d'appel API (regroupée dans les statistiques)"""
+    status_code = getattr(error, 'status_code', None)
+    if status_code == 429:
+        return "Limite de débit de l'API (429)"
+    if status_code:
+        return f"Refusé par l'API ({status_code})" if status_code < 500 else f"Erreur serveur de l'API ({status_code})"
+    return f"Échec de l'appel API ({type(error).__name__})"
 
 class SmartTranscriber:
-    def __init__(self, data_manager: DataManager, api_key: str):
+    def __init__(self, data_manager: Optional[DataManager], api_key: str, base_url: Optional[str] = None,
+                 concurrency: int = 1, requests_per_minute: float = 50,
+                 audio_seconds_per_minute: float = 0, batch_size: int = 50,
+                 cache_max_entries: int = 200000, cache_max_mb: float = 256,
+                 media_dir: Optional[str] = None, output_dir: Optional[str] = None,
+                 cache_journal_mode: str = 'wal', priority: str = '',
+                 priority_contacts: Optional[List[str]] = None, retry_rounds: int = 2,
+                 retry_cooldown: float = 60, preprocess: Optional[Dict] = None):
+        # Sans DataManager (worker de la file partagée), seul output_dir est utilisé
         self.data_manager = data_manager
-        self.client = openai.OpenAI(api_key=api_key)
+        output_dir = output_dir or data_manager.output_dir
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url or None)
         self.max_retries = 3
         self.retry_delay = 5
+        self.max_rate_limit_retries = 8
+        # Mode concurrent: requêtes simultanées, limites par minute, écriture par lots
+        self.concurrency = max(1, concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.audio_seconds_per_minute = audio_seconds_per_minute
+        self.batch_size = max(1, batch_size)
+        # Cache persistant par empreinte du contenu audio (notes vocales transférées, réextractions)
+        self.cache = TranscriptionCache(output_dir, cache_max_entries,
+                                        int(cache_max_mb * 1024 * 1024), cache_journal_mode)
+        # Empreintes des fichiers audio par (chemin, taille, mtime): un audio inchangé n'est pas relu
+        self.fingerprints = FingerprintCache(os.path.join(output_dir, 'fingerprints.db'), cache_journal_mode)
+        self.duplicates = 0
+        # Fichiers soumis à l'API lors du dernier passage concurrent
+        self.submitted = 0
+        # Index des fichiers audio, construit une fois par exécution (inutile pour un worker:
+        # les chemins des tâches sont résolus par le coordinateur)
+        self.media_index = MediaIndex(output_dir, media_dir, normalize=data_manager._normalize_name) \
+            if data_manager is not None else None
+        # Tâches soumises et non terminées, par empreinte (regroupement des doublons en flux)
+        self._open_jobs: Dict[str, List[Tuple[Dict, str]]] = {}
+        # Mode worker: résultats écrits dans la file partagée au lieu du DataManager
+        self.job_queue: Optional[TranscriptionJobQueue] = None
+        self.worker_id: Optional[str] = None
+        # Ordre de traitement de l'arriéré (transcribe_all_pending) et reprises différées
+        self.priority = parse_policies(priority)
+        self.priority_contacts = [data_manager._normalize_name(contact) for contact in priority_contacts or []] \
+            if data_manager is not None else []
+        self.retry_rounds = retry_rounds
+        self.retry_cooldown = retry_cooldown
+        self.scheduler: Optional[TranscriptionScheduler] = None
+        # Fichiers refusés par l'API (erreur 4xx): inutile de les reprendre
+        self._rejected = set()
+        # Raison du dernier échec par fichier, enregistrée avec les audios en erreur
+        self._errors: Dict[str, str] = {}
+        # Conversion avant envoi (ffmpeg), résultats rangés par empreinte dans output_dir/.audio_cache
+        self.preprocessor = AudioPreprocessor(os.path.join(output_dir, '.audio_cache'),
+                                              **(preprocess or {'enabled': False}))
         
     def transcribe_all_pending(self):
         """Transcrit tous les audios en attente"""
-        pending = self.data_manager.get_all_pending_audios()
+        with metrics.stage('transcribe') as stage:
+            self._transcribe_all_pending(stage)
+    
+    def _transcribe_all_pending(self, stage):
+        # Les audios en attente sont servis depuis un tas selon les priorités configurées
+        with metrics.stage('transcribe.prepare'):
+            self.media_index.build()
+            scheduler = TranscriptionScheduler(
+                self.priority, self.priority_contacts, resolve=self._resolve_audio_path,
+                retry_rounds=self.retry_rounds, retry_cooldown=self.retry_cooldown
+            )
+            unresolved = []
+            for item in self.data_manager.iter_pending_audios():
+                if not scheduler.resolve(item):
+                    unresolved.append(item)
+                scheduler.push(item)
         
-        if not pending:
+        if not scheduler.pushed:
             print("[TRANSCRIPTION] Aucun audio en attente")
             return
         
-        print(f"[TRANSCRIPTION] {len(pending)} audios à transcrire...")
+        order = ', '.join(self.priority) or "ordre d'extraction"
+        print(f"[TRANSCRIPTION] {scheduler.pushed} audios à transcrire (priorité: {order})...")
+        # Signaler les audios sans fichier avant de consommer du temps d'API
+        self._report_unresolved(unresolved)
+        
+        # Un seul appel API par contenu audio distinct, cache consulté avant tout appel
+        self.duplicates = 0
+        self._stream_counts = {'audios': 0, 'success': 0, 'errors': 0, 'unresolved': 0}
+        self.scheduler = scheduler
+        try:
+            with metrics.stage('transcribe.api') as api_stage:
+                jobs = self._iter_stream_jobs(scheduler)
+                if self.concurrency > 1:
+                    success, errors = self._transcribe_concurrent(jobs)
+                else:
+                    success, errors = self._transcribe_serial(jobs)
+                api_stage.add('files', self.submitted)
+                api_stage.add('deferred_retries', scheduler.retried)
+        finally:
+            self.scheduler = None
+        
+        counts = self._stream_counts
+        stage.add('audios', scheduler.pushed)
+        stage.add('transcribed', counts['success'] + success)
+        stage.add('errors', counts['errors'] + errors)
+        
+        print(f"[TRANSCRIPTION] Terminée: {counts['success'] + success} succès, {counts['errors'] + errors} erreurs"
+              f" ({scheduler.retried} reprises différées)")
+        
+        cache_stats = self.cache.stats()
+        print(f"[CACHE] {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+              f"{self.duplicates} doublons regroupés, {cache_stats['entries']} entrées "
+              f"({cache_stats['evicted']} évincées)")
+    
+    def transcribe_stream(self, audio_queue: AudioQueue, backlog: Optional[List[Dict]] = None):
+        """Transcrit les audios publiés par l'extracteur au fil de l'eau (mode pipeline).
+        
+        `backlog` contient les audios déjà en attente avant l'extraction. Le
+        traitement s'arrête quand la file est fermée et vidée.
+        """
+        with metrics.stage('transcribe') as stage:
+            self.media_index.build()
+            self.duplicates = 0
+            self._stream_counts = {'audios': 0, 'success': 0, 'errors': 0, 'unresolved': 0}
+            print(f"[TRANSCRIPTION] Mode pipeline: {len(backlog or [])} audios déjà en attente, "
+                  f"les nouveaux sont transcrits pendant l'extraction")
+            
+            try:
+                with metrics.stage('transcribe.api') as api_stage:
+                    jobs = self._iter_stream_jobs(itertools.chain(backlog or [], audio_queue))
+                    success, errors = self._transcribe_concurrent(jobs)
+                    api_stage.add('files', self.submitted)
+            except BaseException:
+                # Ne jamais laisser l'extracteur bloqué sur une file pleine
+                audio_queue.abandon()
+                raise
+            
+            counts = self._stream_counts
+            stage.add('audios', counts['audios'])
+            stage.add('transcribed', counts['success'] + success)
+            stage.add('errors', counts['errors'] + errors)
+        
+        if counts['unresolved']:
+            print(f"[MEDIA] {counts['unresolved']} audios sans fichier correspondant")
+        print(f"[TRANSCRIPTION] Terminée: {counts['success'] + success} succès, {counts['errors'] + errors} erreurs "
+              f"({audio_queue.published} audios reçus de l'extraction, file max {audio_queue.max_size})")
+    
+    def _iter_stream_jobs(self, items: Iterable[Optional[Dict]]) -> Iterator[Optional[Tuple[str, List]]]:
+        """Tâches (empreinte, membres) d'un flux d'audios, cache et doublons servis localement.
+        
+        Un élément None (file momentanément vide) est transmis tel quel pour que
+        les résultats déjà obtenus soient traités sans attendre.
+        """
+        counts = self._stream_counts
+        results = []
+        for item in items:
+            if item is None or len(results) >= self.batch_size:
+                self._write_results(results)
+                results = []
+                if item is None:
+                    yield None
+                    continue
+            
+            counts['audios'] += 1
+            audio_path = self._resolve_audio_path(item)
+            fingerprint = None
+            if audio_path:
+                try:
+                    fingerprint = self.fingerprints.get(audio_path)
+                except OSError:
+                    fingerprint = None
+            else:
+                counts['unresolved'] += 1
+            
+            if fingerprint is None:
+                item['error'] = UNREADABLE_FILE if audio_path else MISSING_FILE
+                results.append((item, None))
+                counts['errors'] += 1
+                if self.scheduler is not None:
+                    self.scheduler.done(item)
+                continue
+            
+            cached = self.cache.get(fingerprint)
+            if cached is not None:
+                results.append((item, cached))
+                counts['success'] += 1
+                if self.scheduler is not None:
+                    self.scheduler.done(item)
+                continue
+            
+            # Même contenu déjà en cours de transcription: rattaché à la tâche existante
+            members = self._open_jobs.get(fingerprint)
+            if members is not None:
+                members.append((item, audio_path))
+                self.duplicates += 1
+                continue
+            
+            yield fingerprint, [(item, audio_path)]
         
+        self._write_results(results)
+    
+    def run_worker(self, job_queue: TranscriptionJobQueue, worker_id: Optional[str] = None,
+                   poll_interval: float = 5.0):
+        """Vide la file partagée par lots sous bail, en parallèle d'autres workers.
+        
+        S'arrête quand plus aucune tâche n'est en attente ni sous bail: tant
+        que d'autres workers détiennent des baux, ceux-ci peuvent expirer et
+        revenir dans la file.
+        """
+        self.job_queue = job_queue
+        self.worker_id = worker_id or job_queue.default_worker_id()
         success_count = 0
         error_count = 0
+        print(f"[WORKER] {self.worker_id}: file {job_queue.counts()}")
         
-        for item in pending:
-            contact = item['contact']
-            audio = item['audio']
-            
-            # Vérifier que le fichier existe
-            audio_path = audio.get('path')
-            if not audio_path or not os.path.exists(audio_path):
-                # Chercher dans les dossiers audio_mp3
-                audio_path = self._find_audio_file(contact, audio)
+        with metrics.stage('transcribe') as stage:
+            while True:
+                items = job_queue.lease(self.worker_id, self.batch_size)
+                if not items:
+                    if not job_queue.active_leases():
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                
+                print(f"[WORKER] {len(items)} tâches sous bail")
+                stage.add('audios', len(items))
+                jobs, success, errors = self._prepare_jobs(items)
+                success_count += success
+                error_count += errors
+                with metrics.stage('transcribe.api') as api_stage:
+                    if self.concurrency > 1:
+                        success, errors = self._transcribe_concurrent(jobs)
+                    else:
+                        success, errors = self._transcribe_serial(jobs)
+                    api_stage.add('files', len(jobs))
+                success_count += success
+                error_count += errors
             
+            stage.add('transcribed', success_count)
+            stage.add('errors', error_count)
+        
+        print(f"[WORKER] {self.worker_id} terminé: {success_count} succès, {error_count} échecs; "
+              f"file {job_queue.counts()}")
+    
+    def close(self):
+        """Ferme le cache de transcriptions, celui des empreintes et le pool de prétraitement"""
+        self.preprocessor.close()
+        self.preprocessor.print_summary()
+        self.cache.close()
+        self.fingerprints.close()
+    
+    def _resolve_audio_path(self, item: Dict) -> Optional[str]:
+        """Chemin du fichier audio d'un élément en attente (None si introuvable)"""
+        if 'job' in item:
+            # Tâche de la file partagée: chemin déjà résolu par le coordinateur
+            audio_path = item.get('path')
+            return audio_path if audio_path and os.path.exists(audio_path) else None
+        
+        audio_path = item['audio'].get('path')
+        if not audio_path or not os.path.exists(audio_path):
+            # Chercher dans les dossiers audio_mp3
+            audio_path = self._find_audio_file(item['contact'], item['audio'])
+        return audio_path
+    
+    @staticmethod
+    def _report_unresolved(unresolved: List[Dict]):
+        """Liste (au plus 10) les audios sans fichier correspondant"""
+        if not unresolved:
+            return
+        print(f"[MEDIA] {len(unresolved)} audios sans fichier correspondant:")
+        for item in unresolved[:10]:
+            print(f"  - {item['contact']}: {item['audio'].get('path')} "
+                  f"({item['audio'].get('date')} {item['audio'].get('time')})")
+        if len(unresolved) > 10:
+            print(f"  ... et {len(unresolved) - 10} autres")
+    
+    def _prepare_jobs(self, pending: List[Dict]) -> Tuple[List[Tuple[str, List[Tuple[Dict, str]]]], int, int]:
+        """Regroupe les audios par empreinte et sert ceux déjà présents dans le cache.
+        
+        Retourne (tâches [(empreinte, [(élément, chemin)])], succès, erreurs).
+        """
+        groups: Dict[str, List[Tuple[Dict, str]]] = {}
+        results = []
+        unresolved = []
+        
+        if self.media_index is not None:
+            self.media_index.build()
+        
+        for item in pending:
+            audio_path = self._resolve_audio_path(item)
             if not audio_path:
-                self.data_manager.update_transcription(
-                    contact, 
-                    audio['id'], 
-                    None, 
-                    'error'
-                )
-                error_count += 1
-                continue
+                unresolved.append(item)
+            fingerprint = None
+            if audio_path:
+                try:
+                    fingerprint = self.fingerprints.get(audio_path)
+                except OSError:
+                    fingerprint = None
             
-            # Transcrire
-            transcription = self._transcribe_with_retry(audio_path)
+            if fingerprint is None:
+                item['error'] = UNREADABLE_FILE if audio_path else MISSING_FILE
+                results.append((item, None))
+                continue
             
+            groups.setdefault(fingerprint, []).append((item, audio_path))
+        
+        # Signaler les audios sans fichier avant de consommer du temps d'API
+        self._report_unresolved(unresolved)
+        
+        jobs = []
+        for fingerprint, members in groups.items():
+            cached = self.cache.get(fingerprint)
+            if cached is not None:
+                results.extend((item, cached) for item, _ in members)
+            else:
+                jobs.append((fingerprint, members))
+        
+        self.duplicates = sum(len(members) - 1 for members in groups.values())
+        self._write_results(results)
+        
+        success_count = sum(1 for _, transcription in results if transcription)
+        if success_count:
+            print(f"[CACHE] {success_count} audios servis depuis le cache")
+        print(f"[TRANSCRIPTION] {len(jobs)} fichiers distincts à envoyer à l'API")
+        
+        return jobs, success_count, len(results) - success_count
+    
+    def _transcribe_serial(self, jobs: List[Tuple[str, List[Tuple[Dict, str]]]]) -> Tuple[int, int]:
+        """Transcrit les fichiers un par un (mode historique)"""
+        success_count = 0
+        error_count = 0
+        self.submitted = 0
+        
+        for job in jobs:
+            if job is None:
+                # Flux momentanément vide (reprise pas encore prête)
+                continue
+            fingerprint, members = job
+            self.submitted += 1
+            # Transcrire une fois, répartir sur tous les audios de même contenu
+            audio_path = members[0][1]
+            parts = self.preprocessor.prepare_parts(fingerprint, audio_path)
+            transcription = self._transcribe_parts(
+                audio_path, parts, lambda part: self._transcribe_with_retry(audio_path, part)
+            )
+            results = self._complete_job(fingerprint, members, transcription)
+            self._write_results(results)
             if transcription:
-                self.data_manager.update_transcription(
-                    contact,
-                    audio['id'],
-                    transcription,
-                    'success'
-                )
-                success_count += 1
-                print(f"[OK] {contact}: {os.path.basename(audio_path)}")
+                success_count += len(results)
             else:
-                self.data_manager.update_transcription(
-                    contact,
-                    audio['id'],
-                    None,
-                    'error'
-                )
-                error_count += 1
-                print(f"[ERREUR] {contact}: {os.path.basename(audio_path)}")
+                error_count += len(results)
             
             # Pause pour éviter rate limit
             time.sleep(1)
         
-        print(f"[TRANSCRIPTION] Terminée: {success_count} succès, {error_count} erreurs")
+        return success_count, error_count
+    
+    def _complete_job(self, fingerprint: str, members: List[Tuple[Dict, str]],
+                      transcription: Optional[str]) -> List[Tuple[Dict, Optional[str]]]:
+        """Met en cache et répartit le résultat d'un fichier sur ses audios.
+        
+        Retourne les résultats à écrire; les audios replanifiés par le
+        scheduler (reprise différée) n'en font pas partie.
+        """
+        if transcription:
+            self.cache.put(fingerprint, transcription)
+        if self.job_queue is not None:
+            self.job_queue.renew(self.worker_id)
+        
+        # Fichier refusé par l'API: une reprise échouerait de la même façon
+        retry = self.scheduler is not None and not transcription and members[0][1] not in self._rejected
+        reason = self._errors.pop(members[0][1], None)
+        results = []
+        for item, audio_path in members:
+            if transcription:
+                print(f"[OK] {item['contact']}: {os.path.basename(audio_path)}")
+            else:
+                item['error'] = reason
+                delay = self.scheduler.retry(item) if retry else None
+                if delay is not None:
+                    print(f"[REPRISE] {item['contact']}: {os.path.basename(audio_path)} "
+                          f"(nouvel essai dans {delay:.0f}s)")
+                    continue
+                print(f"[ERREUR] {item['contact']}: {os.path.basename(audio_path)}")
+            if self.scheduler is not None:
+                self.scheduler.done(item)
+            results.append((item, transcription))
+        
+        return results
+    
+    def _transcribe_parts(self, audio_path: str, parts: List[str], transcribe_one: Callable[[str], Optional[str]],
+                          executor: Optional[ThreadPoolExecutor] = None) -> Optional[str]:
+        """Transcrit un fichier envoyé en un ou plusieurs segments, recollés dans l'ordre.
+        
+        Chaque segment transcrit est mis en cache: après un échec ou une
+        interruption, seuls les segments manquants sont renvoyés.
+        """
+        if len(parts) == 1:
+            return transcribe_one(parts[0])
+        
+        # Clé d'un segment: dossier de découpage (empreinte + réglages) et rang
+        keys = ['segment:' + os.path.basename(os.path.dirname(part)) + '/' + os.path.basename(part) for part in parts]
+        texts = [self.cache.get(key) for key in keys]
+        missing = [index for index, text in enumerate(texts) if text is None]
+        if len(missing) < len(parts):
+            print(f"[SEGMENTS] {os.path.basename(audio_path)}: {len(parts) - len(missing)}/{len(parts)} "
+                  f"segments déjà transcrits")
+        
+        def transcribe_segment(index):
+            text = transcribe_one(parts[index])
+            # Un segment de silence donne un texte vide: résultat valide
+            if text is not None:
+                self.cache.put(keys[index], text)
+            return index, text
+        
+        metrics.count('transcribe.api', 'segments', len(missing))
+        results = executor.map(transcribe_segment, missing) if executor is not None and len(missing) > 1 \
+            else map(transcribe_segment, missing)
+        for index, text in results:
+            texts[index] = text
+        
+        if any(text is None for text in texts):
+            return None
+        return ' '.join(text for text in texts if text)
     
-    def _transcribe_with_retry(self, audio_path: str) -> Optional[str]:
-        """Transcrit avec retry intelligent"""
+    def _transcribe_with_retry(self, audio_path: str, upload_path: Optional[str] = None) -> Optional[str]:
+        """Transcrit avec retry intelligent (`upload_path`: version prétraitée à envoyer)"""
         for attempt in range(self.max_retries):
+            if attempt:
+                metrics.count('transcribe.api', 'retries')
             try:
-                with open(audio_path, 'rb') as audio_file:
-                    response = self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        language="fr"
-                    )
+                with open(upload_path or audio_path, 'rb') as audio_file:
+                    response = self._timed_request(self.client, audio_file)
                 
                 if isinstance(response, str):
                     return response.strip()
@@ -93,6 +470,7 @@ class SmartTranscriber:
                     
             except Exception as e:
                 error_msg = str(e)
+                self._errors[audio_path] = error_reason(e)
                 
                 # Gestion intelligente des erreurs
                 if "rate limit" in error_msg.lower():
@@ -101,6 +479,7 @@ class SmartTranscriber:
                     time.sleep(wait_time)
                 elif "invalid" in error_msg.lower() or "api" in error_msg.lower():
                     print(f"[ERREUR API] {error_msg}")
+                    self._rejected.add(audio_path)
                     return None
                 else:
                     if attempt < self.max_retries - 1:
@@ -110,31 +489,192 @@ class SmartTranscriber:
         
         return None
     
-    def _find_audio_file(self, contact: str, audio_info: dict) -> Optional[str]:
-        """Cherche le fichier audio dans les dossiers"""
-        # Logique pour retrouver les fichiers audio
-        output_dir = self.data_manager.output_dir
-        
-        # Chercher dans audio_mp3
-        audio_dir = os.path.join(output_dir, contact, 'audio_mp3')
-        if os.path.exists(audio_dir):
-            for file in os.listdir(audio_dir):
-                if file.endswith('.mp3'):
-                    # Matcher par date/heure ou autre critère
-                    file_date = None
-                    audio_date = audio_info.get('date')
-                    
-                    # Essayer d'extraire la date du nom de fichier
-                    date_match = re.search(r'(\d{4}[-_]\d{2}[-_]\d{2})', file)
-                    if date_match:
-                        file_date = date_match.group(1)
-                    
-                    # Si on a une date dans l'audio_info et qu'elle correspond au fichier
-                    if audio_date and file_date and audio_date in file_date:
-                        return os.path.join(audio_dir, file)
+    def _transcribe_concurrent(self, jobs: Iterable[Optional[Tuple[str, List[Tuple[Dict, str]]]]]) -> Tuple[int, int]:
+        """Transcrit avec plusieurs requêtes simultanées et limitation de débit.
+        
+        `jobs` peut être un flux: un élément None signifie qu'aucune tâche n'est
+        disponible pour l'instant (la source n'est pas épuisée).
+        """
+        # Les 429 sont gérés ici (Retry-After, réduction de concurrence), pas par le client
+        client = self.client.with_options(max_retries=0)
+        limiter = AdaptiveConcurrency(self.concurrency)
+        request_bucket = TokenBucket(self.requests_per_minute) if self.requests_per_minute else None
+        audio_bucket = None
+        if self.audio_seconds_per_minute:
+            # Seau d'au moins quelques minutes d'audio pour admettre les longues notes
+            audio_bucket = TokenBucket(self.audio_seconds_per_minute,
+                                       capacity=max(self.audio_seconds_per_minute / 60.0, 600))
+        
+        print(f"[TRANSCRIPTION] Mode concurrent: {self.concurrency} requêtes simultanées, "
+              f"{self.requests_per_minute or '∞'} req/min")
+        
+        def work(job, prepared):
+            fingerprint, members = job
+            audio_path = members[0][1]
+            # Segments d'un long audio envoyés en parallèle, dans la limite de concurrence partagée
+            transcription = self._transcribe_parts(
+                audio_path, prepared.result(),
+                lambda part: self._transcribe_limited(client, audio_path, limiter, request_bucket, audio_bucket, part),
+                segment_executor
+            )
+            return fingerprint, members, transcription
+        
+        success_count = 0
+        error_count = 0
+        self.submitted = 0
+        results = []
+        start = time.monotonic()
+        
+        # Soumission bornée: pas plus de 2x la concurrence en file dans le pool
+        remaining = iter(jobs)
+        exhausted = False
+        in_flight = set()
+        self._open_jobs = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='segment') as segment_executor:
+            while True:
+                while not exhausted and len(in_flight) < self.concurrency * 2:
+                    job = next(remaining, StopIteration)
+                    if job is StopIteration:
+                        exhausted = True
+                        break
+                    if job is None:
+                        # Flux momentanément vide: traiter les résultats disponibles
+                        break
+                    self._open_jobs[job[0]] = job[1]
+                    # Conversion lancée dès la soumission: elle avance pendant les envois en cours
+                    prepared = self.preprocessor.submit(job[0], job[1][0][1])
+                    in_flight.add(executor.submit(work, job, prepared))
+                    self.submitted += 1
+                
+                if not in_flight:
+                    if exhausted:
+                        break
+                    # Attente de la source: écrire les résultats déjà obtenus
+                    self._write_results(results)
+                    results = []
+                    continue
+                
+                # Flux non épuisé: ne pas bloquer tant qu'il reste de la place dans le pool
+                full = len(in_flight) >= self.concurrency * 2
+                done, in_flight = wait(in_flight, timeout=None if exhausted or full else 0,
+                                       return_when=FIRST_COMPLETED)
+                for future in done:
+                    fingerprint, members, transcription = future.result()
+                    del self._open_jobs[fingerprint]
+                    completed = self._complete_job(fingerprint, members, transcription)
+                    results.extend(completed)
+                    if transcription:
+                        success_count += len(completed)
+                    else:
+                        error_count += len(completed)
+                
+                if len(results) >= self.batch_size:
+                    self._write_results(results)
+                    results = []
+        
+        self._write_results(results)
+        
+        elapsed = time.monotonic() - start
+        rate = self.submitted / elapsed * 60 if elapsed else 0
+        print(f"[TRANSCRIPTION] Débit: {rate:.1f} fichiers/min, {limiter.rate_limited} limitations 429, "
+              f"concurrence finale {limiter.limit}")
+        
+        return success_count, error_count
+    
+    def _write_results(self, results: List[Tuple[Dict, Optional[str]]]):
+        """Écrit un lot de résultats en une seule écriture durable"""
+        if not results:
+            return
+        
+        if self.job_queue is not None:
+            self.job_queue.complete(results, self.worker_id)
+            return
+        
+        with self.data_manager.batch():
+            for item, transcription in results:
+                self.data_manager.update_transcription(
+                    item['contact'],
+                    item['audio']['id'],
+                    transcription,
+                    'success' if transcription else 'error',
+                    None if transcription else item.get('error')
+                )
+    
+    def _transcribe_limited(self, client, audio_path: str, limiter: AdaptiveConcurrency,
+                            request_bucket: Optional[TokenBucket],
+                            audio_bucket: Optional[TokenBucket], upload_path: Optional[str] = None) -> Optional[str]:
+        """Transcrit un fichier avec limitation de débit et backoff adaptatif"""
+        upload_path = upload_path or audio_path
+        # Les 429 ont leur propre budget: ils signalent une saturation, pas un échec du fichier
+        attempt = 0
+        rate_limited = 0
+        while attempt < self.max_retries and rate_limited <= self.max_rate_limit_retries:
+            if attempt or rate_limited:
+                metrics.count('transcribe.api', 'retries')
+            delay = 0.0
+            limiter.acquire()
+            try:
+                if request_bucket:
+                    request_bucket.acquire()
+                if audio_bucket:
+                    audio_bucket.acquire(audio_duration(upload_path))
+                
+                with open(upload_path, 'rb') as audio_file:
+                    response = self._timed_request(client, audio_file)
+                
+                limiter.on_success()
+                if isinstance(response, str):
+                    return response.strip()
+                return response.text.strip()
             
-            # Si pas de match par date, prendre le premier fichier
-            if os.listdir(audio_dir):
-                return os.path.join(audio_dir, os.listdir(audio_dir)[0])
+            except openai.RateLimitError as e:
+                # Honorer Retry-After, sinon backoff exponentiel avec gigue
+                self._errors[audio_path] = error_reason(e)
+                limiter.on_rate_limited()
+                metrics.count('transcribe.api', 'rate_limited')
+                delay = retry_after_seconds(e) or self.retry_delay * (2 ** rate_limited) * random.uniform(0.5, 1.5)
+                rate_limited += 1
+                print(f"[RATE LIMIT] Attente {delay:.1f}s (concurrence {limiter.limit})...")
+            except openai.APIStatusError as e:
+                self._errors[audio_path] = error_reason(e)
+                # Erreur définitive (fichier invalide, trop gros, clé...)
+                if e.status_code < 500:
+                    print(f"[ERREUR API] {e}")
+                    self._rejected.add(audio_path)
+                    return None
+                delay = self.retry_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+                attempt += 1
+            except Exception as e:
+                self._errors[audio_path] = error_reason(e)
+                delay = self.retry_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+                attempt += 1
+            finally:
+                limiter.release()
+            
+            if attempt < self.max_retries:
+                time.sleep(delay)
         
         return None
+    
+    @staticmethod
+    def _timed_request(client, audio_file):
+        """Appel de l'API de transcription, latence et échecs comptés dans les mesures"""
+        metrics.count('transcribe.api', 'requests')
+        start = time.perf_counter()
+        try:
+            response = client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                language="fr"
+            )
+        except Exception:
+            metrics.count('transcribe.api', 'failed_requests')
+            metrics.observe('api_latency_failed', time.perf_counter() - start)
+            raise
+        metrics.observe('api_latency', time.perf_counter() - start)
+        return response
+    
+    def _find_audio_file(self, contact: str, audio_info: dict) -> Optional[str]:
+        """Cherche le fichier audio dans l'index des médias (media_dir + audio_mp3)"""
+        return self.media_index.find(contact, audio_info)
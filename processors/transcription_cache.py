@@ -0,0 +1,133 @@
+"""
+TranscriptionCache - Cache persistant des transcriptions indexé par empreinte du contenu audio
+"""
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Optional
+from utils.helpers import file_fingerprint
+
+def audio_fingerprint(audio_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Empreinte SHA-256 du contenu audio, lue par blocs"""
+    return file_fingerprint(audio_path, 'sha256', chunk_size)
+
+class TranscriptionCache:
+    """Cache SQLite empreinte -> transcription avec éviction LRU bornée en taille"""
+    
+    # Hits accumulés au plus avant d'écrire leurs dates d'utilisation sans attendre un put
+    TOUCH_BATCH = 100
+    
+    def __init__(self, output_dir: str, max_entries: int = 200000, max_bytes: int = 256 * 1024 * 1024,
+                 journal_mode: str = 'wal'):
+        self.cache_file = os.path.join(output_dir, 'transcription_cache.db')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._puts = 0
+        # Dates d'utilisation des hits, écrites avec le prochain put (jamais de transaction laissée ouverte)
+        self._touched: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        
+        # Partagé par les workers: attendre le verrou plutôt qu'échouer (delete sur système de fichiers partagé)
+        self.conn = sqlite3.connect(self.cache_file, timeout=60, check_same_thread=False)
+        self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS transcriptions (
+                fingerprint TEXT PRIMARY KEY,
+                transcription TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_transcriptions_last_used ON transcriptions(last_used);
+        """)
+        self.conn.commit()
+    
+    def get(self, fingerprint: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT transcription FROM transcriptions WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            
+            self.hits += 1
+            self._touched[fingerprint] = time.time()
+            if len(self._touched) >= self.TOUCH_BATCH:
+                self._write_touched()
+                self.conn.commit()
+            return row[0]
+    
+    def _write_touched(self):
+        """Reporte les dates d'utilisation en attente (dans la transaction de l'appelant)"""
+        if self._touched:
+            self.conn.executemany(
+                "UPDATE transcriptions SET last_used = ? WHERE fingerprint = ?",
+                [(used, fingerprint) for fingerprint, used in self._touched.items()]
+            )
+            self._touched = {}
+    
+    def put(self, fingerprint: str, transcription: str):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO transcriptions (fingerprint, transcription, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (fingerprint, transcription, len(transcription.encode('utf-8')), now, now)
+            )
+            self._write_touched()
+            self.conn.commit()
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._evict()
+    
+    def _evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà des limites"""
+        count, total = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcriptions"
+        ).fetchone()
+        
+        excess = max(0, count - self.max_entries) if self.max_entries else 0
+        if self.max_bytes and total > self.max_bytes:
+            # Supprimer assez d'entrées anciennes pour repasser sous la limite
+            freed = 0
+            rows = self.conn.execute("SELECT size FROM transcriptions ORDER BY last_used")
+            by_size = 0
+            for (size,) in rows:
+                if total - freed <= self.max_bytes:
+                    break
+                freed += size
+                by_size += 1
+            excess = max(excess, by_size)
+        
+        if excess:
+            self.conn.execute(
+                "DELETE FROM transcriptions WHERE fingerprint IN "
+                "(SELECT fingerprint FROM transcriptions ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self.conn.commit()
+            self.evicted += excess
+    
+    def stats(self) -> Dict:
+        with self.lock:
+            count, total = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcriptions"
+            ).fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evicted': self.evicted,
+            'entries': count,
+            'bytes': total
+        }
+    
+    def close(self):
+        with self.lock:
+            self._write_touched()
+            self._evict()
+            self.conn.commit()
+            self.conn.close()
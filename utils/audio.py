@@ -0,0 +1,93 @@
+"""
+Audio - Durée des fichiers audio (métadonnées Ogg, ffprobe ou estimation par la taille)
+"""
+import os
+import json
+import shutil
+import struct
+import subprocess
+from typing import Dict, Optional
+
+# Débit approximatif d'une note vocale WhatsApp (opus ~16 kbit/s) pour estimer la durée
+VOICE_NOTE_BYTES_PER_SECOND = 2000
+
+OGG_EXTENSIONS = ('.opus', '.ogg', '.oga')
+# Fin de fichier lue pour trouver la dernière page Ogg (une page fait au plus ~64 Ko)
+OGG_TAIL_BYTES = 65536 + 4096
+
+_FFPROBE = shutil.which('ffprobe')
+# Durées déjà calculées: (chemin, taille, mtime) -> secondes
+_DURATIONS: Dict[tuple, float] = {}
+
+def estimate_duration(path: str) -> float:
+    """Durée estimée (secondes) d'après la taille du fichier"""
+    try:
+        return max(1.0, os.path.getsize(path) / VOICE_NOTE_BYTES_PER_SECOND)
+    except OSError:
+        return 1.0
+
+def ogg_duration(path: str) -> Optional[float]:
+    """Durée d'un fichier Ogg (Opus ou Vorbis) lue dans ses en-têtes et sa dernière page"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(4096)
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - OGG_TAIL_BYTES))
+            tail = f.read()
+    except OSError:
+        return None
+    
+    if not head.startswith(b'OggS'):
+        return None
+    
+    # Fréquence de la granule: 48 kHz pour Opus (moins le pre-skip), fréquence d'échantillonnage pour Vorbis
+    pre_skip = 0
+    opus = head.find(b'OpusHead')
+    vorbis = head.find(b'\x01vorbis')
+    if opus >= 0 and len(head) >= opus + 12:
+        rate = 48000
+        pre_skip = struct.unpack_from('<H', head, opus + 10)[0]
+    elif vorbis >= 0 and len(head) >= vorbis + 16:
+        rate = struct.unpack_from('<I', head, vorbis + 12)[0]
+    else:
+        return None
+    
+    last_page = tail.rfind(b'OggS')
+    if last_page < 0 or len(tail) < last_page + 14 or not rate:
+        return None
+    granule = struct.unpack_from('<q', tail, last_page + 6)[0]
+    if granule <= 0:
+        return None
+    return max(0.0, (granule - pre_skip) / rate)
+
+def ffprobe_duration(path: str) -> Optional[float]:
+    """Durée lue par ffprobe (None si ffprobe est absent ou échoue)"""
+    if not _FFPROBE:
+        return None
+    try:
+        result = subprocess.run(
+            [_FFPROBE, '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', path],
+            capture_output=True, text=True, timeout=30
+        )
+        return float(json.loads(result.stdout)['format']['duration'])
+    except (OSError, subprocess.SubprocessError, ValueError, KeyError, TypeError):
+        return None
+
+def audio_duration(path: str) -> float:
+    """Durée (secondes) d'un fichier audio: métadonnées si possible, sinon estimation par la taille"""
+    try:
+        stats = os.stat(path)
+    except OSError:
+        return 1.0
+    
+    key = (path, stats.st_size, stats.st_mtime_ns)
+    duration = _DURATIONS.get(key)
+    if duration is None:
+        if path.lower().endswith(OGG_EXTENSIONS):
+            duration = ogg_duration(path)
+        if duration is None:
+            duration = ffprobe_duration(path)
+        if duration is None:
+            duration = estimate_duration(path)
+        _DURATIONS[key] = duration
+    return duration
@@ -3,9 +3,31 @@ Helpers - Fonctions utilitaires pour WhatsApp Extractor
 """
 import os
 import re
+import zlib
+import mmap
+import sqlite3
 import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, List, Tuple
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Lecture par blocs réutilisant le même tampon; au-delà du seuil, le fichier est projeté en mémoire (mmap)
+FINGERPRINT_CHUNK_SIZE = 1024 * 1024
+FINGERPRINT_MMAP_THRESHOLD = 8 * 1024 * 1024
+# Empreinte rapide non cryptographique: xxh3 128 bits si xxhash est installé, sinon crc32
+# (crc32 suffit à détecter un changement de contenu, pas à dédoublonner de nombreux fichiers)
+FAST_ALGORITHM = 'xxh3_128' if xxhash is not None else 'crc32'
+FINGERPRINT_ALGORITHMS = ('sha256', 'sha1', 'md5', 'blake2b', 'crc32', 'xxh3_128', 'fast')
+
+# Date et heure des enregistrements (2024/01/05, 2024-01-05, 20240105 ; 14:30, 9h05)
+DATE_KEY_RE = re.compile(r'(\d{4})\D?(\d{2})\D?(\d{2})')
+TIME_KEY_RE = re.compile(r'(\d{1,2})\D(\d{2})')
 
 def ensure_directory(path: str) -> bool:
     """Crée un répertoire s'il n'existe pas déjà"""
@@ -48,14 +70,250 @@ def format_date(date_str: str) -> str:
     
     return date_str  # Si aucun format ne correspond
 
+def date_key(value: Optional[str]) -> Optional[str]:
+    """Date normalisée en YYYYMMDD ('2024/01/05' et '2024-01-05' se rejoignent)"""
+    match = DATE_KEY_RE.search(value or '')
+    return ''.join(match.groups()) if match else None
+
+def time_key(value: Optional[str]) -> Optional[str]:
+    """Heure normalisée en HHMM ('9:05' devient '0905')"""
+    match = TIME_KEY_RE.search(value or '')
+    return f"{int(match.group(1)):02d}{match.group(2)}" if match else None
+
+class _Crc32:
+    """crc32 (zlib) avec l'interface update/hexdigest de hashlib"""
+    
+    def __init__(self):
+        self.value = 0
+    
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+    
+    def hexdigest(self) -> str:
+        return f"{self.value:08x}"
+
+def resolve_algorithm(algorithm: str) -> str:
+    """Nom effectif d'un algorithme d'empreinte ('fast' selon les modules installés)"""
+    if algorithm == 'fast':
+        return FAST_ALGORITHM
+    if algorithm not in FINGERPRINT_ALGORITHMS:
+        raise ValueError(f"Algorithme d'empreinte inconnu: {algorithm} "
+                         f"(valeurs possibles: {', '.join(FINGERPRINT_ALGORITHMS)})")
+    if algorithm == 'xxh3_128' and xxhash is None:
+        raise ValueError("Algorithme xxh3_128 indisponible: le module xxhash n'est pas installé")
+    return algorithm
+
+def _hasher(algorithm: str):
+    if algorithm == 'crc32':
+        return _Crc32()
+    if algorithm == 'xxh3_128':
+        return xxhash.xxh3_128()
+    if algorithm == 'blake2b':
+        return hashlib.blake2b(digest_size=16)
+    return hashlib.new(algorithm)
+
+def file_fingerprint(file_path: str, algorithm: str = 'sha256', chunk_size: int = FINGERPRINT_CHUNK_SIZE,
+                     use_mmap: Optional[bool] = None) -> str:
+    """Empreinte hexadécimale du contenu d'un fichier, sans jamais le charger en entier.
+    
+    Lecture par blocs de `chunk_size` dans un tampon réutilisé, ou projection
+    en mémoire (mmap) pour les fichiers d'au moins FINGERPRINT_MMAP_THRESHOLD
+    octets quand `use_mmap` vaut None. Lève OSError si le fichier est illisible.
+    """
+    algorithm = resolve_algorithm(algorithm)
+    with open(file_path, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap is None:
+            use_mmap = size >= FINGERPRINT_MMAP_THRESHOLD
+        if use_mmap and size:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    hasher = _hasher(algorithm)
+                    hasher.update(mapped)
+                    return hasher.hexdigest()
+            except (OSError, ValueError):
+                # mmap indisponible (système de fichiers réseau...): lecture par blocs
+                f.seek(0)
+        
+        hasher = _hasher(algorithm)
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            hasher.update(view[:read])
+        return hasher.hexdigest()
+
+class FingerprintCache:
+    """Cache SQLite des empreintes de fichiers, valable tant que (chemin, taille, mtime_ns) ne change pas.
+    
+    Un fichier inchangé n'est jamais relu. Le fichier est partagé par les
+    workers: chaque écriture est validée aussitôt (aucune transaction laissée
+    ouverte), et une base verrouillée par un autre processus compte comme un
+    défaut de cache au lieu d'une erreur.
+    """
+    
+    # Empreintes écrites par transaction par fingerprint_tree
+    STORE_BATCH = 200
+    
+    def __init__(self, db_path: str, journal_mode: str = 'wal'):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                path TEXT NOT NULL,
+                algorithm TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (path, algorithm)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_hashed = 0
+    
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.normcase(os.path.abspath(file_path))
+    
+    def lookup(self, file_path: str, algorithm: str = 'sha256',
+               stats: Optional[os.stat_result] = None) -> Optional[str]:
+        """Empreinte en cache si le fichier n'a pas changé depuis, sans lire le fichier"""
+        algorithm = resolve_algorithm(algorithm)
+        stats = stats or os.stat(file_path)
+        with self.lock:
+            try:
+                row = self.conn.execute(
+                    "SELECT size, mtime_ns, digest FROM fingerprints WHERE path = ? AND algorithm = ?",
+                    (self._key(file_path), algorithm)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                # Base verrouillée ou illisible: défaut de cache
+                return None
+        if row and row[0] == stats.st_size and row[1] == stats.st_mtime_ns:
+            return row[2]
+        return None
+    
+    def store(self, file_path: str, algorithm: str, stats: os.stat_result, digest: str):
+        self.store_many(algorithm, [(file_path, stats, digest)])
+    
+    def store_many(self, algorithm: str, entries: List[Tuple[str, os.stat_result, str]]):
+        """Enregistre des (chemin, stat, empreinte) en une transaction courte, validée aussitôt"""
+        algorithm = resolve_algorithm(algorithm)
+        rows = [(self._key(file_path), algorithm, stats.st_size, stats.st_mtime_ns, digest)
+                for file_path, stats, digest in entries]
+        with self.lock:
+            try:
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO fingerprints (path, algorithm, size, mtime_ns, digest) "
+                        "VALUES (?, ?, ?, ?, ?)", rows
+                    )
+            except sqlite3.OperationalError:
+                # Base verrouillée par un autre worker: empreintes recalculées la prochaine fois
+                pass
+    
+    def get(self, file_path: str, algorithm: str = 'sha256') -> str:
+        """Empreinte d'un fichier: depuis le cache, sinon calculée puis mise en cache"""
+        stats = os.stat(file_path)
+        digest = self.lookup(file_path, algorithm, stats)
+        if digest is not None:
+            self.hits += 1
+            return digest
+        
+        digest = file_fingerprint(file_path, algorithm)
+        # Fichier modifié pendant la lecture: empreinte rendue mais pas mise en cache
+        after = os.stat(file_path)
+        if (after.st_size, after.st_mtime_ns) == (stats.st_size, stats.st_mtime_ns):
+            self.store(file_path, algorithm, stats, digest)
+        self.misses += 1
+        self.bytes_hashed += stats.st_size
+        return digest
+    
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+def iter_files(root: str, extensions: Optional[Iterable[str]] = None) -> Iterable[Tuple[str, os.stat_result]]:
+    """(chemin, stat) des fichiers sous `root`, récursivement (extensions en minuscules, avec le point)"""
+    extensions = tuple(extensions) if extensions else None
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        try:
+            with os.scandir(directory) as entries:
+                entries = list(entries)
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file() and (extensions is None or entry.name.lower().endswith(extensions)):
+                    yield entry.path, entry.stat()
+            except OSError:
+                continue
+
+def fingerprint_tree(root: str, algorithm: str = 'sha256', cache: Optional[FingerprintCache] = None,
+                     workers: int = 0, extensions: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """Empreintes de tous les fichiers sous `root` ({chemin: empreinte}).
+    
+    Les fichiers déjà en cache et inchangés ne sont pas relus; les autres sont
+    hachés en parallèle (hashlib et zlib libèrent le GIL pendant le calcul).
+    Les fichiers devenus illisibles pendant le parcours sont ignorés.
+    """
+    algorithm = resolve_algorithm(algorithm)
+    fingerprints: Dict[str, str] = {}
+    missing: List[Tuple[str, os.stat_result]] = []
+    for file_path, stats in iter_files(root, extensions):
+        digest = cache.lookup(file_path, algorithm, stats) if cache is not None else None
+        if digest is not None:
+            cache.hits += 1
+            fingerprints[file_path] = digest
+        else:
+            missing.append((file_path, stats))
+    
+    def compute(item):
+        file_path, stats = item
+        try:
+            return file_path, stats, file_fingerprint(file_path, algorithm)
+        except OSError:
+            return file_path, stats, None
+    
+    workers = workers or min(8, (os.cpu_count() or 1) + 1)
+    computed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for file_path, stats, digest in executor.map(compute, missing):
+            if digest is None:
+                continue
+            fingerprints[file_path] = digest
+            if cache is None:
+                continue
+            computed.append((file_path, stats, digest))
+            cache.misses += 1
+            cache.bytes_hashed += stats.st_size
+            if len(computed) >= cache.STORE_BATCH:
+                cache.store_many(algorithm, computed)
+                computed = []
+    
+    if computed:
+        cache.store_many(algorithm, computed)
+    return fingerprints
+
 def generate_checksum(file_path: str) -> Optional[str]:
-    """Calcule le checksum MD5 d'un fichier"""
+    """Calcule le checksum MD5 d'un fichier (lu par blocs)"""
     if not os.path.exists(file_path):
         return None
     
     try:
-        with open(file_path, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
+        return file_fingerprint(file_path, 'md5')
     except Exception:
         return None
 
@@ -73,8 +331,13 @@ def log_error(error_msg: str, log_file: str = None):
         except Exception:
             pass  # Silencieux si le log échoue
 
-def get_file_info(file_path: str) -> Dict:
-    """Récupère des informations sur un fichier"""
+def get_file_info(file_path: str, fingerprints: Optional[FingerprintCache] = None,
+                  algorithm: str = 'sha256') -> Dict:
+    """Récupère des informations sur un fichier.
+    
+    Avec un FingerprintCache, ajoute l'empreinte du contenu ('fingerprint'):
+    celle du cache si le fichier n'a pas changé, sinon calculée et mise en cache.
+    """
     if not os.path.exists(file_path):
         return {
             'exists': False,
@@ -87,12 +350,15 @@ def get_file_info(file_path: str) -> Dict:
         stats = os.stat(file_path)
         _, ext = os.path.splitext(file_path)
         
-        return {
+        info = {
             'exists': True,
             'size': stats.st_size,
             'modified': datetime.fromtimestamp(stats.st_mtime).isoformat(),
             'extension': ext.lstrip('.').lower() if ext else None
         }
+        if fingerprints is not None:
+            info['fingerprint'] = fingerprints.get(file_path, algorithm)
+        return info
     except Exception:
         return {
             'exists': False,
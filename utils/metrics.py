@@ -0,0 +1,220 @@
+"""
+Metrics - Mesures par étape (temps réel et CPU, débits, octets écrits, latences API)
+
+Un registre global `metrics` est partagé par l'extracteur, le transcripteur, le
+DataManager et l'exporteur. Chaque étape est mesurée avec `metrics.stage(nom)`;
+les compteurs d'une étape (fichiers, messages, octets...) donnent les débits
+par seconde dans le rapport JSON (`--metrics`). Avec `--profile`, les étapes de
+premier niveau sont en plus enveloppées dans cProfile.
+"""
+import os
+import io
+import json
+import time
+import pstats
+import bisect
+import cProfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Bornes supérieures (secondes) des classes de l'histogramme des latences API
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    """Histogramme à classes fixes avec nombre, somme, minimum et maximum"""
+    
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Quantile approché: borne supérieure de la classe qui le contient"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+    
+    def to_dict(self) -> Dict:
+        labels = [f"<={bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 4) if self.count else None,
+            'min': round(self.min, 4) if self.min is not None else None,
+            'max': round(self.max, 4) if self.max is not None else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+class Stage:
+    """Cumul d'une étape: appels, temps réel, temps CPU du processus et compteurs"""
+    
+    def __init__(self, name: str, lock: threading.Lock):
+        self.name = name
+        # Verrou du registre: les threads de transcription ajoutent aux compteurs en parallèle
+        self.lock = lock
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.counters: Dict[str, float] = {}
+    
+    def add(self, counter: str, amount: float = 1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+    
+    def to_dict(self) -> Dict:
+        result = {
+            'calls': self.calls,
+            'wall_seconds': round(self.wall, 4),
+            'cpu_seconds': round(self.cpu, 4)
+        }
+        for counter, value in sorted(self.counters.items()):
+            result[counter] = value
+            if self.wall > 0:
+                result[f"{counter}_per_second"] = round(value / self.wall, 1)
+        return result
+
+class Metrics:
+    """Registre thread-safe des étapes, compteurs et histogrammes d'une exécution"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages: Dict[str, Stage] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.started = datetime.now()
+        self.profile_dir: Optional[str] = None
+        self.profiles: Dict[str, List[cProfile.Profile]] = {}
+        # Profondeur des étapes par thread: seules les étapes de premier niveau sont profilées
+        self._local = threading.local()
+    
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.histograms = {}
+            self.profiles = {}
+            self.started = datetime.now()
+    
+    def enable_profiling(self, profile_dir: str):
+        """Active cProfile autour des étapes de premier niveau (fichiers .prof dans profile_dir)"""
+        self.profile_dir = profile_dir
+    
+    def _stage(self, name: str) -> Stage:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages.setdefault(name, Stage(name, self.lock))
+        return stage
+    
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Stage]:
+        """Mesure un bloc; les compteurs s'ajoutent via l'objet retourné (stage.add)"""
+        with self.lock:
+            stage = self._stage(name)
+        
+        depth = getattr(self._local, 'depth', 0)
+        profiler = None
+        # cProfile ne suit que le thread appelant et ne s'imbrique pas
+        if self.profile_dir and depth == 0 and threading.current_thread() is threading.main_thread():
+            profiler = cProfile.Profile()
+            profiler.enable()
+        
+        self._local.depth = depth + 1
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield stage
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.process_time() - cpu_start
+            self._local.depth = depth
+            if profiler is not None:
+                profiler.disable()
+            with self.lock:
+                stage.calls += 1
+                stage.wall += wall
+                stage.cpu += cpu
+                if profiler is not None:
+                    self.profiles.setdefault(name, []).append(profiler)
+    
+    def count(self, stage: str, counter: str, amount: float = 1):
+        """Ajoute à un compteur d'étape sans la chronométrer"""
+        with self.lock:
+            target = self._stage(stage)
+        target.add(counter, amount)
+    
+    def observe(self, histogram: str, value: float):
+        with self.lock:
+            histo = self.histograms.get(histogram)
+            if histo is None:
+                histo = self.histograms[histogram] = Histogram()
+            histo.observe(value)
+    
+    def to_dict(self) -> Dict:
+        with self.lock:
+            return {
+                'started': self.started.isoformat(timespec='seconds'),
+                'elapsed_seconds': round((datetime.now() - self.started).total_seconds(), 3),
+                'stages': {name: stage.to_dict() for name, stage in self.stages.items()},
+                'histograms': {name: histo.to_dict() for name, histo in self.histograms.items()}
+            }
+    
+    def write(self, path: str):
+        """Écrit le rapport JSON des mesures"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"[METRICS] Mesures écrites dans {path}")
+    
+    def write_profiles(self, top: int = 15):
+        """Écrit un fichier .prof par étape profilée et affiche les fonctions les plus coûteuses"""
+        if not self.profile_dir or not self.profiles:
+            return
+        
+        os.makedirs(self.profile_dir, exist_ok=True)
+        for name, profilers in self.profiles.items():
+            path = os.path.join(self.profile_dir, f"{name}.prof")
+            report = io.StringIO()
+            # Les appels répétés d'une même étape sont cumulés dans un seul profil
+            stats = pstats.Stats(*profilers, stream=report)
+            stats.dump_stats(path)
+            stats.sort_stats('cumulative').print_stats(top)
+            print(f"\n[PROFILE] {name} ({path})")
+            print(report.getvalue().strip())
+    
+    def print_summary(self):
+        """Résumé lisible des étapes mesurées"""
+        print(f"\n[METRICS] {'étape':<24} {'appels':>7} {'réel (s)':>9} {'CPU (s)':>9}  compteurs")
+        with self.lock:
+            stages = list(self.stages.values())
+            histograms = dict(self.histograms)
+        for stage in stages:
+            counters = ', '.join(
+                f"{counter}={value:g}" + (f" ({value / stage.wall:.0f}/s)" if stage.wall > 0 else "")
+                for counter, value in sorted(stage.counters.items())
+            )
+            print(f"[METRICS] {stage.name:<24} {stage.calls:>7} {stage.wall:>9.3f} {stage.cpu:>9.3f}  {counters}")
+        for name, histo in histograms.items():
+            summary = histo.to_dict()
+            print(f"[METRICS] {name}: {summary['count']} mesures, moyenne {summary['mean']}s, "
+                  f"p50 <= {summary['p50']}s, p95 <= {summary['p95']}s, max {summary['max']}s")
+
+# Registre partagé par tous les composants d'une exécution
+metrics = Metrics()